@@ -100,7 +100,7 @@ class ReceiptTagAdmin(admin.ModelAdmin):
 
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
-    list_display = ['user', 'category', 'amount_limit', 'period_start', 'period_end', 'created_at']
+    list_display = ['user', 'category', 'amount_limit', 'consumed_amount', 'period_start', 'period_end', 'created_at']
     list_filter = ['category', 'period_start', 'period_end', 'created_at', 'user']
     search_fields = ['user__username', 'category__name']
     ordering = ['-period_start']
@@ -6,7 +6,7 @@ from .views import (
      RegisterAPIView, LogoutAPIView, LoginAPIView
     
 )
-from .views import resources
+from .views import async_api, resources
 
 # Create API router
 api_router = DefaultRouter()
@@ -21,6 +21,7 @@ api_router.register(r'receipt-tags', resources.ReceiptTagViewSet, basename='rece
 api_router.register(r'budgets', resources.BudgetViewSet, basename='budget')
 api_router.register(r'receipt-payments', resources.ReceiptPaymentViewSet, basename='receipt-payment')
 api_router.register(r'receipt-items', resources.ReceiptItemViewSet, basename='receipt-item')
+api_router.register(r'notifications', resources.NotificationViewSet, basename='notification')
 
 
 
@@ -32,6 +33,12 @@ urlpatterns = [
     path('auth/logout/', LogoutAPIView.as_view(), name='api_logout'),
     path('auth/login/', LoginAPIView.as_view(), name='login'),
     
+    # Native async read endpoints (ASGI)
+    path('async/receipts/', async_api.receipt_list, name='async_receipt_list'),
+    path('async/receipts/analytics/', async_api.receipt_analytics, name='async_receipt_analytics'),
+    path('async/receipts/<int:pk>/', async_api.receipt_detail, name='async_receipt_detail'),
+    path('async/notifications/', async_api.notification_list, name='async_notification_list'),
+
     # API router endpoints
     path('', include(api_router.urls)),
     
@@ -0,0 +1,116 @@
+"""
+Token authentication with an in-process token -> user cache.
+
+``TokenAuthentication`` joins ``Token`` to ``User`` on every API request.
+``CachedTokenAuthentication`` keeps recent lookups in a bounded LRU with a
+TTL. Every entry records the shared ``tokens`` data version (see
+``cache.py``); deleting or rotating a token and deactivating a user bump
+that version (see ``signals.py``), which drops every process's entries on
+their next lookup. A per-process cache backend (locmem) would keep the bump
+from other processes, and a revoked token would keep working there until its
+entry expired, so the token cache is off unless the default cache is shared
+or ``DRT_REQUIRE_SHARED_CACHE`` is off (a single-process deployment).
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import CacheStats, bump_version, cache_is_shared, get_version
+
+SCOPE = 'tokens'
+
+
+class TokenCache:
+    """Thread-safe LRU of ``token key -> (user, token, expires_at, version)``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.stats = CacheStats('auth_tokens')
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'DRT_TOKEN_CACHE_TTL', 60)
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'DRT_TOKEN_CACHE_SIZE', 10000)
+
+    @property
+    def enabled(self):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return False
+        # Revocations reach other processes only through a shared cache.
+        return cache_is_shared() or not getattr(settings, 'DRT_REQUIRE_SHARED_CACHE', False)
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        version = get_version(SCOPE)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user, token, expires_at, entry_version = entry
+                if expires_at > now and entry_version == version:
+                    self._entries.move_to_end(key)
+                    self.stats.record('hits')
+                    # Requests may mutate request.user; never share the instance.
+                    return copy.copy(user), copy.copy(token)
+                del self._entries[key]
+        self.stats.record('misses')
+        return None
+
+    def set(self, key, user, token, version):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (user, token, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+
+
+def revoke_tokens(*keys):
+    """Stop serving ``keys`` from any process's cache (and everything else cached with them)."""
+    for key in keys:
+        token_cache.discard(key)
+    # Bump now so this process stops serving them, and again on commit so no
+    # lookup that read the old rows inside the transaction survives.
+    bump_version(SCOPE)
+    transaction.on_commit(lambda: bump_version(SCOPE))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` backed by ``token_cache``."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        # Read the version before the database so a revocation that lands
+        # in between leaves this entry already stale.
+        version = get_version(SCOPE)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, copy.copy(user), copy.copy(token), version)
+        return user, token
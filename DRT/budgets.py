@@ -0,0 +1,242 @@
+"""
+Budget utilization: spend against each budget's limit.
+
+A budget's spend is the total of the owner's receipts in the budget's
+category dated inside its period. ``with_utilization`` adds it to a
+``Budget`` queryset as a correlated subquery in the same SELECT. A page of
+budgets therefore costs one query however many budgets it holds. Each
+subquery is an index range scan on ``Receipt (user, purchase_date)``.
+
+``Budget.consumed_amount`` keeps the same total incrementally. Receipt writes
+report their spend deltas (see ``maintenance.schedule_budget_spend``).
+``apply_spend`` then locks the affected budgets, moves their counters with
+``F()`` updates and notifies the owner when a budget crosses one of
+``DRT_BUDGET_ALERT_THRESHOLDS``. ``manage.py reconcile_budgets`` recomputes
+the counters from the receipts and reports any drift.
+
+``active_budgets`` answers "which budgets cover this date?" for any number of
+dates from a per-user ``BudgetIntervals`` index. The index is cached under
+the user's budget scope, which only ``Budget`` writes bump.
+"""
+
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+
+from . import notifications
+from .cache import KEY_PREFIX, budget_scope, bump_version, get_or_compute, get_version
+from .models import Budget, Receipt
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def spent_subquery():
+    """Total of the outer budget's receipts: same user and category, dated within its period."""
+    totals = (
+        Receipt.objects.filter(
+            user=OuterRef('user'),
+            category=OuterRef('category'),
+            purchase_date__gte=OuterRef('period_start'),
+            purchase_date__lte=OuterRef('period_end'),
+        )
+        .order_by()
+        .values('user')
+        .annotate(total=Sum('total_amount'))
+        .values('total')[:1]
+    )
+    return Coalesce(Subquery(totals, output_field=MONEY), Value(Decimal('0.00')), output_field=MONEY)
+
+
+def with_utilization(queryset):
+    """Annotate budgets with ``spent``, ``remaining`` and ``percent_used`` (two decimals)."""
+    return queryset.annotate(
+        spent=spent_subquery(),
+    ).annotate(
+        remaining=ExpressionWrapper(F('amount_limit') - F('spent'), output_field=MONEY),
+        percent_used=Case(
+            When(amount_limit__gt=0, then=Round(F('spent') * 100 / F('amount_limit'), 2)),
+            default=None,
+            output_field=DecimalField(max_digits=9, decimal_places=2),
+        ),
+    )
+
+
+def alert_thresholds():
+    """Configured alert levels in percent of the limit, ascending."""
+    return sorted(set(getattr(settings, 'DRT_BUDGET_ALERT_THRESHOLDS', (80, 100))))
+
+
+def threshold_reached(consumed, limit, thresholds=None):
+    """The highest threshold ``consumed`` has reached against ``limit`` (0 if none)."""
+    if not limit or limit <= 0:
+        return 0
+    reached = [t for t in (thresholds or alert_thresholds()) if consumed * 100 >= limit * t]
+    return reached[-1] if reached else 0
+
+
+def apply_spend(deltas):
+    """
+    Add ``{(user_id, category_id, day): amount}`` to every budget covering it.
+
+    The budgets are locked in primary-key order for the rest of the
+    transaction, so concurrent writers cannot interleave their counter and
+    threshold updates.
+    """
+    by_owner = defaultdict(list)
+    for (user_id, category_id, day), amount in deltas.items():
+        if category_id is not None and amount:
+            by_owner[user_id, category_id].append((day, amount))
+    if not by_owner:
+        return []
+    condition = Q()
+    for (user_id, category_id), entries in by_owner.items():
+        days = [day for day, _ in entries]
+        condition |= Q(
+            user_id=user_id, category_id=category_id, period_start__lte=max(days), period_end__gte=min(days)
+        )
+    changed = []
+    with transaction.atomic():
+        budgets = Budget.objects.select_for_update().filter(condition).order_by('pk').only(
+            'pk', 'user_id', 'category_id', 'period_start', 'period_end'
+        )
+        for budget in budgets:
+            delta = sum(
+                (amount for day, amount in by_owner[budget.user_id, budget.category_id]
+                 if budget.period_start <= day <= budget.period_end),
+                Decimal('0'),
+            )
+            if delta:
+                Budget.objects.filter(pk=budget.pk).update(consumed_amount=F('consumed_amount') + delta)
+                changed.append(budget.pk)
+        check_thresholds(changed)
+    return changed
+
+
+def check_thresholds(budget_ids, notify=True):
+    """
+    Bring ``alerted_threshold`` in line with each budget's consumption.
+
+    A budget that reaches a higher threshold gets exactly one notification,
+    naming the highest threshold reached. A budget that drops back below a
+    threshold re-arms it without notifying. Call with the budgets locked.
+    """
+    if not budget_ids:
+        return
+    thresholds = alert_thresholds()
+    budgets = Budget.objects.filter(pk__in=budget_ids).only(
+        'pk', 'user_id', 'category_id', 'amount_limit', 'consumed_amount', 'alerted_threshold'
+    )
+    for budget in budgets:
+        level = threshold_reached(budget.consumed_amount, budget.amount_limit, thresholds)
+        if level == budget.alerted_threshold:
+            continue
+        Budget.objects.filter(pk=budget.pk).update(alerted_threshold=level)
+        if notify and level > budget.alerted_threshold:
+            notifications.notify(budget.user_id, notifications.budget_threshold_reached(budget, level))
+
+
+def recount(budget_ids, notify=True):
+    """Recompute ``consumed_amount`` from the receipts, e.g. after a budget is edited."""
+    with transaction.atomic():
+        locked = list(
+            Budget.objects.select_for_update().filter(pk__in=budget_ids).order_by('pk').values_list('pk', flat=True)
+        )
+        Budget.objects.filter(pk__in=locked).update(consumed_amount=spent_subquery())
+        check_thresholds(locked, notify=notify)
+
+
+def consumption_drift(queryset=None):
+    """``(budget_id, recorded, actual)`` for every budget whose counter is off."""
+    queryset = Budget.objects.all() if queryset is None else queryset
+    rows = (
+        queryset.annotate(actual=spent_subquery()).order_by('pk')
+        .values_list('pk', 'consumed_amount', 'actual')
+    )
+    cent = Decimal('0.01')
+    drift = []
+    for pk, recorded, actual in rows.iterator():
+        actual = actual.quantize(cent)
+        if recorded != actual:
+            drift.append((pk, recorded, actual))
+    return drift
+
+
+BudgetInterval = namedtuple('BudgetInterval', 'id category_id period_start period_end amount_limit')
+
+
+class BudgetIntervals:
+    """
+    One user's budget periods as an implicit interval tree, for stabbing queries.
+
+    Intervals are sorted by start; the middle of any slice is the root of the
+    subtree over that slice, and ``max_end[i]`` is the latest end in the
+    subtree rooted at ``i``. A lookup skips every subtree that ends before the
+    date and every right subtree that starts after it, so finding ``k``
+    covering budgets among ``n`` costs O((k + 1) log n), however long any one
+    budget runs.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals, key=lambda interval: (interval.period_start, interval.id))
+        self.max_end = [None] * len(self.intervals)
+        self._build(0, len(self.intervals))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        ends = [self.intervals[mid].period_end, self._build(lo, mid), self._build(mid + 1, hi)]
+        self.max_end[mid] = max(end for end in ends if end is not None)
+        return self.max_end[mid]
+
+    def covering(self, day, category_id=None):
+        """Intervals whose period includes ``day``, earliest start first."""
+        found = []
+        self._collect(0, len(self.intervals), day, category_id, found)
+        return found
+
+    def _collect(self, lo, hi, day, category_id, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self.max_end[mid] < day:
+            return
+        self._collect(lo, mid, day, category_id, found)
+        interval = self.intervals[mid]
+        if interval.period_start > day:
+            return  # so does everything to its right
+        if interval.period_end >= day and category_id in (None, interval.category_id):
+            found.append(interval)
+        self._collect(mid + 1, hi, day, category_id, found)
+
+
+def invalidate_budget_index(user_id):
+    # Like maintenance.invalidate_user: now for reads later in this
+    # transaction, and on commit so nothing built from pre-commit data stays.
+    scope = budget_scope(user_id)
+    bump_version(scope)
+    transaction.on_commit(lambda: bump_version(scope))
+
+
+def budget_index(user_id):
+    """The user's ``BudgetIntervals``, from the cache when their budgets have not changed."""
+    key = f'{KEY_PREFIX}:budget-intervals:{user_id}:v{get_version(budget_scope(user_id))}'
+
+    def build():
+        return [
+            BudgetInterval(*row) for row in Budget.objects.filter(user_id=user_id).order_by().values_list(
+                'id', 'category_id', 'period_start', 'period_end', 'amount_limit'
+            )
+        ]
+    intervals, _ = get_or_compute(key, build, timeout=getattr(settings, 'DRT_BUDGET_INDEX_CACHE_TIMEOUT', 3600))
+    return BudgetIntervals(intervals)
+
+
+def active_budgets(user_id, dates, category_id=None):
+    """``{date: [BudgetInterval, ...]}`` for every date in ``dates``, from one index lookup."""
+    index = budget_index(user_id)
+    return {day: index.covering(day, category_id) for day in set(dates)}
@@ -0,0 +1,140 @@
+"""
+Bulk receipt ingestion.
+
+Validates a batch of receipts (with nested items, payments and tag names)
+against the in-process reference registry, then inserts everything with
+``bulk_create`` in a single transaction. ``Model.save()``/``clean()`` are
+bypassed on purpose: the serializers already enforce the same rules without
+the per-row ``exists()`` queries.
+"""
+
+from dataclasses import dataclass, field
+
+from django.db import connections, models, router, transaction
+
+from .maintenance import (
+    deferred_maintenance, schedule_budget_spend, schedule_invalidation, schedule_rollup, schedule_search_index
+)
+from .models import Receipt, ReceiptItem, ReceiptPayment, ReceiptTag, Tag
+from .registry import reference_data
+from .serializers import BulkReceiptSerializer
+
+BATCH_SIZE = 500
+
+
+@dataclass
+class BulkResult:
+    created: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+
+def resolve_names(model, names):
+    """
+    Map ``name`` values of a reference model to ids, creating missing rows.
+
+    One SELECT for the existing rows and one multi-row INSERT for the rest;
+    ``ignore_conflicts`` tolerates a concurrent writer creating the same name.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - ids.keys()
+    if missing:
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        ids.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+        reference_data.invalidate()  # bulk_create sends no post_save
+    return ids
+
+
+def resolve_tags(names):
+    """Map tag names to ids, creating missing tags in one statement."""
+    return resolve_names(Tag, names)
+
+
+def create_receipts(receipts, batch_size=BATCH_SIZE):
+    """
+    Insert ``Receipt`` objects so that their primary keys are populated.
+
+    Backends that cannot return ids from a multi-row INSERT (MySQL) fall back
+    to one INSERT per receipt; nested rows are still bulk inserted.
+    """
+    connection = connections[router.db_for_write(Receipt)]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Receipt.objects.bulk_create(receipts, batch_size=batch_size)
+        for receipt in receipts:
+            schedule_rollup(receipt.user_id, receipt.purchase_date)
+            schedule_budget_spend(
+                {(receipt.user_id, receipt.category_id, receipt.purchase_date): receipt.total_amount}
+            )
+            schedule_invalidation(receipt.user_id)
+    else:
+        for receipt in receipts:
+            # Skip Receipt.save()'s clean(); rows were validated up front.
+            models.Model.save(receipt, force_insert=True)
+    return receipts
+
+
+def insert_receipts(user, rows, batch_size=BATCH_SIZE):
+    """
+    Insert validated receipt dicts (``BulkReceiptSerializer.validated_data``).
+
+    Must run inside a transaction; returns the created receipts.
+    """
+    receipts = []
+    for row in rows:
+        fields = {k: v for k, v in row.items() if k not in ('items', 'payments', 'tags', 'category')}
+        receipts.append(Receipt(user=user, category_id=row.get('category'), **fields))
+
+    with deferred_maintenance():
+        create_receipts(receipts, batch_size)
+
+        tag_ids = resolve_tags(name for row in rows for name in row.get('tags', []))
+        items, payments, receipt_tags = [], [], []
+        for receipt, row in zip(receipts, rows):
+            items.extend(ReceiptItem(receipt=receipt, **item) for item in row.get('items', []))
+            payments.extend(
+                ReceiptPayment(
+                    receipt=receipt,
+                    payment_method_id=payment.get('payment_method'),
+                    amount_paid=payment['amount_paid'],
+                    paid_at=payment['paid_at'],
+                )
+                for payment in row.get('payments', [])
+            )
+            receipt_tags.extend(
+                ReceiptTag(receipt=receipt, tag_id=tag_ids[name])
+                for name in set(row.get('tags', []))
+            )
+
+        ReceiptItem.objects.bulk_create(items, batch_size=batch_size)
+        ReceiptPayment.objects.bulk_create(payments, batch_size=batch_size)
+        ReceiptTag.objects.bulk_create(receipt_tags, batch_size=batch_size)
+        schedule_search_index(receipt.pk for receipt in receipts)
+    return receipts
+
+
+def ingest_receipts(user, data, atomic=True):
+    """
+    Validate and insert a list of receipt payloads for ``user``.
+
+    With ``atomic=True`` nothing is written if any row is invalid; otherwise
+    valid rows are inserted and invalid ones reported. Errors are reported
+    as ``{'index': n, 'errors': {...}}`` against the input position.
+    """
+    result = BulkResult()
+    valid_rows = []
+    for index, payload in enumerate(data):
+        serializer = BulkReceiptSerializer(data=payload)
+        if serializer.is_valid():
+            valid_rows.append(serializer.validated_data)
+        else:
+            result.errors.append({'index': index, 'errors': serializer.errors})
+
+    if not valid_rows or (atomic and result.errors):
+        return result
+
+    with transaction.atomic():
+        receipts = insert_receipts(user, valid_rows)
+    result.created = [receipt.pk for receipt in receipts]
+    return result
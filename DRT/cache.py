@@ -0,0 +1,217 @@
+"""
+Versioned caching helpers.
+
+Cached values are keyed on a *data version* for the scope they depend on
+(e.g. one user's receipts). Writes bump the version instead of hunting down
+individual keys, so every stale entry becomes unreachable at once and simply
+ages out of the cache.
+
+Works with any Django cache backend that implements ``add``/``incr``,
+including the locmem and file-based backends. Versions only invalidate what
+every worker caches if the workers share the backend, so outside DEBUG the
+``DRT.E001`` system check (see ``checks.py``) rejects process-local ones.
+"""
+
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY_PREFIX = 'drt'
+
+# Backends whose contents (and so whose version bumps) one process cannot
+# see from another.
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def cache_is_shared(alias='default'):
+    """Whether a version bumped in one process is seen by every other."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
+
+
+def _version_key(scope):
+    return f'{KEY_PREFIX}:version:{scope}'
+
+
+def _modified_key(scope):
+    return f'{KEY_PREFIX}:modified:{scope}'
+
+
+def _seed():
+    # Seed from the clock so a version lost to eviction never repeats an
+    # older value that may still have entries cached under it.
+    return int(time.time() * 1000)
+
+
+def get_version(scope):
+    """Current data version for ``scope``."""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _seed(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope):
+    """Invalidate everything cached under ``scope``; returns the new version."""
+    key = _version_key(scope)
+    cache.set(_modified_key(scope), time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), None)
+        return cache.get(key)
+
+
+def get_modified(scope):
+    """Unix time of the last bump of ``scope`` (now, if that was forgotten)."""
+    key = _modified_key(scope)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, time.time(), None)
+        modified = cache.get(key)
+    return modified
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def get_user_version(user_id):
+    return get_version(user_scope(user_id))
+
+
+def bump_user_version(user_id):
+    return bump_version(user_scope(user_id))
+
+
+def budget_scope(user_id):
+    # Budgets change far less often than receipts, so they get their own scope.
+    return f'budgets:{user_id}'
+
+
+def user_cache_key(name, user_id, *parts):
+    """Cache key for ``name`` that changes whenever the user's data version does."""
+    suffix = ':'.join(str(p) for p in parts)
+    return f'{KEY_PREFIX}:{name}:{user_id}:v{get_user_version(user_id)}:{suffix}'
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for one cached resource."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run ``fn`` for ``key``; returns ``(result, shared)``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+_flights = SingleFlight()
+
+
+def get_or_compute(key, compute, timeout=300, stats=None, lock_timeout=10):
+    """
+    Return the cached value for ``key``, computing and storing it on a miss.
+
+    Concurrent misses in this process share one computation. Across
+    processes a short-lived ``add`` lock elects a single computing worker;
+    the others poll for its result and only compute themselves if the lock
+    holder does not finish within ``lock_timeout`` seconds.
+
+    Returns ``(value, hit)``.
+    """
+    value = cache.get(key)
+    if value is not None:
+        if stats:
+            stats.record('hits')
+        return value, True
+
+    def fill():
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, 1, lock_timeout):
+            try:
+                result = compute()
+                cache.set(key, result, timeout)
+            finally:
+                cache.delete(lock_key)
+            return result
+
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            result = cache.get(key)
+            if result is not None:
+                return result
+        return compute()
+
+    value, shared = _flights.do(key, fill)
+    if stats:
+        stats.record('coalesced' if shared else 'misses')
+    return value, False
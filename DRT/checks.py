@@ -0,0 +1,24 @@
+"""
+System checks for deployment settings the app depends on.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .cache import cache_is_shared
+
+
+@register(Tags.caches, deploy=False)
+def check_shared_cache(app_configs, **kwargs):
+    """Data versions (cache.py) must live in a cache every worker shares."""
+    if not getattr(settings, 'DRT_REQUIRE_SHARED_CACHE', False) or cache_is_shared():
+        return []
+    return [
+        Error(
+            f"The default cache ({settings.CACHES['default']['BACKEND']}) is per process, "
+            "so other workers never see cache invalidations.",
+            hint="Set CACHE_BACKEND/CACHE_LOCATION to a shared backend (file-based, memcached, "
+                 "redis), or DRT_REQUIRE_SHARED_CACHE=False for a single-process deployment.",
+            id='DRT.E001',
+        )
+    ]
@@ -0,0 +1,224 @@
+"""
+Compiled read-only serialization.
+
+DRF serializers re-resolve every field for every row: ``get_attribute``
+walks the source, ``to_representation`` re-reads settings, and nested
+serializers repeat all of it per child. For list and retrieve responses the
+field set is fixed per request, so ``CompiledSerializer`` turns a bound DRF
+serializer into a plan once and then builds each row from a single
+``attrgetter`` tuple plus per-column converters.
+
+Output is the same ``dict``/``list`` the DRF serializer would return, so the
+rendered JSON is byte-identical. Field types without a known fast converter
+fall back to the DRF field itself.
+"""
+
+import datetime
+import decimal
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+
+def _identity(value):
+    return value
+
+
+def _text(value):
+    return value if type(value) is str else str(value)
+
+
+def _decimal_converter(field):
+    if getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) is not True:
+        return None
+    if field.localize or field.normalize_output or field.decimal_places is None:
+        return None
+    exponent = -field.decimal_places
+
+    def convert(value):
+        # Database values already carry the column's scale; anything else
+        # goes through DRF's quantize().
+        if type(value) is decimal.Decimal and value.as_tuple().exponent == exponent:
+            return '{:f}'.format(value)
+        return field.to_representation(value)
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return None
+    tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if tz is None:
+        return None
+
+    def convert(value):
+        if type(value) is not datetime.datetime or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return None
+
+    def convert(value):
+        if type(value) is not datetime.date:
+            return field.to_representation(value)
+        return value.isoformat()
+    return convert
+
+
+def _converter(field):
+    """A fast ``value -> primitive`` for ``field``, or None to use DRF's."""
+    field_type = type(field)
+    if field_type in (serializers.CharField, serializers.EmailField):
+        return _text
+    if field_type is serializers.IntegerField:
+        return int
+    if field_type is serializers.ReadOnlyField:
+        return _identity
+    if field_type is serializers.DecimalField:
+        return _decimal_converter(field)
+    if field_type is serializers.DateTimeField:
+        return _datetime_converter(field)
+    if field_type is serializers.DateField:
+        return _date_converter(field)
+    if field_type is serializers.BooleanField:
+        return lambda value: value if type(value) is bool else field.to_representation(value)
+    return None
+
+
+def _column_path(field, model):
+    """Dotted attribute path holding the field's raw value, or None if not a plain column."""
+    source_attrs = field.source_attrs
+    if not source_attrs or '*' in field.source:
+        return None
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        if field.pk_field is not None or len(source_attrs) != 1 or model is None:
+            return None
+        try:
+            model_field = model._meta.get_field(source_attrs[0])
+        except FieldDoesNotExist:
+            return None
+        return model_field.attname if model_field.many_to_one else None
+    return '.'.join(source_attrs)
+
+
+def _fallback(field):
+    """Exactly what ``Serializer.to_representation`` does for one field."""
+    def value(obj):
+        attribute = field.get_attribute(obj)
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+    return value
+
+
+def _nested(field):
+    """Rows for a ``many=True`` nested serializer."""
+    child_row = compile_row(field.child)
+    iter_related = getattr(field, 'iter_related', None)
+
+    def value(obj):
+        data = field.get_attribute(obj)
+        if iter_related is not None:
+            return [child_row(item) for item in iter_related(data)]
+        iterable = data.all() if hasattr(data, 'all') else data
+        return [child_row(item) for item in iterable]
+    return value
+
+
+def compile_row(serializer):
+    """Build ``row(instance) -> dict`` equivalent to ``serializer.to_representation``."""
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    paths, steps = [], []
+    for field in serializer._readable_fields:
+        name = field.field_name
+        if isinstance(field, serializers.SerializerMethodField):
+            steps.append((name, None, getattr(serializer, field.method_name)))
+            continue
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.Serializer):
+            steps.append((name, None, _nested(field)))
+            continue
+        path = _column_path(field, model)
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            convert = _identity if path else None
+        else:
+            convert = _converter(field)
+        if path is None or convert is None or len(field.source_attrs) > 1:
+            # Dotted sources can hit a missing relation; let DRF handle it.
+            steps.append((name, None, _fallback(field)))
+            continue
+        steps.append((name, len(paths), convert))
+        paths.append(path)
+
+    getter = attrgetter(*paths) if paths else (lambda obj: ())
+    single = len(paths) == 1
+
+    def row(obj):
+        values = getter(obj)
+        if single:
+            values = (values,)
+        out = {}
+        for name, index, fn in steps:
+            if index is None:
+                try:
+                    out[name] = fn(obj)
+                except SkipField:
+                    continue
+            else:
+                value = values[index]
+                out[name] = None if value is None else fn(value)
+        return out
+    return row
+
+
+class CompiledSerializer:
+    """Read-only stand-in for a bound DRF serializer with the same ``.data``."""
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.many = isinstance(serializer, serializers.ListSerializer)
+        self.row = compile_row(serializer.child if self.many else serializer)
+
+    @property
+    def instance(self):
+        return self.serializer.instance
+
+    @property
+    def data(self):
+        if self.many:
+            instance = self.serializer.instance
+            iterable = instance.all() if hasattr(instance, 'all') else instance
+            return ReturnList([self.row(obj) for obj in iterable], serializer=self.serializer)
+        return ReturnDict(self.row(self.serializer.instance), serializer=self.serializer)
+
+
+class CompiledReadMixin:
+    """
+    Viewset mixin: serve ``list`` and ``retrieve`` through ``CompiledSerializer``.
+
+    Set ``settings.DRT_COMPILED_SERIALIZERS = False`` to use plain DRF output.
+    """
+    compiled_actions = ('list', 'retrieve')
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if (
+            self.action in self.compiled_actions
+            and serializer.instance is not None
+            and getattr(settings, 'DRT_COMPILED_SERIALIZERS', True)
+        ):
+            return CompiledSerializer(serializer)
+        return serializer
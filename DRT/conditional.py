@@ -0,0 +1,96 @@
+"""
+Conditional GET for API list and detail responses.
+
+A response is fully determined by the data versions of the scopes it reads
+(see ``cache.py``), the requesting user, the URL and the negotiated media
+type. ``ConditionalGetMixin`` hashes those into a strong ``ETag`` and uses
+the scopes' last bump time as ``Last-Modified``, so a matching
+``If-None-Match``/``If-Modified-Since`` is answered with ``304`` before the
+queryset is evaluated or anything is serialized.
+
+``Last-Modified`` has one-second resolution, so it is the last bump rounded
+up, and only sent once that second has passed: until then a second write
+could land in the same second and a client holding the first response would
+get a wrong ``304``.
+"""
+
+import hashlib
+import math
+import time
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .cache import get_modified, get_version, user_scope
+from .registry import SCOPE as REFDATA_SCOPE
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin adding ``ETag``/``Last-Modified`` to ``list`` and ``retrieve``.
+
+    Subclasses list the version scopes their responses depend on in
+    ``get_validator_scopes()``; the version must be bumped on every write
+    that can change those responses.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_validator_scopes(self):
+        raise NotImplementedError
+
+    def get_validators(self, request):
+        """``(etag, last_modified)`` for the current request; ``last_modified`` may be ``None``."""
+        scopes = self.get_validator_scopes()
+        parts = [f'{scope}={get_version(scope)}' for scope in scopes]
+        parts += [str(request.user.pk), request.accepted_media_type or '', request.get_full_path()]
+        etag = '"%s"' % hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+        # Read versions before the data: a concurrent write can only make
+        # the validators older than the body, never newer.
+        last_modified = math.ceil(max(get_modified(scope) for scope in scopes))
+        if last_modified >= time.time():
+            last_modified = None
+        return etag, last_modified
+
+    def not_modified_response(self, request):
+        self._validators = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return None
+        self._validators = self.get_validators(request)
+        etag, last_modified = self._validators
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            self._set_validator_headers(response)
+        return response
+
+    def _set_validator_headers(self, response):
+        etag, last_modified = self._validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+
+    def list(self, request, *args, **kwargs):
+        return self.not_modified_response(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.not_modified_response(request) or super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, '_validators', None) and response.status_code == 200:
+            self._set_validator_headers(response)
+        return response
+
+
+class UserDataConditionalMixin(ConditionalGetMixin):
+    """Responses built from the user's own rows plus reference data names."""
+
+    def get_validator_scopes(self):
+        return [user_scope(self.request.user.pk), REFDATA_SCOPE]
+
+
+class ReferenceDataConditionalMixin(ConditionalGetMixin):
+    """Responses built only from the shared reference tables."""
+
+    def get_validator_scopes(self):
+        return [REFDATA_SCOPE]
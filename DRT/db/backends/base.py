@@ -0,0 +1,56 @@
+"""
+Mixin turning a Django database backend into a pooled one.
+
+``get_new_connection`` checks a raw connection out of the alias's
+``ConnectionPool`` and ``_close`` checks it back in, so everything else
+(``CONN_MAX_AGE``, ``close_old_connections``, transactions) keeps working
+unchanged. Pool options come from the database's ``POOL`` setting::
+
+    'POOL': {'MAX_SIZE': 10, 'MAX_LIFETIME': 1800, 'TIMEOUT': 5}
+"""
+
+from ..pool import ConnectionPool, get_pool
+
+POOL_DEFAULTS = {'MAX_SIZE': 10, 'MAX_LIFETIME': 1800, 'TIMEOUT': 5}
+
+
+class PooledDatabaseWrapperMixin:
+
+    def pool_options(self):
+        return {**POOL_DEFAULTS, **self.settings_dict.get('POOL', {})}
+
+    def pooling_enabled(self):
+        return True
+
+    @property
+    def pool(self):
+        def factory():
+            options = self.pool_options()
+            return ConnectionPool(
+                connect=lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(
+                    self.get_connection_params()
+                ),
+                validate=self.validate_connection,
+                close=lambda connection: connection.close(),
+                max_size=options['MAX_SIZE'],
+                max_lifetime=options['MAX_LIFETIME'],
+                timeout=options['TIMEOUT'],
+            )
+        return get_pool(self.alias, factory)
+
+    def validate_connection(self, connection):
+        """Raise if ``connection`` can no longer be used."""
+        raise NotImplementedError
+
+    def get_new_connection(self, conn_params):
+        if not self.pooling_enabled():
+            return super().get_new_connection(conn_params)
+        return self.pool.checkout()
+
+    def _close(self):
+        if self.connection is None or not self.pooling_enabled():
+            return super()._close()
+        # A connection mid-transaction or after an error may carry state
+        # into the next request; close it instead of returning it.
+        discard = self.in_atomic_block or self.errors_occurred or not self.autocommit
+        self.pool.checkin(self.connection, discard=discard)
@@ -0,0 +1,11 @@
+"""MySQL backend with a per-process connection pool (``ENGINE: 'DRT.db.backends.mysql'``)."""
+
+from django.db.backends.mysql import base
+
+from ..base import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def validate_connection(self, connection):
+        connection.ping()
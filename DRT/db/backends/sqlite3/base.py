@@ -0,0 +1,19 @@
+"""
+SQLite backend with the same pool as ``DRT.db.backends.mysql``.
+
+Used for local development and tests without a MySQL server. In-memory
+databases are never pooled: each connection would be a separate database.
+"""
+
+from django.db.backends.sqlite3 import base
+
+from ..base import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def pooling_enabled(self):
+        return not self.is_in_memory_db()
+
+    def validate_connection(self, connection):
+        connection.execute('SELECT 1').close()
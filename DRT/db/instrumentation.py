@@ -0,0 +1,64 @@
+"""
+Per-request SQL instrumentation.
+
+``record_queries()`` installs a ``QueryRecorder`` as an execute wrapper on
+every database connection of the current thread. The recorder counts
+queries, adds up their time, and groups them by *shape*: the SQL with
+literals and ``IN`` lists collapsed. A shape that runs many times in one
+request is the signature of an N+1: one query per row where a join or
+prefetch would do.
+
+``QueryInstrumentationMiddleware`` (in ``DRT.db.middleware``) records each
+request with it. ``DRT.testing`` uses it to assert that a query count
+stays constant.
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+def query_shape(sql):
+    """``sql`` with literals and parameter lists collapsed, so repeats compare equal."""
+    sql = _IN_LIST.sub('(%s, ...)', sql)
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+class QueryRecorder:
+    """Execute wrapper recording count, time and shape of every query it sees."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        """``[(shape, times)]`` for shapes run at least ``threshold`` times, most frequent first."""
+        return [(shape, times) for shape, times in self.shapes.most_common() if times >= threshold]
+
+
+@contextmanager
+def record_queries(aliases=None):
+    """Record the queries run on ``aliases`` (default: all) in this thread; yields a ``QueryRecorder``."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for alias in aliases or connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
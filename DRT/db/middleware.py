@@ -0,0 +1,92 @@
+"""Per-request database middleware: query metrics, pool metrics and replica pinning."""
+
+import logging
+
+from django.conf import settings
+
+from .instrumentation import record_queries
+from .pool import request_wait
+from .routers import pin_to_primary
+
+logger = logging.getLogger(__name__)
+
+
+def add_server_timing(response, entry):
+    existing = response.get('Server-Timing')
+    response['Server-Timing'] = f'{existing}, {entry}' if existing else entry
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Report each request's queries as ``Server-Timing`` and log the costly ones.
+
+    ``Server-Timing: db;dur=<ms>;desc="<n> queries"`` carries the query count
+    and total database time. When one query shape runs at least
+    ``DRT_QUERY_REPEAT_THRESHOLD`` times, a ``db-repeat;desc="<times>x"``
+    entry flags a likely N+1. Requests over ``DRT_QUERY_COUNT_BUDGET``
+    queries or ``DRT_QUERY_TIME_BUDGET_MS`` milliseconds, or with a repeated
+    shape, are logged as warnings with their most repeated query.
+
+    Only queries run by this thread before the response is returned are
+    seen: streamed bodies and async views' thread-pool queries are not.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+
+        elapsed_ms = recorder.seconds * 1000
+        add_server_timing(response, f'db;dur={elapsed_ms:.1f};desc="{recorder.count} queries"')
+        repeated = recorder.repeated(getattr(settings, 'DRT_QUERY_REPEAT_THRESHOLD', 10))
+        if repeated:
+            add_server_timing(response, f'db-repeat;desc="{repeated[0][1]}x"')
+
+        over_count = recorder.count > getattr(settings, 'DRT_QUERY_COUNT_BUDGET', 50)
+        over_time = elapsed_ms > getattr(settings, 'DRT_QUERY_TIME_BUDGET_MS', 500)
+        if over_count or over_time or repeated:
+            logger.warning(
+                "%s %s ran %d queries in %.1f ms%s",
+                request.method, request.path, recorder.count, elapsed_ms,
+                f"; {repeated[0][1]}x: {repeated[0][0][:300]}" if repeated else "",
+            )
+        return response
+
+
+class PoolMetricsMiddleware:
+    """
+    Report time spent waiting for pooled connections as ``Server-Timing``.
+
+    ``Server-Timing: db-pool;dur=<ms>`` shows up in browser dev tools and can
+    be logged by the proxy, so pool saturation is visible per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_wait.set(0.0)
+        try:
+            response = self.get_response(request)
+            wait_ms = request_wait.get() * 1000
+        finally:
+            request_wait.reset(token)
+        add_server_timing(response, f'db-pool;dur={wait_ms:.1f}')
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Pin clients to the primary after a successful write (see ``routers.py``)."""
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in self.SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request, response)
+        return response
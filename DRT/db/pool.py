@@ -0,0 +1,206 @@
+"""
+Bounded, health-checked pool of raw DB-API connections.
+
+One ``ConnectionPool`` exists per database alias per worker process (see
+``get_pool``). Django still opens and closes "its" connection per request;
+the pooled backends in ``DRT.db.backends`` turn those into checkouts and
+checkins, so the TCP and authentication handshakes happen only when the pool
+grows or recycles a connection.
+"""
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """No connection became available within the checkout timeout."""
+
+
+class PoolStats:
+    """Counters for one pool; read them with ``snapshot()``."""
+
+    FIELDS = (
+        'checkouts', 'waits', 'timeouts', 'created', 'reused', 'recycled',
+        'discarded', 'failed_checks', 'wait_seconds', 'max_wait_seconds',
+    )
+
+    def __init__(self):
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+
+
+# Seconds the current request has spent waiting for pooled connections.
+request_wait = ContextVar('drt_pool_request_wait', default=0.0)
+
+
+class _Entry:
+    __slots__ = ('connection', 'created_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    At most ``max_size`` connections, idle or checked out.
+
+    ``connect()`` opens a new raw connection, ``validate(conn)`` raises if a
+    connection is dead, and ``close(conn)`` closes one for good. Checkout
+    prefers the most recently returned connection, validates it, and
+    recycles it if it is older than ``max_lifetime`` seconds. When the pool
+    is saturated, callers wait up to ``timeout`` seconds for a checkin.
+    """
+
+    def __init__(self, connect, validate, close, max_size=10, max_lifetime=1800, timeout=5):
+        self._connect = connect
+        self._validate = validate
+        self._close = close
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self._idle = []
+        self._in_use = {}
+        self._opening = 0  # slots reserved by checkouts opening a connection
+        self._cond = threading.Condition()
+        self.stats = PoolStats()
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def checkout(self):
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    self._in_use[id(entry.connection)] = entry
+                    break
+                if self._size() < self.max_size:
+                    entry = None
+                    self._opening += 1
+                    break
+                waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.stats.timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {self.timeout}s "
+                        f"(pool size {self.max_size})."
+                    )
+                self._cond.wait(remaining)
+
+        entry = self._open_reserved() if entry is None else self._checked(entry)
+
+        wait = time.monotonic() - started
+        with self._cond:
+            self.stats.checkouts += 1
+            if waited:
+                self.stats.waits += 1
+            self.stats.wait_seconds += wait
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, wait)
+        request_wait.set(request_wait.get() + wait)
+        return entry.connection
+
+    def _open_reserved(self):
+        """Open a connection into a slot reserved with ``_opening``."""
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        entry = _Entry(connection)
+        with self._cond:
+            self._opening -= 1
+            self._in_use[id(connection)] = entry
+            self.stats.created += 1
+        return entry
+
+    def _checked(self, entry):
+        """Validate a reused entry, replacing it if too old or dead."""
+        if time.monotonic() - entry.created_at > self.max_lifetime:
+            reason = 'recycled'
+        else:
+            try:
+                self._validate(entry.connection)
+            except Exception:
+                reason = 'failed_checks'
+            else:
+                with self._cond:
+                    self.stats.reused += 1
+                return entry
+        with self._cond:
+            setattr(self.stats, reason, getattr(self.stats, reason) + 1)
+            del self._in_use[id(entry.connection)]
+            self._opening += 1
+        self._quietly_close(entry.connection)
+        return self._open_reserved()
+
+    def checkin(self, connection, discard=False):
+        """Return ``connection``; ``discard=True`` closes it instead (after errors)."""
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+            if entry is not None and not discard:
+                self._idle.append(entry)
+            elif entry is not None:
+                self.stats.discarded += 1
+            self._cond.notify()
+        if entry is None or discard:
+            self._quietly_close(connection)
+
+    def _quietly_close(self, connection):
+        try:
+            self._close(connection)
+        except Exception:
+            pass
+
+    def clear(self):
+        """Close every idle connection (checked-out ones close on checkin)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._quietly_close(entry.connection)
+
+    def snapshot(self):
+        with self._cond:
+            data = {name: getattr(self.stats, name) for name in PoolStats.FIELDS}
+            data.update(
+                max_size=self.max_size,
+                in_use=len(self._in_use) + self._opening,
+                idle=len(self._idle),
+                saturation=(len(self._in_use) + self._opening) / self.max_size if self.max_size else 0.0,
+            )
+        return data
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def get_pool(alias, factory):
+    """The process-wide pool for ``alias``, created with ``factory()`` on first use."""
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Connections inherited across fork() must not be shared.
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = factory()
+        return pool
+
+
+def pool_stats():
+    """``{alias: snapshot}`` for every pool in this process."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.snapshot() for alias, pool in pools.items()}
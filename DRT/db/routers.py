@@ -0,0 +1,124 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Reads go to the primary unless a view opts in (``ReplicaReadMixin``), so
+replica lag can only ever show up in the list, analytics and export
+responses that tolerate it. Every write goes to the primary.
+
+A successful unsafe request pins its client to the primary for
+``DRT_REPLICA_PIN_SECONDS``: ``ReplicaPinMiddleware`` sets a cookie (seen by
+every process) and, for an authenticated user, a cache entry (seen by token
+clients that ignore cookies). Keep the window above the worst replica lag.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# The replica alias reads in the current context are routed to, if any.
+read_replica = ContextVar('drt_read_replica', default=None)
+
+PIN_COOKIE = 'drt_primary'
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DRT_READ_REPLICAS', []))
+
+
+def pin_seconds():
+    return getattr(settings, 'DRT_REPLICA_PIN_SECONDS', 10)
+
+
+def pin_key(user_id):
+    return f'drt:pin:{user_id}'
+
+
+def pin_to_primary(request, response):
+    """Route ``request``'s client to the primary for the pin window."""
+    seconds = pin_seconds()
+    if seconds <= 0:
+        return
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        cache.set(pin_key(user.pk), True, seconds)
+
+
+def is_pinned(request):
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and cache.get(pin_key(user.pk)))
+
+
+def choose_replica(request):
+    """A replica alias to serve ``request``'s reads from, or None for the primary."""
+    aliases = replica_aliases()
+    if not aliases or is_pinned(request):
+        return None
+    return random.choice(aliases)
+
+
+def keep_read_replica(iterable):
+    """Iterate ``iterable`` with reads routed as they are now, e.g. a streamed body."""
+    alias = read_replica.get()  # now, not when iteration starts
+
+    def iterate():
+        iterator = iter(iterable)
+        while True:
+            token = read_replica.set(alias)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                read_replica.reset(token)
+            yield item
+    return iterate()
+
+
+class ReplicaRouter:
+    """Send reads to ``read_replica`` when set and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        # None lets related lookups follow the instance they start from.
+        return read_replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Never write through an instance that was read from a replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Viewset mixin serving ``replica_actions`` GETs from a read replica.
+
+    The alias is chosen once the user is authenticated and released in
+    ``finalize_response``; bodies streamed after that are wrapped in
+    ``keep_read_replica``.
+    """
+    replica_actions = ('list',)
+
+    def initial(self, request, *args, **kwargs):
+        self._replica_token = None
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and self.action in self.replica_actions:
+            alias = choose_replica(request)
+            if alias is not None:
+                self._replica_token = read_replica.set(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            read_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,60 @@
+"""
+Streaming export of a user's receipts.
+
+Rows are pulled with ``QuerySet.iterator(chunk_size=...)``; Django runs the
+queryset's ``prefetch_related`` lookups once per chunk, so memory stays flat
+however many receipts are exported.
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .serializers import ReceiptSerializer
+
+CHUNK_SIZE = 500
+
+CSV_COLUMNS = [
+    'id', 'store_name', 'total_amount', 'currency', 'purchase_date', 'uploaded_at',
+    'notes', 'category', 'category_name', 'tags', 'items', 'payments',
+]
+
+
+def iter_records(queryset, chunk_size=CHUNK_SIZE):
+    """Yield one API-shaped dict per receipt with all items, payments and tag names."""
+    receipts = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(receipts, chunk_size))
+        if not chunk:
+            return
+        yield from ReceiptSerializer(
+            chunk, many=True, expand=ReceiptSerializer.EXPANDABLE, nested_limit=None
+        ).data
+
+
+def iter_ndjson(queryset, chunk_size=CHUNK_SIZE):
+    for record in iter_records(queryset, chunk_size):
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_csv(queryset, chunk_size=CHUNK_SIZE):
+    """One CSV row per receipt; nested tags, items and payments are JSON-encoded cells."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writeheader()
+    yield flush()
+    for record in iter_records(queryset, chunk_size):
+        for key in ('tags', 'items', 'payments'):
+            record[key] = json.dumps(record[key], cls=DjangoJSONEncoder)
+        writer.writerow(record)
+        yield flush()
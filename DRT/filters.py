@@ -0,0 +1,94 @@
+"""Receipt filtering for the API and web views."""
+
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import ReceiptPayment, ReceiptTag
+from .search import search_receipts
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def filter_receipts(queryset, params):
+    """
+    Apply the receipt query-string filters to ``queryset``.
+
+    Conditions on payments and tags compile to correlated ``EXISTS``
+    subqueries instead of joins, so a receipt is never repeated and the
+    outer query can keep using the ``(user, purchase_date)`` index for
+    range filtering and ordering without a ``DISTINCT``.
+
+    * ``payment_method`` – name substring of any payment's method
+    * ``tags`` – comma-separated tag names; ``tags_mode=any`` (default)
+      matches receipts with at least one, ``tags_mode=all`` with every one
+    * ``date_from``/``date_to``, ``amount_min``/``amount_max`` – inclusive bounds
+    """
+    payment_method = params.get('payment_method')
+    tags = _split(params.get('tags') or '')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    amount_min = params.get('amount_min')
+    amount_max = params.get('amount_max')
+
+    if payment_method:
+        queryset = queryset.filter(Exists(ReceiptPayment.objects.filter(
+            receipt=OuterRef('pk'), payment_method__name__icontains=payment_method,
+        )))
+    if tags:
+        if params.get('tags_mode') == 'all':
+            for tag in set(tags):
+                queryset = queryset.filter(Exists(ReceiptTag.objects.filter(
+                    receipt=OuterRef('pk'), tag__name=tag,
+                )))
+        else:
+            queryset = queryset.filter(Exists(ReceiptTag.objects.filter(
+                receipt=OuterRef('pk'), tag__name__in=tags,
+            )))
+    if date_from:
+        queryset = queryset.filter(purchase_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(purchase_date__lte=date_to)
+    if amount_min:
+        queryset = queryset.filter(total_amount__gte=amount_min)
+    if amount_max:
+        queryset = queryset.filter(total_amount__lte=amount_max)
+    return queryset
+
+
+def distinct_if_needed(queryset):
+    """Add DISTINCT only if the query joins a to-many relation that can repeat rows."""
+    for join in queryset.query.alias_map.values():
+        join_field = getattr(join, 'join_field', None)
+        if join_field is not None and (join_field.one_to_many or join_field.many_to_many):
+            return queryset.distinct()
+    return queryset
+
+
+class ReceiptSearchFilter(BaseFilterBackend):
+    """
+    ``?search=`` through the full-text search backend.
+
+    Results are ranked by relevance unless the client asked for an explicit
+    ``?ordering=``; place it after ``OrderingFilter`` so the rank comes first.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        rank = self.ordering_param not in request.query_params
+        return search_receipts(queryset, query, rank=rank)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over store name, notes, category and item names.',
+            'schema': {'type': 'string'},
+        }]
@@ -1,10 +1,51 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth import get_user_model
+from django.forms.models import ModelChoiceIterator
 from .models import Receipt, Category, Budget
+from .registry import reference_data
 
 User = get_user_model() 
 
+
+class RegistryChoiceIterator(ModelChoiceIterator):
+    """Yield category choices from the reference registry instead of querying."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for category in reference_data.categories():
+            yield self.choice(category)
+
+    def __len__(self):
+        return len(reference_data.categories()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(reference_data.categories())
+
+
+class CategoryChoiceField(forms.ModelChoiceField):
+    """Category select whose choices and lookups come from the reference registry."""
+    iterator = RegistryChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Category):
+            return value
+        try:
+            category = reference_data.category(int(value))
+        except (TypeError, ValueError):
+            category = None
+        if category is None:
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return category
+
+
 class LoginForm(AuthenticationForm):
     username = forms.CharField(
         label="Username",
@@ -47,6 +88,7 @@ class ReceiptForm(forms.ModelForm):
     class Meta:
         model = Receipt
         fields = ['store_name', 'category', 'total_amount', 'currency', 'purchase_date', 'notes']
+        field_classes = {'category': CategoryChoiceField}
         widgets = {
             'store_name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -95,6 +137,7 @@ class BudgetForm(forms.ModelForm):
     class Meta:
         model = Budget
         fields = ["category", "amount_limit", "period_start", "period_end"]
+        field_classes = {"category": CategoryChoiceField}
         widgets = {
             "category": forms.Select(attrs={"class": "form-select"}),
             "amount_limit": forms.NumberInput(
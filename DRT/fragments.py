@@ -0,0 +1,82 @@
+"""
+Per-user template fragment caching for the web pages.
+
+A fragment is cached under the user's data version and the reference-data
+version (category, payment method and tag names), so any write that could
+change it makes the old copy unreachable instead of deleting it. Views pass
+the fragment's data lazily (querysets, ``SimpleLazyObject``, callables), so
+the single lookup made by ``{% cache %}`` decides whether the queries run: a
+hit skips them as well as the rendering, and a fragment evicted a moment
+earlier is still rendered from real data.
+
+Templates wrap the cached part in ``{% cache fragment.timeout <name>
+fragment.vary %}``, where ``<name>`` is the literal ``FragmentCache.name``.
+Each response reports the render time and the outcome as
+``Server-Timing: tpl;dur=<ms>;desc="fragment hit|miss"``.
+"""
+
+import time
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+
+from .cache import get_user_version, get_version
+from .db.middleware import add_server_timing
+from .registry import SCOPE as REFDATA_SCOPE
+
+
+def fragment_cache():
+    # The {% cache %} tag uses this alias when it is configured.
+    return caches['template_fragments' if 'template_fragments' in settings.CACHES else 'default']
+
+
+class FragmentCache:
+    """One cached fragment of a page rendered for ``user_id``."""
+
+    def __init__(self, name, user_id, *parts):
+        self.name = name
+        versions = [user_id, get_user_version(user_id), get_version(REFDATA_SCOPE)]
+        self.vary = ':'.join(str(part) for part in versions + list(parts))
+        self.timeout = getattr(settings, 'DRT_FRAGMENT_CACHE_TIMEOUT', 600)
+
+    @cached_property
+    def hit(self):
+        """Whether the fragment is cached right now; only labels ``Server-Timing``."""
+        key = make_template_fragment_key(self.name, [self.vary])
+        return fragment_cache().get(key) is not None
+
+
+def render_timed(fragment, render):
+    """Call ``render()`` and report its time and the fragment outcome as ``Server-Timing``."""
+    outcome = 'hit' if fragment.hit else 'miss'  # before rendering fills the cache
+    started = time.perf_counter()
+    response = render()
+    if hasattr(response, 'render'):
+        response.render()  # TemplateResponse renders lazily; time it here
+    elapsed = (time.perf_counter() - started) * 1000
+    add_server_timing(response, f'tpl;dur={elapsed:.1f};desc="fragment {outcome}"')
+    return response
+
+
+class FragmentCacheMixin:
+    """Class-based view mixin exposing ``self.fragment`` to the view and as ``fragment`` in templates."""
+    fragment_name = None
+
+    def get_fragment_parts(self):
+        """Values besides the user's data versions that the fragment depends on."""
+        return []
+
+    @cached_property
+    def fragment(self):
+        return FragmentCache(self.fragment_name, self.request.user.pk, *self.get_fragment_parts())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['fragment'] = self.fragment
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        render = super().render_to_response
+        return render_timed(self.fragment, lambda: render(context, **response_kwargs))
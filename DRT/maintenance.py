@@ -0,0 +1,111 @@
+"""
+Upkeep of derived data after receipt writes.
+
+Every receipt-side write has to refresh the affected ``DailySpend`` buckets,
+move the matching budgets' consumption counters, bump the owner's cache data
+version and reindex the receipt for search. Single-row writes do this
+straight from the model signals; bulk paths wrap their work in
+``deferred_maintenance()`` so each bucket and user is handled once, at the end
+of the batch, instead of once per row.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+
+from .budgets import apply_spend
+from .cache import bump_user_version
+from .rollups import refresh_daily_spend, refresh_daily_spend_days
+from .search import get_backend as get_search_backend
+
+_pending = ContextVar('drt_pending_maintenance', default=None)
+
+
+class PendingMaintenance:
+    def __init__(self):
+        self.buckets = set()
+        self.spend = defaultdict(Decimal)
+        self.users = set()
+        self.search = set()
+
+    def flush(self):
+        if self.spend:
+            apply_spend(self.spend)
+        days_by_user = defaultdict(set)
+        for user_id, day in self.buckets:
+            days_by_user[user_id].add(day)
+        for user_id, days in sorted(days_by_user.items()):
+            refresh_daily_spend_days(user_id, sorted(days))
+        for user_id in self.users:
+            invalidate_user(user_id)
+        if self.search:
+            get_search_backend().index(sorted(self.search))
+
+
+@contextmanager
+def deferred_maintenance():
+    """
+    Collect rollup refreshes and cache invalidations until the block exits.
+
+    Use inside the writing transaction so the rollup commits with the data.
+    Nothing is flushed if the block raises, since the writes roll back too.
+    """
+    if _pending.get() is not None:
+        yield _pending.get()
+        return
+    pending = PendingMaintenance()
+    token = _pending.set(pending)
+    try:
+        yield pending
+    finally:
+        _pending.reset(token)
+    pending.flush()
+
+
+def invalidate_user(user_id):
+    # Bump now so reads later in this transaction miss, and again on commit
+    # so nothing cached from pre-commit data survives.
+    bump_user_version(user_id)
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+def schedule_rollup(user_id, day):
+    pending = _pending.get()
+    if pending is None:
+        refresh_daily_spend(user_id, day)
+    else:
+        pending.buckets.add((user_id, day))
+
+
+def schedule_budget_spend(deltas):
+    """
+    Add ``{(user_id, category_id, day): amount}`` to the budgets covering each day.
+
+    Pass all of one write's deltas together: moving a receipt between budgets
+    must net out before thresholds are checked.
+    """
+    pending = _pending.get()
+    if pending is None:
+        apply_spend(deltas)
+    else:
+        for key, amount in deltas.items():
+            pending.spend[key] += amount
+
+
+def schedule_invalidation(user_id):
+    pending = _pending.get()
+    if pending is None:
+        invalidate_user(user_id)
+    else:
+        pending.users.add(user_id)
+
+
+def schedule_search_index(receipt_ids):
+    pending = _pending.get()
+    if pending is None:
+        get_search_backend().index(receipt_ids)
+    else:
+        pending.search.update(receipt_ids)
@@ -0,0 +1,127 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from DRT.compiled import CompiledSerializer
+from DRT.models import Budget, Category, PaymentMethod, Receipt, ReceiptItem, ReceiptPayment
+from DRT.serializers import (
+    BudgetSerializer, ReceiptItemSerializer, ReceiptPaymentSerializer, ReceiptSerializer,
+    capped_attr, receipt_nested_limit,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF and compiled serialization of receipts, budgets, payments and items "
+        "on synthetic data. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='20,100,1000', help="Comma-separated row counts.")
+        parser.add_argument('--repeat', type=int, default=5, help="Best of this many runs.")
+        parser.add_argument('--items', type=int, default=5, help="Line items per receipt.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(n) for n in options['rows'].split(',') if n.strip()})
+        except ValueError:
+            raise CommandError("--rows must be a comma-separated list of integers.")
+        if not sizes or min(sizes) < 1:
+            raise CommandError("--rows needs at least one positive count.")
+
+        with transaction.atomic():
+            user = self.seed(max(sizes), options['items'])
+            for size in sizes:
+                for label, rows, serializer_class in self.cases(user, size):
+                    self.compare(label, size, rows, serializer_class, options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, count, items_per_receipt):
+        user = User.objects.create_user(username=f'benchmark-{time.monotonic_ns()}')
+        category = Category.objects.create(name=f'Benchmark {user.pk}')
+        method = PaymentMethod.objects.create(name=f'Benchmark {user.pk}')
+        today = timezone.now().date()
+        receipts = Receipt.objects.bulk_create([
+            Receipt(
+                user=user, category=category, store_name=f'Store {n}', total_amount=Decimal('12.34'),
+                purchase_date=today - timedelta(days=n % 365), notes='benchmark',
+            )
+            for n in range(count)
+        ])
+        if not receipts[0].pk:
+            receipts = list(Receipt.objects.filter(user=user).order_by('pk'))
+        ReceiptItem.objects.bulk_create([
+            ReceiptItem(
+                receipt=receipt, item_name=f'Item {n}', quantity=2,
+                unit_price=Decimal('1.50'), total_price=Decimal('3.00'),
+            )
+            for receipt in receipts for n in range(items_per_receipt)
+        ])
+        ReceiptPayment.objects.bulk_create([
+            ReceiptPayment(
+                receipt=receipt, payment_method=method, amount_paid=Decimal('12.34'), paid_at=timezone.now(),
+            )
+            for receipt in receipts
+        ])
+        Budget.objects.bulk_create([
+            Budget(
+                user=user, category=category, amount_limit=Decimal('500.00'),
+                period_start=date(2000, 1, 1) + timedelta(days=n),
+                period_end=date(2000, 1, 31) + timedelta(days=n),
+            )
+            for n in range(count)
+        ])
+        return user
+
+    def cases(self, user, size):
+        limit = receipt_nested_limit()
+        receipts = (
+            Receipt.objects.filter(user=user).select_related('user').order_by('pk')
+            .prefetch_related(
+                Prefetch('items', queryset=ReceiptItem.objects.order_by('id')[:limit + 1],
+                         to_attr=capped_attr('items')),
+                Prefetch('payments', queryset=ReceiptPayment.objects.order_by('id')[:limit + 1],
+                         to_attr=capped_attr('payments')),
+            )
+        )
+        yield 'receipts', list(receipts[:size]), ReceiptSerializer
+        yield 'budgets', list(Budget.objects.filter(user=user).select_related('user')[:size]), BudgetSerializer
+        yield 'payments', list(ReceiptPayment.objects.filter(receipt__user=user)[:size]), ReceiptPaymentSerializer
+        yield 'items', list(ReceiptItem.objects.filter(receipt__user=user)[:size]), ReceiptItemSerializer
+
+    def compare(self, label, size, rows, serializer_class, repeat):
+        renderer = JSONRenderer()
+
+        def drf():
+            return renderer.render(serializer_class(rows, many=True).data)
+
+        def compiled():
+            return renderer.render(CompiledSerializer(serializer_class(rows, many=True)).data)
+
+        if drf() != compiled():
+            raise CommandError(f"{label}: compiled output differs from DRF output.")
+        drf_time, compiled_time = self.best(drf, repeat), self.best(compiled, repeat)
+        self.stdout.write(
+            f"{label:>8} x{size:<5} drf {drf_time * 1000:8.2f} ms  "
+            f"compiled {compiled_time * 1000:8.2f} ms  "
+            f"speedup {drf_time / compiled_time if compiled_time else 0:5.1f}x  "
+            f"({len(drf())} bytes)"
+        )
+
+    @staticmethod
+    def best(fn, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
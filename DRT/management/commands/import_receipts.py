@@ -0,0 +1,161 @@
+import csv
+import json
+import os
+import time
+from collections import namedtuple
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from DRT.bulk import insert_receipts, resolve_names
+from DRT.models import Category, ImportCheckpoint, PaymentMethod
+from DRT.serializers import BulkReceiptSerializer
+
+User = get_user_model()
+
+JSON_CELLS = ('tags', 'items', 'payments')
+
+# Yielded in place of a record that could not be parsed, so it is rejected at
+# its own position and record offsets (and so checkpoints) stay aligned.
+Unreadable = namedtuple('Unreadable', 'error')
+
+
+def read_ndjson(handle):
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield Unreadable(f"invalid JSON: {exc}")
+            continue
+        yield record if isinstance(record, dict) else Unreadable("not a JSON object")
+
+
+def read_csv(handle):
+    """Rows in the ``/api/receipts/export/?format=csv`` layout (nested cells are JSON)."""
+    rows = csv.DictReader(handle)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            yield Unreadable(f"invalid CSV: {exc}")
+            continue
+        try:
+            for key in JSON_CELLS:
+                row[key] = json.loads(row[key]) if row.get(key) else []
+        except json.JSONDecodeError as exc:
+            yield Unreadable(f"invalid JSON in '{key}': {exc}")
+            continue
+        yield row
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson, 'jsonl': read_ndjson}
+
+
+def prepare(record, category_ids, method_ids):
+    """Swap exported names for this database's reference ids."""
+    record = dict(record)
+    record['category'] = category_ids.get(record.get('category_name'))
+    record['payments'] = [
+        dict(payment, payment_method=method_ids.get(payment.get('payment_method_name')))
+        for payment in record.get('payments') or []
+    ]
+    return record
+
+
+class Command(BaseCommand):
+    help = (
+        "Import receipts with nested items, payments and tags from CSV or NDJSON "
+        "(the /api/receipts/export/ formats), resuming from the last checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file.")
+        parser.add_argument('--user', required=True, help="Username that will own the receipts.")
+        parser.add_argument('--format', choices=sorted(READERS), help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--restart', action='store_true', help="Ignore any saved checkpoint.")
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in READERS:
+            raise CommandError("Cannot infer the format; pass --format csv|ndjson.")
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(user=user, source=path)
+        if options['restart']:
+            checkpoint.offset = checkpoint.imported = checkpoint.rejected = 0
+            checkpoint.save()
+        elif checkpoint.offset:
+            self.stdout.write(f"Resuming after {checkpoint.offset} records.")
+
+        started = time.monotonic()
+        processed = 0
+        with open(path, newline='', encoding='utf-8') as handle:
+            records = islice(READERS[fmt](handle), checkpoint.offset, None)
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                batch_started = time.monotonic()
+                imported, errors = self.import_batch(user, batch, checkpoint)
+                processed += len(batch)
+                for index, error in errors:
+                    self.stderr.write(f"record {index}: {error}")
+                elapsed = time.monotonic() - batch_started
+                self.stdout.write(
+                    f"offset {checkpoint.offset}: {imported} imported, {len(errors)} rejected "
+                    f"({len(batch) / elapsed if elapsed else 0:.0f} rows/s)"
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} records in {elapsed:.1f}s "
+            f"({processed / elapsed if elapsed else 0:.0f} rows/s); "
+            f"{checkpoint.imported} imported, {checkpoint.rejected} rejected in total."
+        ))
+
+    def import_batch(self, user, batch, checkpoint):
+        records = [r for r in batch if not isinstance(r, Unreadable)]
+        category_ids = resolve_names(
+            Category, (r.get('category_name') for r in records if r.get('category_name'))
+        )
+        method_ids = resolve_names(PaymentMethod, (
+            p.get('payment_method_name') for r in records for p in r.get('payments') or []
+            if p.get('payment_method_name')
+        ))
+
+        valid_rows, errors = [], []
+        for position, record in enumerate(batch, start=checkpoint.offset):
+            if isinstance(record, Unreadable):
+                errors.append((position, record.error))
+                continue
+            serializer = BulkReceiptSerializer(data=prepare(record, category_ids, method_ids))
+            if serializer.is_valid():
+                valid_rows.append(serializer.validated_data)
+            else:
+                errors.append((position, serializer.errors))
+
+        # Rows and checkpoint commit together, so a crash never double-imports.
+        with transaction.atomic():
+            insert_receipts(user, valid_rows, batch_size=len(batch))
+            checkpoint.offset += len(batch)
+            checkpoint.imported += len(valid_rows)
+            checkpoint.rejected += len(errors)
+            checkpoint.save()
+        return len(valid_rows), errors
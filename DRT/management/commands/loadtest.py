@@ -0,0 +1,149 @@
+import asyncio
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+
+def request_host():
+    """A Host header ``ALLOWED_HOSTS`` accepts (the test clients default to ``testserver``)."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'  # matches '*', and what DEBUG allows with no ALLOWED_HOSTS
+
+
+class HostAsyncClient(AsyncClient):
+    """``AsyncClient`` that sends ``host`` instead of its hard-coded ``testserver`` Host header."""
+
+    def __init__(self, host, **defaults):
+        super().__init__(**defaults)
+        self.host = host.encode('latin1')
+
+    def request(self, **request):
+        request['headers'] = [(b'host', self.host)] + [
+            header for header in request['headers'] if header[0] != b'host'
+        ]
+        return super().request(**request)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare WSGI and ASGI throughput for an API read at a given concurrency. "
+        "By default both stacks run in-process (Django's WSGI and ASGI handlers); "
+        "pass --wsgi-url/--asgi-url to load running servers instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Username to authenticate as (token auth).")
+        parser.add_argument('--path', default='/api/receipts/', help="Sync endpoint to load.")
+        parser.add_argument(
+            '--async-path', help="Endpoint for the ASGI run; defaults to the /api/async/ twin of --path."
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--wsgi-url', help="Base URL of a running WSGI server, e.g. http://127.0.0.1:8000")
+        parser.add_argument('--asgi-url', help="Base URL of a running ASGI server, e.g. http://127.0.0.1:8001")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        token, _ = Token.objects.get_or_create(user=user)
+        self.auth = f'Token {token.key}'
+        self.host = request_host()
+        sync_path = options['path']
+        async_path = options['async_path'] or sync_path.replace('/api/', '/api/async/', 1)
+        total, concurrency = options['requests'], options['concurrency']
+
+        runs = [
+            ('wsgi', sync_path, options['wsgi_url']),
+            ('asgi', async_path, options['asgi_url']),
+        ]
+        failed = False
+        for label, path, base_url in runs:
+            if base_url:
+                latencies, errors, elapsed = self.run_http(base_url.rstrip('/') + path, total, concurrency)
+            elif label == 'wsgi':
+                latencies, errors, elapsed = self.run_wsgi(path, total, concurrency)
+            else:
+                latencies, errors, elapsed = asyncio.run(self.run_asgi(path, total, concurrency))
+            self.report(label, path, latencies, errors, elapsed)
+            failed = failed or bool(errors)
+        if failed:
+            raise CommandError("Some requests failed, so no throughput was reported for those runs.")
+
+    def run_wsgi(self, path, total, concurrency):
+        def one(_):
+            started = time.perf_counter()
+            response = Client(headers={'Host': self.host}).get(path, HTTP_AUTHORIZATION=self.auth)
+            return time.perf_counter() - started, response.status_code
+
+        return self.run_threads(one, total, concurrency)
+
+    def run_http(self, url, total, concurrency):
+        def one(_):
+            request = urllib.request.Request(url, headers={'Authorization': self.auth})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    code = response.status
+            except urllib.error.HTTPError as exc:
+                code = exc.code
+            return time.perf_counter() - started, code
+
+        return self.run_threads(one, total, concurrency)
+
+    def run_threads(self, one, total, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(total)))
+        return self.summarize(results, time.perf_counter() - started)
+
+    async def run_asgi(self, path, total, concurrency):
+        client = HostAsyncClient(self.host)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with limit:
+                started = time.perf_counter()
+                response = await client.get(path, headers={'Authorization': self.auth})
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        return self.summarize(results, time.perf_counter() - started)
+
+    @staticmethod
+    def summarize(results, elapsed):
+        latencies = sorted(latency for latency, _ in results)
+        errors = Counter(code for _, code in results if code >= 400)
+        return latencies, errors, elapsed
+
+    def report(self, label, path, latencies, errors, elapsed):
+        if errors:
+            codes = ', '.join(f'{count}x {code}' for code, count in sorted(errors.items()))
+            self.stderr.write(
+                f"{label} {path}: {sum(errors.values())} of {len(latencies)} requests failed ({codes}); "
+                f"not reporting throughput"
+            )
+            return
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{label} {path}: {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms"
+        )
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from DRT.rollups import rebuild_daily_spend
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or backfill) the DailySpend rollup from receipts and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild this username.")
+        parser.add_argument('--since', help="Only rebuild buckets on or after this date (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        total_rows = 0
+        # One transaction per user keeps lock time bounded on large tables.
+        for user_id in users.values_list('pk', flat=True).iterator():
+            total_rows += rebuild_daily_spend(user_id, since=since)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt DailySpend rollup: {total_rows} rows written."))
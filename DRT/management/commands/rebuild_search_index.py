@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from DRT.models import Receipt
+from DRT.search import get_backend
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for receipts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only reindex this username's receipts.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        receipts = Receipt.objects.order_by('pk')
+        if options['user']:
+            try:
+                receipts = receipts.filter(user=User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        backend = get_backend()
+        batch, total = [], 0
+        for receipt_id in receipts.values_list('pk', flat=True).iterator():
+            batch.append(receipt_id)
+            if len(batch) >= options['batch_size']:
+                backend.index(batch)
+                total += len(batch)
+                batch = []
+        backend.index(batch)
+        total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} receipts with {type(backend).__name__}."
+        ))
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from DRT.budgets import consumption_drift, recount
+from DRT.models import Budget
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every budget's consumed amount from its receipts and report "
+        "the budgets whose counter had drifted. Corrected budgets are re-armed "
+        "for alerts without notifying anyone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only reconcile this username's budgets.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without correcting it.")
+
+    def handle(self, *args, **options):
+        budgets = Budget.objects.all()
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+            budgets = budgets.filter(user=user)
+
+        drift = consumption_drift(budgets)
+        for pk, recorded, actual in drift:
+            self.stdout.write(f"budget {pk}: recorded {recorded}, receipts total {actual} (off by {recorded - actual})")
+        if drift and not options['dry_run']:
+            recount([pk for pk, _, _ in drift], notify=False)
+
+        checked = budgets.count()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f"All {checked} budgets match their receipts."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} of {checked} budgets have drifted (not corrected)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Corrected {len(drift)} of {checked} budgets."))
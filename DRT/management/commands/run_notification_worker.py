@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from DRT.notifications import drain_outbox, outbox_lag
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued notifications from the outbox in batches. Runs until "
+        "interrupted unless --once is given; reports queue lag after each batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'DRT_NOTIFICATION_BATCH_SIZE', 500),
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            default=getattr(settings, 'DRT_NOTIFICATION_POLL_INTERVAL', 1.0),
+            help="Seconds to sleep when the outbox is empty.",
+        )
+        parser.add_argument('--once', action='store_true', help="Drain the outbox, then exit.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                lag = outbox_lag()
+                drained, delivered = drain_outbox(options['batch_size'])
+                if drained:
+                    total += delivered
+                    self.stdout.write(
+                        f"Delivered {delivered} notification(s) from {drained} queued; lag {lag:.1f}s"
+                    )
+                if drained < options['batch_size']:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Delivered {total} notification(s)."))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DRT', '0002_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['user', '-purchase_date', '-uploaded_at', 'id'], name='receipt_user_keyset_idx'),
+        ),
+    ]
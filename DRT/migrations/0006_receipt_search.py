@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_fulltext_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS "DRT_receipt_fts" '
+            'USING fts5(body, tokenize="unicode61 remove_diacritics 2")'
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX receipt_search_body_ft ON DRT_receiptsearchdocument (body)'
+        )
+
+
+def drop_fulltext_structures(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS "DRT_receipt_fts"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DRT', '0005_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptSearchDocument',
+            fields=[
+                ('receipt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='DRT.receipt')),
+                ('body', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_structures, drop_fulltext_structures),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DRT', '0009_notification_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='digest_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:29
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_consumption(apps, schema_editor):
+    # Existing budgets start out already alerted for the thresholds they have
+    # reached, so migrating does not notify anyone.
+    Budget = apps.get_model('DRT', 'Budget')
+    Receipt = apps.get_model('DRT', 'Receipt')
+    money = DecimalField(max_digits=14, decimal_places=2)
+    totals = (
+        Receipt.objects.filter(
+            user=OuterRef('user'),
+            category=OuterRef('category'),
+            purchase_date__gte=OuterRef('period_start'),
+            purchase_date__lte=OuterRef('period_end'),
+        )
+        .order_by().values('user').annotate(total=Sum('total_amount')).values('total')[:1]
+    )
+    Budget.objects.update(
+        consumed_amount=Coalesce(Subquery(totals, output_field=money), Value(Decimal('0.00')), output_field=money)
+    )
+    thresholds = sorted(getattr(settings, 'DRT_BUDGET_ALERT_THRESHOLDS', (80, 100)), reverse=True)
+    for budget in Budget.objects.filter(consumed_amount__gt=0, amount_limit__gt=0).iterator():
+        level = next((t for t in thresholds if budget.consumed_amount * 100 >= budget.amount_limit * t), 0)
+        if level:
+            Budget.objects.filter(pk=budget.pk).update(alerted_threshold=level)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DRT', '0010_notification_digest_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='alerted_threshold',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='consumed_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_consumption, migrations.RunPython.noop),
+    ]
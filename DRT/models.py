@@ -1,14 +1,23 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.db.models import Q, F
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
 
+from .registry import reference_data
+
 # Alias for cleaner code
 User = settings.AUTH_USER_MODEL
 
 
+def owner_label(instance):
+    """The owner's username if already loaded, else their id; ``__str__`` never queries for it."""
+    if type(instance).user.is_cached(instance):
+        return instance.user.username
+    return f"user {instance.user_id}"
+
+
 class Category(models.Model):
     """Expense category (e.g., Groceries, Utilities, Transport)."""
     name = models.CharField(max_length=100, unique=True)
@@ -49,12 +58,18 @@ class Receipt(models.Model):
     currency = models.CharField(max_length=10, default="KES")
     purchase_date = models.DateField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True)
 
     class Meta:
         indexes = [
             models.Index(fields=["user", "purchase_date"]),
             models.Index(fields=["user", "category"]),
+            # Covers keyset pagination seeking on (-purchase_date, -uploaded_at, id)
+            models.Index(
+                fields=["user", "-purchase_date", "-uploaded_at", "id"],
+                name="receipt_user_keyset_idx",
+            ),
         ]
         ordering = ["-purchase_date", "-uploaded_at"]
 
@@ -78,7 +93,7 @@ class Receipt(models.Model):
             })
         
         # Validate category exists if provided
-        if self.category_id and not Category.objects.filter(id=self.category_id).exists():
+        if self.category_id and reference_data.category(self.category_id) is None:
             raise ValidationError({
                 'category': 'Selected category does not exist.'
             })
@@ -86,7 +101,9 @@ class Receipt(models.Model):
     def save(self, *args, **kwargs):
         """Ensure validation runs before saving."""
         self.clean()
-        super().save(*args, **kwargs)
+        # Atomic so post_save rollup maintenance commits with the receipt.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class ReceiptItem(models.Model):
@@ -156,7 +173,7 @@ class ReceiptPayment(models.Model):
         ]
 
     def __str__(self):
-        method = self.payment_method.name if self.payment_method else "Unknown"
+        method = reference_data.payment_method_name(self.payment_method_id) or "Unknown"
         return f"{self.amount_paid} via {method} on {self.paid_at.date()}"
     
     def clean(self):
@@ -170,7 +187,7 @@ class ReceiptPayment(models.Model):
             })
         
         # Validate payment method exists if provided
-        if self.payment_method_id and not PaymentMethod.objects.filter(id=self.payment_method_id).exists():
+        if self.payment_method_id and reference_data.payment_method(self.payment_method_id) is None:
             raise ValidationError({
                 'payment_method': 'Selected payment method does not exist.'
             })
@@ -184,7 +201,9 @@ class ReceiptPayment(models.Model):
     def save(self, *args, **kwargs):
         """Ensure validation runs before saving."""
         self.clean()
-        super().save(*args, **kwargs)
+        # Atomic so post_save rollup maintenance commits with the payment.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class Tag(models.Model):
@@ -208,7 +227,7 @@ class ReceiptTag(models.Model):
         indexes = [models.Index(fields=["receipt"]), models.Index(fields=["tag"])]
 
     def __str__(self):
-        return f"{self.receipt_id}:{self.tag.name}"
+        return f"{self.receipt_id}:{reference_data.tag_name(self.tag_id)}"
 
 
 class Budget(models.Model):
@@ -221,9 +240,15 @@ class Budget(models.Model):
     amount_limit = models.DecimalField(max_digits=10, decimal_places=2)
     period_start = models.DateField()
     period_end = models.DateField()
+    # Running total of matching receipts, kept by ``DRT.budgets.apply_spend``.
+    consumed_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+    # Highest alert threshold (percent) already notified for this budget.
+    alerted_threshold = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    COUNTER_FIELDS = ('consumed_amount', 'alerted_threshold')
+
     class Meta:
         # Ensure valid periods and prevent duplicate budgets for same user/category/period window
         constraints = [
@@ -240,7 +265,8 @@ class Budget(models.Model):
         ordering = ["-period_start"]
 
     def __str__(self):
-        return f"{self.user} • {self.category.name} • {self.period_start} → {self.period_end}"
+        category = reference_data.category_name(self.category_id)
+        return f"{owner_label(self)} • {category} • {self.period_start} → {self.period_end}"
     
     def is_expired(self):
         """Check if the budget period has ended."""
@@ -263,7 +289,7 @@ class Budget(models.Model):
             })
         
         # Validate category exists
-        if self.category_id and not Category.objects.filter(id=self.category_id).exists():
+        if self.category_id and reference_data.category(self.category_id) is None:
             raise ValidationError({
                 'category': 'Selected category does not exist.'
             })
@@ -271,17 +297,139 @@ class Budget(models.Model):
     def save(self, *args, **kwargs):
         """Ensure validation runs before saving."""
         self.clean()
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Counters move with F() updates; never write back a stale copy.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        # Atomic so post_save recounting commits with the budget.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ReceiptSearchDocument(models.Model):
+    """
+    Denormalized search text for a receipt: store name, notes, category name
+    and item names. Queried by the MySQL FULLTEXT and fallback search
+    backends; the SQLite backend keeps the same text in an FTS5 table.
+    """
+    receipt = models.OneToOneField(
+        Receipt, on_delete=models.CASCADE, primary_key=True, related_name="search_document"
+    )
+    body = models.TextField()
+
+    def __str__(self):
+        return f"Search document for receipt {self.receipt_id}"
+
+
+class DailySpend(models.Model):
+    """
+    Per-user daily spend rollup, maintained from receipts and payments.
+
+    ``receipt`` rows hold receipt totals per (date, category, currency);
+    ``payment`` rows hold amounts paid per (date, category, payment method,
+    currency). Analytics read these instead of scanning raw receipts.
+    """
+    KIND_RECEIPT = "receipt"
+    KIND_PAYMENT = "payment"
+    KIND_CHOICES = [(KIND_RECEIPT, "Receipt"), (KIND_PAYMENT, "Payment")]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_spend")
+    date = models.DateField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    payment_method = models.ForeignKey(
+        PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    currency = models.CharField(max_length=10)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "kind", "date"])]
+        ordering = ["-date"]
+
+    def __str__(self):
+        return f"{self.user_id} • {self.date} • {self.kind} • {self.total} {self.currency}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a ``manage.py import_receipts`` run.
+
+    ``offset`` counts input records already handled and is saved in the same
+    transaction as each batch's rows, so a resumed import never duplicates.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="import_checkpoints")
+    source = models.CharField(max_length=500)
+    offset = models.PositiveBigIntegerField(default=0)
+    imported = models.PositiveBigIntegerField(default=0)
+    rejected = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "source")
+
+    def __str__(self):
+        return f"{self.source} @ {self.offset}"
 
 
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: the outbox worker stamps the time the event happened.
+    created_at = models.DateTimeField(default=timezone.now)
     is_read = models.BooleanField(default=False)
+    # For digests written by ``compact_notifications``: how many old
+    # notifications this row replaces. Zero for ordinary notifications.
+    digest_size = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread badge, mark-all-read and the keyset-paginated feed.
+            models.Index(fields=["user", "is_read", "-created_at"], name="notification_feed_idx"),
+        ]
+
+    def __str__(self):
+        return f"Notification for {owner_label(self)}"
+
+    @property
+    def is_digest(self):
+        return self.digest_size > 0
+
+
+class NotificationCounter(models.Model):
+    """
+    Per-user unread notification count, kept in step with ``Notification``.
+
+    Updated with ``F()`` expressions by ``notifications.adjust_unread`` so
+    concurrent changes never lose counts; a missing row means zero.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.unread} unread for user {self.user_id}"
+
+class NotificationOutbox(models.Model):
+    """
+    A notification waiting for ``manage.py run_notification_worker``.
+
+    Rows are written after the triggering transaction commits (see
+    ``notifications.py``) and deleted once delivered as ``Notification``s.
+    Intents sharing a ``key`` for the same user coalesce into one.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    message = models.TextField()
+    key = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["id"]
 
     def __str__(self):
-        return f"Notification for {self.user.username}"
\ No newline at end of file
+        return f"Pending notification {self.pk} for user {self.user_id}"
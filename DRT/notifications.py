@@ -0,0 +1,216 @@
+"""
+Notification delivery through an outbox.
+
+Views call ``notify()`` instead of creating ``Notification`` rows. The intent
+is queued with ``transaction.on_commit``, so a rolled-back write never
+notifies. Within a request, ``NotificationBatchMiddleware`` collects every
+committed intent and writes them to ``NotificationOutbox`` in one INSERT after
+the view has run. An outbox failure is logged and never fails the user's
+write. ``manage.py run_notification_worker`` drains the outbox in batches,
+coalescing intents that share a key and bulk-creating the notifications.
+
+Each user's unread count lives in ``NotificationCounter``. Bulk paths here
+adjust it themselves; single-row saves and deletes go through the model
+signals.
+"""
+
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DatabaseError, transaction
+from django.db.models import F, Min
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter, NotificationOutbox
+from .registry import reference_data
+
+logger = logging.getLogger(__name__)
+
+_batch = ContextVar('drt_notification_batch', default=None)
+
+
+def notify(user, message, key=''):
+    """
+    Queue ``message`` for ``user`` once the current transaction commits.
+
+    Pending intents for the same user and non-empty ``key`` coalesce: only
+    the latest message is delivered.
+    """
+    intent = NotificationOutbox(
+        user_id=getattr(user, 'pk', user), message=message, key=key, created_at=timezone.now()
+    )
+    transaction.on_commit(lambda: _enqueue(intent))
+
+
+def _enqueue(intent):
+    batch = _batch.get()
+    if batch is None:
+        write_outbox([intent])
+    else:
+        batch.append(intent)
+
+
+def write_outbox(intents):
+    try:
+        # A savepoint keeps a failure from breaking an enclosing transaction.
+        with transaction.atomic():
+            NotificationOutbox.objects.bulk_create(intents)
+    except DatabaseError:
+        logger.exception("Could not queue %d notification(s)", len(intents))
+
+
+@contextmanager
+def notification_batch():
+    """Write the intents committed inside the block to the outbox in one INSERT."""
+    if _batch.get() is not None:
+        yield
+        return
+    batch = []
+    token = _batch.set(batch)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        if batch:
+            write_outbox(batch)
+
+
+class NotificationBatchMiddleware:
+    """Batch each request's notifications (see ``notification_batch``)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with notification_batch():
+            return self.get_response(request)
+
+
+def coalesce(intents):
+    """Drop intents superseded by a later one with the same user and key."""
+    latest = {}
+    for intent in intents:
+        latest[(intent.user_id, intent.key or f'#{intent.pk}')] = intent
+    return sorted(latest.values(), key=lambda intent: intent.pk)
+
+
+def drain_outbox(batch_size=500):
+    """
+    Deliver up to ``batch_size`` outbox rows; returns ``(drained, delivered)``.
+
+    Rows are locked with ``SKIP LOCKED`` where supported, so several workers
+    can drain the same outbox.
+    """
+    with transaction.atomic():
+        intents = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+        )
+        if not intents:
+            return 0, 0
+        notifications = [
+            Notification(user_id=intent.user_id, message=intent.message, created_at=intent.created_at)
+            for intent in coalesce(intents)
+        ]
+        Notification.objects.bulk_create(notifications)
+        for user_id, count in Counter(n.user_id for n in notifications).items():
+            adjust_unread(user_id, count)
+        NotificationOutbox.objects.filter(pk__in=[intent.pk for intent in intents]).delete()
+    return len(intents), len(notifications)
+
+
+def with_read_state(queryset, is_read):
+    """
+    Filter notifications on ``is_read`` so the feed index can be used.
+
+    ``is_read=False`` compiles to ``NOT is_read``, which neither SQLite nor
+    MySQL matches against ``(user, is_read, -created_at)``; ``IN`` does.
+    """
+    return queryset.filter(is_read__in=[is_read])
+
+
+def adjust_unread(user_id, delta):
+    """Add ``delta`` to the user's unread count (never below zero)."""
+    if not delta:
+        return
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(
+        unread=Greatest(F('unread') + delta, 0)
+    )
+    if not updated and delta > 0:
+        _, created = NotificationCounter.objects.get_or_create(user_id=user_id, defaults={'unread': delta})
+        if not created:  # lost a race with another first notification
+            NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta)
+
+
+def unread_count(user):
+    """The user's unread notifications: one primary-key lookup."""
+    count = NotificationCounter.objects.filter(user_id=user.pk).values_list('unread', flat=True).first()
+    return count or 0
+
+
+def mark_read(user, pk):
+    """Mark one notification read; returns False if it is not the user's."""
+    with transaction.atomic():
+        updated = Notification.objects.filter(pk=pk, user=user, is_read=False).update(is_read=True)
+        adjust_unread(user.pk, -updated)
+    return bool(updated) or Notification.objects.filter(pk=pk, user=user).exists()
+
+
+def mark_all_read(user):
+    """Mark every unread notification read; returns how many changed."""
+    with transaction.atomic():
+        updated = with_read_state(Notification.objects.filter(user=user), False).update(is_read=True)
+        adjust_unread(user.pk, -updated)
+    return updated
+
+
+def outbox_lag():
+    """Seconds the oldest undelivered notification has been waiting (0 when empty)."""
+    oldest = NotificationOutbox.objects.aggregate(oldest=Min('created_at'))['oldest']
+    if oldest is None:
+        return 0.0
+    return max((timezone.now() - oldest).total_seconds(), 0.0)
+
+
+# Messages shared by the web and API views.
+
+WELCOME = "Welcome to Receipt Tracker! Start by adding your first receipt."
+
+
+def receipt_added(receipt):
+    return f"Receipt from '{receipt.store_name}' for Ksh {receipt.total_amount} was added."
+
+
+def receipt_updated(receipt):
+    return f"Receipt from '{receipt.store_name}' was updated."
+
+
+def receipts_imported(count):
+    return f"{count} receipt{'s' if count != 1 else ''} imported."
+
+
+def receipt_deleted(store_name, amount):
+    return f"Receipt from '{store_name}' (Ksh {amount}) was deleted."
+
+
+def budget_created(budget):
+    category = reference_data.category_name(budget.category_id)
+    return f"Budget for '{category}' (Ksh {budget.amount_limit}) created."
+
+
+def budget_updated(budget):
+    category = reference_data.category_name(budget.category_id)
+    return f"Budget for '{category}' updated to Ksh {budget.amount_limit}."
+
+
+def budget_deleted(category_name, amount):
+    return f"Budget for '{category_name}' (Ksh {amount}) was deleted."
+
+
+def budget_threshold_reached(budget, percent):
+    category = reference_data.category_name(budget.category_id)
+    if percent >= 100:
+        return f"Budget for '{category}' has reached {percent}% of its Ksh {budget.amount_limit} limit."
+    return f"Budget for '{category}' is {percent}% spent (limit Ksh {budget.amount_limit})."
@@ -0,0 +1,237 @@
+"""
+Keyset (cursor) pagination.
+
+Page-number pagination issues a COUNT(*) plus a growing OFFSET for every page,
+which gets linearly slower on deep pages. Keyset pagination instead seeks on
+the values of the ordering columns of the last row seen, so every page costs
+the same index range scan and no count query is needed.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor cannot be decoded or does not match the ordering."""
+
+
+class KeysetPage:
+    """A single page of keyset-paginated results."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Seek-based paginator over an ordered queryset.
+
+    ``ordering`` is a list of field names (``-`` prefix for descending). A
+    unique ``pk`` tiebreaker is appended if missing so that the position
+    encoded in a cursor is never ambiguous.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.page_size = page_size
+        ordering = [f for f in ordering if f.lstrip('-') not in ('pk', 'id')]
+        self.ordering = ordering + ['id']
+        self.model = queryset.model
+
+    # -- cursor encoding -------------------------------------------------
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [self._to_string(f, obj) for f in self.ordering]
+        payload = {'o': self.ordering, 'v': values}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if payload['o'] != self.ordering or len(payload['v']) != len(self.ordering):
+                raise InvalidCursor('Cursor does not match the current ordering.')
+            values = [
+                self._field(f).to_python(v) for f, v in zip(self.ordering, payload['v'])
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError) as exc:
+            raise InvalidCursor('Invalid cursor.') from exc
+        return values, bool(payload.get('r'))
+
+    def _field(self, name):
+        return self.model._meta.get_field(name.lstrip('-'))
+
+    def _to_string(self, name, obj):
+        value = getattr(obj, self._field(name).attname)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    # -- seeking ---------------------------------------------------------
+
+    def _seek_filter(self, values, reverse):
+        """
+        Build the lexicographic "row comes after the cursor" predicate.
+
+        For ordering (a, b, c) this is
+        ``a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)``,
+        with the comparison flipped for descending columns and again when
+        paging backwards.
+        """
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _order_by(self, reverse):
+        if not reverse:
+            return self.ordering
+        return [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+
+    def paginate(self, cursor=None):
+        reverse = False
+        queryset = self.queryset
+        if cursor:
+            values, reverse = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._seek_filter(values, reverse))
+
+        rows = list(queryset.order_by(*self._order_by(reverse))[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            # Moving forward we always know whether a next page exists; the
+            # previous page exists whenever we arrived via a cursor. Moving
+            # backwards the roles are swapped.
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(rows[-1])
+            if (reverse and has_more) or (cursor and not reverse):
+                previous_cursor = self.encode_cursor(rows[0], reverse=True)
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class ReceiptCursorPagination(BasePagination):
+    """
+    Opt-in keyset pagination for ``/api/receipts/``.
+
+    Enabled with ``?pagination=cursor`` (or by following a returned
+    ``cursor`` link). Respects the ordering chosen by ``OrderingFilter`` and
+    defaults to ``(-purchase_date, -uploaded_at, id)``, which is covered by
+    the ``(user, -purchase_date, -uploaded_at, id)`` index on ``Receipt``.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    page_size = api_settings.PAGE_SIZE
+    ordering = ['-purchase_date', '-uploaded_at', 'id']
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def is_requested(cls, request):
+        params = request.query_params
+        return params.get('pagination') == 'cursor' or cls.cursor_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset, view):
+        # Only concrete model fields can be encoded in a cursor; annotations
+        # such as a search rank are dropped.
+        field_names = {f.name for f in queryset.model._meta.concrete_fields}
+        ordering = list(queryset.query.order_by) if queryset.ordered else []
+        ordering = [f for f in ordering if isinstance(f, str) and f.lstrip('-') in field_names]
+        return ordering or self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        paginator = KeysetPaginator(
+            queryset, self.get_ordering(queryset, view), self.get_page_size(request)
+        )
+        try:
+            self.page = paginator.paginate(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = replace_query_param(self.base_url, 'pagination', 'cursor')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class NotificationCursorPagination(ReceiptCursorPagination):
+    """
+    Keyset pagination for ``/api/notifications/``, always on.
+
+    Newest first, covered by the ``(user, is_read, -created_at)`` index.
+    """
+    ordering = ['-created_at', 'id']
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
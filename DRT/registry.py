@@ -0,0 +1,119 @@
+"""
+In-process registry of reference data (categories, payment methods, tags).
+
+These tables are tiny and rarely change, yet validation, form choices and
+serializers used to query them on every request. The registry loads them
+once per process and reloads when the shared ``refdata`` version stamp in the
+cache changes; writes bump the stamp via model signals. The stamp is read at
+most once every ``DRT_REFDATA_CHECK_INTERVAL`` seconds rather than on every
+lookup, so a rename made by another process can take that long to show up
+here. A write in this process drops the local snapshot at once.
+
+A lookup that misses the snapshot falls back to the database, so a row
+created by another process is never rejected just because this process has
+not seen the new stamp yet (e.g. with a per-process locmem cache).
+"""
+
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_version, get_version
+
+SCOPE = 'refdata'
+
+
+class ReferenceRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+        self._checked_at = None
+
+    def _load(self):
+        def by_pk(model_name):
+            model = apps.get_model('DRT', model_name)
+            return {obj.pk: obj for obj in model.objects.order_by('name')}
+
+        return {
+            'categories': by_pk('Category'),
+            'payment_methods': by_pk('PaymentMethod'),
+            'tags': by_pk('Tag'),
+        }
+
+    def _snapshot(self):
+        data = self._data
+        now = time.monotonic()
+        interval = getattr(settings, 'DRT_REFDATA_CHECK_INTERVAL', 1.0)
+        if data is not None and self._checked_at is not None and now - self._checked_at < interval:
+            return data
+        version = get_version(SCOPE)
+        with self._lock:
+            if self._data is None or version != self._version:
+                self._data = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._data
+
+    def _get(self, table, model_name, pk):
+        if pk is None:
+            return None
+        obj = self._snapshot()[table].get(pk)
+        if obj is None:
+            obj = apps.get_model('DRT', model_name).objects.filter(pk=pk).first()
+            if obj is not None:
+                self.clear()
+        return obj
+
+    def clear(self):
+        """Drop this process's snapshot; the next lookup reloads."""
+        with self._lock:
+            self._data = None
+
+    def invalidate(self):
+        """Reload everywhere: bump the shared stamp now and again on commit."""
+        self.clear()
+        bump_version(SCOPE)
+        transaction.on_commit(lambda: bump_version(SCOPE))
+
+    @property
+    def version(self):
+        return get_version(SCOPE)
+
+    # -- lookups ---------------------------------------------------------
+
+    def categories(self):
+        """Categories ordered by name."""
+        return list(self._snapshot()['categories'].values())
+
+    def category(self, pk):
+        return self._get('categories', 'Category', pk)
+
+    def category_name(self, pk):
+        category = self.category(pk)
+        return category.name if category else None
+
+    def payment_methods(self):
+        """Payment methods ordered by name."""
+        return list(self._snapshot()['payment_methods'].values())
+
+    def payment_method(self, pk):
+        return self._get('payment_methods', 'PaymentMethod', pk)
+
+    def payment_method_name(self, pk):
+        method = self.payment_method(pk)
+        return method.name if method else None
+
+    def tag(self, pk):
+        return self._get('tags', 'Tag', pk)
+
+    def tag_name(self, pk):
+        tag = self.tag(pk)
+        return tag.name if tag else None
+
+
+reference_data = ReferenceRegistry()
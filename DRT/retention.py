@@ -0,0 +1,139 @@
+"""
+Notification retention: digest compaction and chunked purge.
+
+Both passes walk the table in fixed primary-key ranges, one short
+transaction per range. Each transaction locks at most ``chunk_size`` ids
+and can never turn into a full-table scan or delete. Ids increase with
+``created_at``, so old rows sit in a few low ranges.
+
+* ``purge_notifications`` deletes read and unread notifications older than
+  their own retention cutoffs. It adjusts unread counters for every unread
+  row it removes.
+* ``compact_notifications`` folds old read notifications into one digest row
+  per user and day. A day split across two ranges updates the digest written
+  by the first range.
+"""
+
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import Notification
+from .notifications import adjust_unread
+
+CHUNK_SIZE = 5000
+
+
+@dataclass
+class ChunkReport:
+    first_pk: int
+    last_pk: int
+    removed: int = 0
+    created: int = 0
+    seconds: float = 0.0
+
+    @property
+    def reclaimed(self):
+        return self.removed - self.created
+
+
+def _pk_ranges(queryset, chunk_size):
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for first in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        yield first, min(first + chunk_size - 1, bounds['high'])
+
+
+def _delete_ids(ids):
+    # Unread counters are adjusted per chunk by the caller, so skip the
+    # per-row post_delete signals and fetches of Collector-based deletes.
+    queryset = Notification.objects.filter(pk__in=ids)
+    return queryset._raw_delete(queryset.db)
+
+
+def expired(read_before, unread_before):
+    """Notifications past retention: read ones before ``read_before``, unread before ``unread_before``."""
+    condition = Q()
+    if read_before is not None:
+        condition |= Q(is_read__in=[True], created_at__lt=read_before)
+    if unread_before is not None:
+        condition |= Q(is_read__in=[False], created_at__lt=unread_before)
+    if not condition:
+        return Notification.objects.none()
+    return Notification.objects.filter(condition)
+
+
+def purge_notifications(read_before, unread_before, chunk_size=CHUNK_SIZE):
+    """Delete expired notifications, yielding a ``ChunkReport`` per pk range."""
+    queryset = expired(read_before, unread_before)
+    for first, last in _pk_ranges(queryset, chunk_size):
+        started = time.perf_counter()
+        with transaction.atomic():
+            # Lock the chunk: a mark_read landing between this read and the
+            # delete would otherwise take the same row off the unread counter.
+            rows = list(
+                queryset.filter(pk__gte=first, pk__lte=last)
+                .select_for_update().values_list('pk', 'user_id', 'is_read')
+            )
+            removed = _delete_ids([pk for pk, _, _ in rows]) if rows else 0
+            for user_id, count in Counter(user_id for _, user_id, is_read in rows if not is_read).items():
+                adjust_unread(user_id, -count)
+        yield ChunkReport(first, last, removed=removed, seconds=time.perf_counter() - started)
+
+
+def digest_message(size, day):
+    return f"{size} earlier notification{'s' if size != 1 else ''} from {day:%d %b %Y}."
+
+
+def compact_notifications(before, chunk_size=CHUNK_SIZE):
+    """Fold read notifications older than ``before`` into per-user daily digests."""
+    queryset = Notification.objects.filter(
+        is_read__in=[True], digest_size=0, created_at__lt=before
+    )
+    for first, last in _pk_ranges(queryset, chunk_size):
+        started = time.perf_counter()
+        with transaction.atomic():
+            rows = list(
+                queryset.filter(pk__gte=first, pk__lte=last)
+                .select_for_update().values_list('pk', 'user_id', 'created_at')
+            )
+            groups = defaultdict(int)
+            for _, user_id, created_at in rows:
+                groups[(user_id, timezone.localdate(created_at))] += 1
+            created = _write_digests(groups) if groups else 0
+            removed = _delete_ids([pk for pk, _, _ in rows]) if rows else 0
+        yield ChunkReport(first, last, removed=removed, created=created, seconds=time.perf_counter() - started)
+
+
+def _write_digests(groups):
+    """Add ``{(user_id, day): size}`` to existing digests or create new ones; returns rows created."""
+    starts = {key: timezone.make_aware(datetime.combine(key[1], datetime.min.time())) for key in groups}
+    existing = {
+        (digest.user_id, timezone.localdate(digest.created_at)): digest
+        for digest in Notification.objects.filter(
+            digest_size__gt=0,
+            user_id__in={user_id for user_id, _ in groups},
+            created_at__in=set(starts.values()),
+        )
+    }
+    new = []
+    for key, size in groups.items():
+        digest = existing.get(key)
+        if digest is None:
+            new.append(Notification(
+                user_id=key[0], message=digest_message(size, key[1]), created_at=starts[key],
+                is_read=True, digest_size=size,
+            ))
+        else:
+            size += digest.digest_size
+            Notification.objects.filter(pk=digest.pk).update(
+                digest_size=size, message=digest_message(size, key[1])
+            )
+    Notification.objects.bulk_create(new)
+    return len(new)
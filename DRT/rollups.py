@@ -0,0 +1,165 @@
+"""
+Daily spend rollup maintenance and queries.
+
+``DailySpend`` rows are derived data: a (user, date) bucket can always be
+recomputed from the receipts and payments dated that day. Writes refresh only
+the buckets they touch, and analytics read O(days) rollup rows instead of
+O(receipts) raw rows.
+"""
+
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import DailySpend, Receipt, ReceiptPayment
+
+User = get_user_model()
+
+
+def _rollup_rows(receipts, payments):
+    """Aggregate receipts and payments into unsaved ``DailySpend`` rows."""
+    rows = []
+    receipt_groups = (
+        receipts.order_by()
+        .values('user_id', 'purchase_date', 'category_id', 'currency')
+        .annotate(total=Sum('total_amount'), count=Count('id'))
+    )
+    for group in receipt_groups:
+        rows.append(DailySpend(
+            user_id=group['user_id'],
+            date=group['purchase_date'],
+            kind=DailySpend.KIND_RECEIPT,
+            category_id=group['category_id'],
+            currency=group['currency'],
+            total=group['total'],
+            count=group['count'],
+        ))
+
+    payment_groups = (
+        payments.order_by()
+        .values(
+            'receipt__user_id', 'receipt__purchase_date', 'receipt__category_id',
+            'receipt__currency', 'payment_method_id',
+        )
+        .annotate(total=Sum('amount_paid'), count=Count('id'))
+    )
+    for group in payment_groups:
+        rows.append(DailySpend(
+            user_id=group['receipt__user_id'],
+            date=group['receipt__purchase_date'],
+            kind=DailySpend.KIND_PAYMENT,
+            category_id=group['receipt__category_id'],
+            payment_method_id=group['payment_method_id'],
+            currency=group['receipt__currency'],
+            total=group['total'],
+            count=group['count'],
+        ))
+    return rows
+
+
+def refresh_daily_spend(user_id, day):
+    """Recompute the rollup bucket for one user and day."""
+    refresh_daily_spend_days(user_id, [day])
+
+
+def refresh_daily_spend_days(user_id, days):
+    """Recompute the rollup buckets for one user on each of ``days``."""
+    days = list(days)
+    with transaction.atomic():
+        # Serialize concurrent refreshes of the same user's buckets.
+        list(User.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+        DailySpend.objects.filter(user_id=user_id, date__in=days).delete()
+        rows = _rollup_rows(
+            Receipt.objects.filter(user_id=user_id, purchase_date__in=days),
+            ReceiptPayment.objects.filter(receipt__user_id=user_id, receipt__purchase_date__in=days),
+        )
+        DailySpend.objects.bulk_create(rows)
+
+
+def rebuild_daily_spend(user_id, since=None):
+    """
+    Rebuild every rollup bucket for a user, optionally from ``since`` onwards.
+
+    Returns the number of rollup rows written.
+    """
+    receipts = Receipt.objects.filter(user_id=user_id)
+    payments = ReceiptPayment.objects.filter(receipt__user_id=user_id)
+    existing = DailySpend.objects.filter(user_id=user_id)
+    if since:
+        receipts = receipts.filter(purchase_date__gte=since)
+        payments = payments.filter(receipt__purchase_date__gte=since)
+        existing = existing.filter(date__gte=since)
+
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+        existing.delete()
+        rows = _rollup_rows(receipts, payments)
+        DailySpend.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _summary_queries(user, start_date, end_date):
+    """The independent rollup queries behind ``spend_summary``."""
+    rows = DailySpend.objects.filter(user=user, date__range=[start_date, end_date])
+    receipt_rows = rows.filter(kind=DailySpend.KIND_RECEIPT)
+
+    category_expenses = receipt_rows.values('category__name').annotate(
+        total=Sum('total'), count=Sum('count')
+    ).order_by('-total')
+
+    monthly_expenses = receipt_rows.annotate(month=TruncMonth('date')).values('month').annotate(
+        total=Sum('total'), count=Sum('count')
+    ).order_by('month')
+
+    payment_methods = rows.filter(kind=DailySpend.KIND_PAYMENT).values(
+        'payment_method__name'
+    ).annotate(total=Sum('total'), count=Sum('count')).order_by('-total')
+
+    return receipt_rows, category_expenses, monthly_expenses, payment_methods
+
+
+def _summary_result(summary, category_expenses, monthly_expenses, payment_methods):
+    return {
+        'summary': {
+            'total_expenses': summary['total'] or 0,
+            'total_receipts': summary['count'] or 0,
+        },
+        'by_category': list(category_expenses),
+        'by_month': list(monthly_expenses),
+        'by_payment_method': list(payment_methods),
+    }
+
+
+def spend_summary(user, start_date, end_date):
+    """Analytics aggregates for ``user`` between two dates, read from the rollup."""
+    receipt_rows, *breakdowns = _summary_queries(user, start_date, end_date)
+    summary = receipt_rows.aggregate(total=Sum('total'), count=Sum('count'))
+    return _summary_result(summary, *(list(qs) for qs in breakdowns))
+
+
+async def aspend_summary(user, start_date, end_date, run=None):
+    """
+    ``spend_summary`` for async views; the four queries are awaited together.
+
+    ``run`` maps a zero-argument sync callable to an awaitable. By default the
+    async ORM is used, which keeps the event loop free but still executes the
+    queries one after another on the request's database connection. Pass a
+    runner that uses separate connections to overlap them on the server.
+    """
+    receipt_rows, *breakdowns = _summary_queries(user, start_date, end_date)
+    if run is None:
+        async def fetch(queryset):
+            return [row async for row in queryset]
+        results = await asyncio.gather(
+            receipt_rows.aaggregate(total=Sum('total'), count=Sum('count')),
+            *(fetch(qs) for qs in breakdowns),
+        )
+    else:
+        results = await asyncio.gather(
+            run(lambda: receipt_rows.aggregate(total=Sum('total'), count=Sum('count'))),
+            *(run(lambda qs=qs: list(qs)) for qs in breakdowns),
+        )
+    return _summary_result(*results)
@@ -0,0 +1,189 @@
+"""
+Full-text search over receipts.
+
+Each receipt gets one search document made of its store name, notes,
+category name and item names. Backends keep those documents in a full-text
+index and turn a user query into a ranked filter on a ``Receipt`` queryset:
+
+* ``MySQLFulltextBackend`` – ``MATCH ... AGAINST`` over a FULLTEXT index on
+  ``ReceiptSearchDocument.body``.
+* ``SQLiteFTS5Backend`` – an FTS5 virtual table ranked with ``bm25()``, for
+  single-node and test deployments.
+* ``ContainsBackend`` – ``icontains`` over the document table, for any other
+  database.
+
+``settings.DRT_SEARCH_BACKEND`` may name a backend class; by default one is
+picked from the database vendor. Documents are kept in sync from model
+signals (see ``signals.py``); ``manage.py rebuild_search_index`` backfills.
+"""
+
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Receipt, ReceiptItem, ReceiptSearchDocument
+from .registry import reference_data
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    """Split free text into plain word terms, dropping query-syntax characters."""
+    return TERM_RE.findall(query or '')
+
+
+def build_documents(receipt_ids):
+    """Return ``{receipt_id: body}`` for the given receipts in two queries."""
+    receipts = Receipt.objects.filter(pk__in=receipt_ids).values_list(
+        'id', 'store_name', 'notes', 'category_id'
+    )
+    item_names = defaultdict(list)
+    for receipt_id, name in ReceiptItem.objects.filter(receipt_id__in=receipt_ids).values_list(
+        'receipt_id', 'item_name'
+    ):
+        item_names[receipt_id].append(name)
+
+    documents = {}
+    for receipt_id, store_name, notes, category_id in receipts:
+        parts = [store_name, notes, reference_data.category_name(category_id) or '']
+        parts.extend(item_names[receipt_id])
+        documents[receipt_id] = '\n'.join(p for p in parts if p)
+    return documents
+
+
+class SearchBackend:
+    """Base class: subclasses store documents and build the match expressions."""
+    # Order results by this (an expression over the ``search_rank`` annotation).
+    rank_ordering = '-search_rank'
+
+    @property
+    def connection(self):
+        return connections[router.db_for_write(Receipt)]
+
+    def index(self, receipt_ids):
+        """(Re)index the given receipts; ids that no longer exist are removed."""
+        receipt_ids = list(receipt_ids)
+        if not receipt_ids:
+            return
+        documents = build_documents(receipt_ids)
+        self.remove(receipt_ids)
+        self.store(documents)
+
+    def store(self, documents):
+        ReceiptSearchDocument.objects.bulk_create(
+            [ReceiptSearchDocument(receipt_id=pk, body=body) for pk, body in documents.items()]
+        )
+
+    def remove(self, receipt_ids):
+        ReceiptSearchDocument.objects.filter(receipt_id__in=list(receipt_ids)).delete()
+
+    def search(self, queryset, query):
+        """Filter ``queryset`` to receipts matching ``query``, annotated with ``search_rank``."""
+        raise NotImplementedError
+
+    def order_by_rank(self, queryset):
+        return queryset.order_by(self.rank_ordering, *(queryset.query.order_by or ()))
+
+
+class ContainsBackend(SearchBackend):
+    """Portable fallback: every term must appear in the document (no ranking)."""
+    rank_ordering = 'search_rank'
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+        for term in terms:
+            queryset = queryset.filter(search_document__body__icontains=term)
+        return queryset.annotate(search_rank=RawSQL('0', []))
+
+
+class MySQLFulltextBackend(SearchBackend):
+    """InnoDB FULLTEXT index queried in boolean mode with prefix matching."""
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+        against = ' '.join(f'+{term}*' for term in terms)
+        qn = self.connection.ops.quote_name
+        rank_sql = (
+            f'SELECT MATCH(d.body) AGAINST (%s IN BOOLEAN MODE) '
+            f'FROM {qn(ReceiptSearchDocument._meta.db_table)} d '
+            f'WHERE d.receipt_id = {qn(Receipt._meta.db_table)}.{qn("id")}'
+        )
+        return queryset.annotate(search_rank=RawSQL(rank_sql, [against])).filter(search_rank__gt=0)
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """FTS5 virtual table keyed by receipt id (``rowid``), ranked with bm25()."""
+    table = 'DRT_receipt_fts'
+    # bm25() scores are negative; more relevant is smaller.
+    rank_ordering = 'search_rank'
+
+    def store(self, documents):
+        if not documents:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO "{self.table}" (rowid, body) VALUES (%s, %s)',
+                list(documents.items()),
+            )
+
+    def remove(self, receipt_ids):
+        receipt_ids = list(receipt_ids)
+        if not receipt_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(receipt_ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{self.table}" WHERE rowid IN ({placeholders})', receipt_ids)
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+        match = ' '.join(f'"{term}"*' for term in terms)
+        receipt_table = Receipt._meta.db_table
+        rank_sql = (
+            f'SELECT bm25("{self.table}") FROM "{self.table}" '
+            f'WHERE "{self.table}" MATCH %s AND rowid = "{receipt_table}"."id"'
+        )
+        matches_sql = f'SELECT rowid FROM "{self.table}" WHERE "{self.table}" MATCH %s'
+        return (
+            queryset.filter(id__in=RawSQL(matches_sql, [match]))
+            .annotate(search_rank=RawSQL(rank_sql, [match]))
+        )
+
+
+VENDOR_BACKENDS = {
+    'mysql': MySQLFulltextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'DRT_SEARCH_BACKEND', None)
+        if path:
+            backend_class = import_string(path)
+        else:
+            vendor = connections[router.db_for_write(Receipt)].vendor
+            backend_class = VENDOR_BACKENDS.get(vendor, ContainsBackend)
+        _backend = backend_class()
+    return _backend
+
+
+def search_receipts(queryset, query, rank=True):
+    """Apply full-text ``query`` to a receipt queryset, most relevant first if ``rank``."""
+    backend = get_backend()
+    results = backend.search(queryset, query)
+    if rank and results is not queryset:
+        results = backend.order_by_rank(results)
+    return results
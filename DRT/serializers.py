@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import models
 from django.utils import timezone
 from decimal import Decimal
 from django.contrib.auth import get_user_model
@@ -11,8 +14,10 @@ from .models import (
     ReceiptTag,
     Budget,
     ReceiptPayment,
-    ReceiptItem
+    ReceiptItem,
+    Notification,
 )
+from .registry import reference_data
 
 User = get_user_model()
 
@@ -99,13 +104,14 @@ class ReceiptItemSerializer(serializers.ModelSerializer):
 
 
 class ReceiptPaymentSerializer(serializers.ModelSerializer):
-    payment_method_name = serializers.CharField(
-        source="payment_method.name", read_only=True
-    )
+    payment_method_name = serializers.SerializerMethodField()
 
     class Meta:
         model = ReceiptPayment
         fields = "__all__"
+
+    def get_payment_method_name(self, obj):
+        return reference_data.payment_method_name(obj.payment_method_id)
     
     def validate_amount_paid(self, value):
         """Validate payment amount is positive."""
@@ -120,12 +126,59 @@ class ReceiptPaymentSerializer(serializers.ModelSerializer):
         return value
 
 
+def capped_attr(relation):
+    """Attribute a view prefetches the first ``nested_limit + 1`` rows of ``relation`` into."""
+    return f'{relation}_capped'
+
+
+def capped_related(obj, relation, limit):
+    """The first ``limit`` rows of ``obj.<relation>`` (all if ``limit`` is None)."""
+    prefetched = getattr(obj, capped_attr(relation), None)
+    rows = prefetched if prefetched is not None else getattr(obj, relation).all()
+    return rows if limit is None else rows[:limit]
+
+
+class CappedListSerializer(serializers.ListSerializer):
+    """Serialize at most the parent's ``nested_limit`` related objects."""
+
+    def get_attribute(self, instance):
+        prefetched = getattr(instance, capped_attr(self.source), None)
+        return prefetched if prefetched is not None else super().get_attribute(instance)
+
+    def iter_related(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        limit = getattr(self.parent, 'nested_limit', None)
+        return iterable if limit is None else iterable[:limit]
+
+    def to_representation(self, data):
+        return [self.child.to_representation(item) for item in self.iter_related(data)]
+
+
+def receipt_nested_limit():
+    return getattr(settings, 'DRT_RECEIPT_NESTED_LIMIT', 50)
+
+
 class ReceiptSerializer(serializers.ModelSerializer):
+    """
+    Receipt with optional nested relations.
+
+    ``expand`` picks which of ``items``, ``payments`` and ``tags`` are
+    included (default: items and payments) and ``fields`` restricts the
+    output to the named fields. Nested lists hold at most ``nested_limit``
+    rows; when there are more, ``items_next``/``payments_next`` link to the
+    full, paginated collection.
+    """
+    EXPANDABLE = ('items', 'payments', 'tags')
+    DEFAULT_EXPAND = ('items', 'payments')
+
     # Nested serializers for related objects
-    items = ReceiptItemSerializer(many=True, read_only=True)
-    payments = ReceiptPaymentSerializer(many=True, read_only=True)
+    items = CappedListSerializer(child=ReceiptItemSerializer(), read_only=True)
+    items_next = serializers.SerializerMethodField()
+    payments = CappedListSerializer(child=ReceiptPaymentSerializer(), read_only=True)
+    payments_next = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
 
-    category_name = serializers.CharField(source="category.name", read_only=True)
+    category_name = serializers.SerializerMethodField()
     user_username = serializers.CharField(source="user.username", read_only=True)
 
     class Meta:
@@ -133,10 +186,47 @@ class ReceiptSerializer(serializers.ModelSerializer):
         
         fields = [
             "id", "store_name", "total_amount", "currency", 
-            "purchase_date", "uploaded_at", "notes", "category", 
-            "category_name", "user_username", "items", "payments"
+            "purchase_date", "uploaded_at", "updated_at", "notes", "category",
+            "category_name", "user_username", "items", "items_next",
+            "payments", "payments_next", "tags",
         ]
-        read_only_fields = ["uploaded_at", "user_username", "category_name", "items", "payments"]
+        read_only_fields = [
+            "uploaded_at", "updated_at", "user_username", "category_name", "items", "payments"
+        ]
+
+    def __init__(self, *args, fields=None, expand=None, nested_limit=serializers.empty, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nested_limit = receipt_nested_limit() if nested_limit is serializers.empty else nested_limit
+        expand = self.DEFAULT_EXPAND if expand is None else expand
+        for name in self.EXPANDABLE:
+            if name not in expand:
+                self.fields.pop(name, None)
+            if name not in expand or self.nested_limit is None:
+                self.fields.pop(f'{name}_next', None)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def _next_link(self, obj, relation, view_name):
+        if self.nested_limit is None:
+            return None
+        # Free when the view prefetched limit + 1 rows.
+        if len(capped_related(obj, relation, self.nested_limit + 1)) <= self.nested_limit:
+            return None
+        url = reverse(view_name, request=self.context.get('request'))
+        return f'{url}?receipt={obj.pk}'
+
+    def get_items_next(self, obj):
+        return self._next_link(obj, 'items', 'receipt-item-list')
+
+    def get_payments_next(self, obj):
+        return self._next_link(obj, 'payments', 'receipt-payment-list')
+
+    def get_tags(self, obj):
+        return sorted(reference_data.tag_name(rt.tag_id) for rt in obj.receipttag_set.all())
+
+    def get_category_name(self, obj):
+        return reference_data.category_name(obj.category_id)
     
     def validate_total_amount(self, value):
         """Validate receipt amount is positive."""
@@ -151,6 +241,65 @@ class ReceiptSerializer(serializers.ModelSerializer):
         return value
 
 
+class BulkReceiptItemSerializer(ReceiptItemSerializer):
+    """Line item nested in a bulk receipt; the receipt is implied by the parent."""
+
+    class Meta(ReceiptItemSerializer.Meta):
+        fields = ["item_name", "quantity", "unit_price", "total_price"]
+
+
+class BulkReceiptPaymentSerializer(ReceiptPaymentSerializer):
+    """
+    Payment nested in a bulk receipt.
+
+    ``payment_method`` is checked against the in-process reference registry
+    rather than queried per row.
+    """
+    payment_method = serializers.IntegerField(allow_null=True, required=False)
+    payment_method_name = None
+
+    class Meta(ReceiptPaymentSerializer.Meta):
+        fields = ["payment_method", "amount_paid", "paid_at"]
+
+    def validate_payment_method(self, value):
+        if value is not None and reference_data.payment_method(value) is None:
+            raise serializers.ValidationError("Selected payment method does not exist.")
+        return value
+
+
+class BulkReceiptSerializer(ReceiptSerializer):
+    """
+    Receipt with nested items, payments and tag names for bulk ingestion.
+
+    ``category`` is checked against the in-process reference registry so
+    validating a batch issues no per-row queries.
+    """
+    DEFAULT_EXPAND = ReceiptSerializer.EXPANDABLE
+
+    category = serializers.IntegerField(allow_null=True, required=False)
+    items = BulkReceiptItemSerializer(many=True, required=False)
+    payments = BulkReceiptPaymentSerializer(many=True, required=False)
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=50), required=False
+    )
+    category_name = None
+    user_username = None
+    items_next = None
+    payments_next = None
+
+    class Meta(ReceiptSerializer.Meta):
+        fields = [
+            "store_name", "total_amount", "currency", "purchase_date", "notes",
+            "category", "items", "payments", "tags",
+        ]
+        read_only_fields = []
+
+    def validate_category(self, value):
+        if value is not None and reference_data.category(value) is None:
+            raise serializers.ValidationError("Selected category does not exist.")
+        return value
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -159,20 +308,26 @@ class TagSerializer(serializers.ModelSerializer):
 
 class ReceiptTagSerializer(serializers.ModelSerializer):
     receipt_info = serializers.StringRelatedField(source="receipt", read_only=True)
-    tag_name = serializers.CharField(source="tag.name", read_only=True)
+    tag_name = serializers.SerializerMethodField()
 
     class Meta:
         model = ReceiptTag
         fields = "__all__"
 
+    def get_tag_name(self, obj):
+        return reference_data.tag_name(obj.tag_id)
+
 
 class BudgetSerializer(serializers.ModelSerializer):
-    category_name = serializers.CharField(source="category.name", read_only=True)
+    category_name = serializers.SerializerMethodField()
     user_username = serializers.CharField(source="user.username", read_only=True)
 
     class Meta:
         model = Budget
         fields = "__all__"
+
+    def get_category_name(self, obj):
+        return reference_data.category_name(obj.category_id)
     
     def validate_amount_limit(self, value):
         """Validate budget amount is positive."""
@@ -185,3 +340,17 @@ class BudgetSerializer(serializers.ModelSerializer):
         if value and value < timezone.now().date():
             raise serializers.ValidationError("Period start date cannot be in the past.")
         return value
+
+
+class BudgetUtilizationSerializer(BudgetSerializer):
+    """``BudgetSerializer`` plus spend figures; needs ``budgets.with_utilization``."""
+    spent = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    remaining = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    percent_used = serializers.DecimalField(max_digits=9, decimal_places=2, read_only=True, allow_null=True)
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ["id", "message", "created_at", "is_read"]
+        read_only_fields = ["message", "created_at"]
@@ -1,9 +1,262 @@
+from collections import defaultdict
+from decimal import Decimal
+
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 
+from .authentication import revoke_tokens
+from .budgets import invalidate_budget_index, recount
+from .maintenance import schedule_budget_spend, schedule_invalidation, schedule_rollup, schedule_search_index
+from .models import (
+    Budget, Category, Notification, PaymentMethod, Receipt, ReceiptItem, ReceiptPayment, ReceiptTag, Tag
+)
+from .notifications import adjust_unread
+from .registry import reference_data
+from .search import get_backend as get_search_backend
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+
+# --- Cached token authentication ---
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def revoke_cached_token(sender, instance, created=False, raw=False, **kwargs):
+    # Covers logout, deactivation, admin deletes and key rotation; a brand
+    # new key (create_auth_token, login) cannot be cached yet.
+    if not raw and not created:
+        revoke_tokens(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def revoke_inactive_user_tokens(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or instance.is_active:
+        return
+    revoke_tokens(*Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+# --- Daily spend rollup maintenance ---
+
+def _receipt_bucket(receipt_id):
+    return Receipt.objects.filter(pk=receipt_id).values_list('user_id', 'purchase_date').first()
+
+
+def _receipt_spend(receipt_id):
+    # Locked until the save commits (Receipt.save is atomic): a concurrent
+    # edit of the same receipt waits and then sees this save's values as its
+    # previous state, so budget deltas never double-count.
+    return (
+        Receipt.objects.select_for_update().filter(pk=receipt_id)
+        .values_list('user_id', 'purchase_date', 'category_id', 'total_amount').first()
+    )
+
+
+def _cascaded_from(origin, *models):
+    """True when a delete was initiated on one of ``models`` (object or queryset)."""
+    model = getattr(origin, 'model', type(origin))
+    return model in models
+
+
+@receiver(pre_save, sender=Receipt)
+def remember_receipt_bucket(sender, instance, raw=False, **kwargs):
+    # A changed purchase date or owner moves spend out of the old bucket, and
+    # a changed category or amount out of the old budgets.
+    previous = _receipt_spend(instance.pk) if instance.pk and not raw else None
+    instance._previous_bucket = previous[:2] if previous else None
+    instance._previous_spend = previous
+
+
+@receiver(post_save, sender=Receipt)
+def refresh_receipt_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    buckets = {(instance.user_id, instance.purchase_date)}
+    if getattr(instance, '_previous_bucket', None):
+        buckets.add(instance._previous_bucket)
+    for user_id, day in buckets:
+        schedule_rollup(user_id, day)
+
+
+@receiver(post_delete, sender=Receipt)
+def clear_receipt_rollup(sender, instance, origin=None, **kwargs):
+    # Deleting the user cascades to the rollup rows themselves.
+    if _cascaded_from(origin, get_user_model()):
+        return
+    schedule_rollup(instance.user_id, instance.purchase_date)
+
+
+@receiver(pre_save, sender=ReceiptPayment)
+def remember_payment_receipt(sender, instance, raw=False, **kwargs):
+    previous = None
+    if instance.pk and not raw:
+        previous = ReceiptPayment.objects.filter(pk=instance.pk).values_list('receipt_id', flat=True).first()
+    instance._previous_receipt_id = previous
+
+
+@receiver(post_save, sender=ReceiptPayment)
+@receiver(post_delete, sender=ReceiptPayment)
+def refresh_payment_rollup(sender, instance, raw=False, origin=None, **kwargs):
+    # The receipt's own post_delete refreshes the bucket after a cascade.
+    if raw or _cascaded_from(origin, Receipt, get_user_model()):
+        return
+    receipt_ids = {instance.receipt_id, getattr(instance, '_previous_receipt_id', None)}
+    buckets = {_receipt_bucket(receipt_id) for receipt_id in receipt_ids if receipt_id}
+    for bucket in buckets:
+        if bucket:
+            schedule_rollup(*bucket)
+
+
+# --- Budget consumption counters ---
+
+@receiver(post_save, sender=Receipt)
+def move_budget_spend(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = defaultdict(Decimal)
+    previous = getattr(instance, '_previous_spend', None)
+    if previous:
+        user_id, day, category_id, amount = previous
+        deltas[user_id, category_id, day] -= amount
+    deltas[instance.user_id, instance.category_id, instance.purchase_date] += instance.total_amount
+    schedule_budget_spend(deltas)
+
+
+@receiver(post_delete, sender=Receipt)
+def remove_budget_spend(sender, instance, origin=None, **kwargs):
+    # Deleting the user cascades to the budgets themselves.
+    if _cascaded_from(origin, get_user_model()):
+        return
+    schedule_budget_spend({(instance.user_id, instance.category_id, instance.purchase_date): -instance.total_amount})
+
+
+@receiver(post_save, sender=Budget)
+def recount_budget(sender, instance, raw=False, **kwargs):
+    # A new or edited budget may cover different receipts or a new limit.
+    if not raw:
+        recount([instance.pk])
+
+
+# --- Per-user data version (cache invalidation) ---
+
+def _receipt_owner(instance):
+    if type(instance).receipt.is_cached(instance):
+        return instance.receipt.user_id
+    return Receipt.objects.filter(pk=instance.receipt_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Receipt)
+@receiver(post_delete, sender=Receipt)
+def invalidate_receipt_owner(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_invalidation(instance.user_id)
+    previous = getattr(instance, '_previous_bucket', None)
+    if previous and previous[0] != instance.user_id:
+        schedule_invalidation(previous[0])
+
+
+@receiver(post_save, sender=ReceiptPayment)
+@receiver(post_delete, sender=ReceiptPayment)
+@receiver(post_save, sender=ReceiptItem)
+@receiver(post_delete, sender=ReceiptItem)
+@receiver(post_save, sender=ReceiptTag)
+@receiver(post_delete, sender=ReceiptTag)
+def invalidate_receipt_child_owner(sender, instance, raw=False, origin=None, **kwargs):
+    # Cascades from a receipt or user are covered by the parent's own signal.
+    if raw or _cascaded_from(origin, Receipt, get_user_model()):
+        return
+    user_id = _receipt_owner(instance)
+    if user_id:
+        schedule_invalidation(user_id)
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def invalidate_budget_owner(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _cascaded_from(origin, get_user_model()):
+        return
+    schedule_invalidation(instance.user_id)
+    invalidate_budget_index(instance.user_id)
+
+
+# --- Reference data registry ---
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_reference_data(sender, **kwargs):
+    reference_data.invalidate()
+
+
+# --- Full-text search index ---
+
+@receiver(post_save, sender=Receipt)
+def index_receipt(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Receipt)
+def unindex_receipt(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=ReceiptItem)
+@receiver(post_delete, sender=ReceiptItem)
+def index_item_receipt(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _cascaded_from(origin, Receipt, get_user_model()):
+        return
+    schedule_search_index([instance.receipt_id])
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_receipts(sender, instance, **kwargs):
+    # Receipts are SET_NULL'd without signals; remember them for reindexing.
+    instance._receipt_ids = list(instance.receipts.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def index_category_receipts(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    receipt_ids = getattr(instance, '_receipt_ids', None)
+    if receipt_ids is None:
+        receipt_ids = list(instance.receipts.values_list('pk', flat=True))
+    schedule_search_index(receipt_ids)
+
+
+# --- Unread notification counters ---
+
+@receiver(pre_save, sender=Notification)
+def remember_notification_read_state(sender, instance, raw=False, **kwargs):
+    instance._was_unread = None
+    if instance.pk and not raw:
+        instance._was_unread = Notification.objects.filter(pk=instance.pk, is_read=False).exists()
+
+
+@receiver(post_save, sender=Notification)
+def count_saved_notification(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_unread(instance.user_id, 0 if instance.is_read else 1)
+    elif instance._was_unread is not None and instance._was_unread == instance.is_read:
+        # Read state flipped, e.g. from the admin.
+        adjust_unread(instance.user_id, -1 if instance.is_read else 1)
+
+
+@receiver(post_delete, sender=Notification)
+def count_deleted_notification(sender, instance, origin=None, **kwargs):
+    if not instance.is_read and not _cascaded_from(origin, get_user_model()):
+        adjust_unread(instance.user_id, -1)
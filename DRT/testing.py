@@ -0,0 +1,44 @@
+"""
+Test helpers.
+
+``assert_constant_queries`` catches N+1 regressions: it runs a request, adds
+rows, runs it again, and fails if the second run needed more queries. The
+failure message lists the query shapes that repeated, which usually points
+straight at the missing ``select_related``/``prefetch_related``.
+"""
+
+from .db.instrumentation import record_queries
+
+
+def count_queries(fetch):
+    """Run ``fetch()``; returns ``(result, QueryRecorder)``."""
+    with record_queries() as recorder:
+        result = fetch()
+    return result, recorder
+
+
+def assert_constant_queries(test, fetch, grow, warm=True):
+    """
+    Fail ``test`` if ``fetch()`` runs more queries after ``grow()`` adds rows.
+
+    ``fetch`` is typically ``lambda: client.get(url)`` for a page that will
+    hold more rows once ``grow`` has run. With ``warm`` (the default), each
+    measurement follows an unmeasured call, so per-user caches are either
+    warm for both measurements or cold for both.
+    """
+    if warm:
+        fetch()
+    _, before = count_queries(fetch)
+    grow()
+    if warm:
+        fetch()
+    _, after = count_queries(fetch)
+    if after.count > before.count:
+        repeats = '\n'.join(
+            f'  {times}x {shape}' for shape, times in after.shapes.most_common(5) if times > 1
+        )
+        test.fail(
+            f"Query count grew with the data: {before.count} before, {after.count} after."
+            + (f"\nMost repeated queries:\n{repeats}" if repeats else '')
+        )
+    return before.count
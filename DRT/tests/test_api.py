@@ -79,3 +79,1432 @@ class AuthAndReceiptAPITests(TestCase):
         self.assertIn(res2.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
 
 
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ReceiptCursorPaginationTests(TestCase):
+    def setUp(self):
+        from DRT.models import Receipt
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="pager", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        today = date.today()
+        for i in range(5):
+            Receipt.objects.create(
+                user=self.user,
+                store_name=f"Store {i}",
+                total_amount=Decimal("10.00") + i,
+                purchase_date=today - timedelta(days=i // 2),
+            )
+
+    def collect(self, url):
+        names, pages = [], 0
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', res.data)
+            names.extend(r['store_name'] for r in res.data['results'])
+            url = res.data['next']
+            pages += 1
+        return names, pages
+
+    def test_cursor_walk_matches_page_number_ordering(self):
+        expected = [r['store_name'] for r in self.client.get('/api/receipts/').data['results']]
+        names, pages = self.collect('/api/receipts/?pagination=cursor&page_size=2')
+        self.assertEqual(names, expected)
+        self.assertEqual(pages, 3)
+
+    def test_cursor_respects_ordering_and_filters(self):
+        names, _ = self.collect('/api/receipts/?pagination=cursor&page_size=2&ordering=total_amount&amount_min=11')
+        self.assertEqual(names, ["Store 1", "Store 2", "Store 3", "Store 4"])
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/receipts/?pagination=cursor&page_size=2').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_invalid_cursor_is_not_found(self):
+        res = self.client.get('/api/receipts/?cursor=garbage')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="cacher", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+
+    def create_receipt(self, amount):
+        res = self.client.post('/api/receipts/', {
+            'store_name': 'Market',
+            'total_amount': amount,
+            'purchase_date': str(date.today()),
+        }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_analytics_cached_until_user_writes(self):
+        self.create_receipt('100.00')
+        first = self.client.get('/api/receipts/analytics/?days=7')
+        second = self.client.get('/api/receipts/analytics/?days=7')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+        self.create_receipt('50.00')
+        third = self.client.get('/api/receipts/analytics/?days=7')
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data['summary']['total_expenses'], Decimal('150.00'))
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        import threading
+        import time
+        from DRT.cache import SingleFlight
+
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 42
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('k', compute)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('k', compute))) for _ in range(3)]
+        for t in followers:
+            t.start()
+        time.sleep(0.2)  # let the followers reach the in-flight call
+        release.set()
+        for t in [leader, *followers]:
+            t.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [(42, False), (42, True), (42, True), (42, True)])
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class BulkReceiptAPITests(TestCase):
+    def setUp(self):
+        from DRT.models import Category, PaymentMethod
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="bulker", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Groceries')
+        self.method = PaymentMethod.objects.create(name='Cash')
+
+    def payload(self, store='Market', **overrides):
+        row = {
+            'store_name': store,
+            'total_amount': '30.00',
+            'purchase_date': str(date.today()),
+            'category': self.category.id,
+            'items': [
+                {'item_name': 'Milk', 'quantity': 2, 'unit_price': '5.00', 'total_price': '10.00'},
+                {'item_name': 'Bread', 'quantity': 1, 'unit_price': '20.00', 'total_price': '20.00'},
+            ],
+            'payments': [{'payment_method': self.method.id, 'amount_paid': '30.00',
+                          'paid_at': (date.today() - timedelta(days=1)).isoformat() + 'T12:00:00Z'}],
+            'tags': ['Work', 'Reimbursable'],
+        }
+        row.update(overrides)
+        return row
+
+    def test_bulk_creates_nested_rows(self):
+        from DRT.models import Receipt, ReceiptItem, ReceiptPayment, ReceiptTag
+        res = self.client.post('/api/receipts/bulk/', [self.payload('A'), self.payload('B')], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['created']), 2)
+        self.assertEqual(Receipt.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ReceiptItem.objects.count(), 4)
+        self.assertEqual(ReceiptPayment.objects.count(), 2)
+        self.assertEqual(ReceiptTag.objects.count(), 4)
+        analytics = self.client.get('/api/receipts/analytics/').data
+        self.assertEqual(analytics['summary']['total_expenses'], Decimal('60.00'))
+
+    def test_atomic_mode_rejects_whole_batch(self):
+        from DRT.models import Receipt
+        bad = self.payload('Bad', category=9999)
+        res = self.client.post('/api/receipts/bulk/', [self.payload(), bad], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertIn('category', res.data['errors'][0]['errors'])
+        self.assertFalse(Receipt.objects.exists())
+
+    def test_partial_mode_reports_row_errors(self):
+        bad_item = {'item_name': 'X', 'quantity': 1, 'unit_price': '5.00', 'total_price': '6.00'}
+        res = self.client.post(
+            '/api/receipts/bulk/?mode=partial',
+            [self.payload(), self.payload('Bad', items=[bad_item])],
+            format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(len(res.data['created']), 1)
+        self.assertIn('items', res.data['errors'][0]['errors'])
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ReceiptExportTests(TestCase):
+    def setUp(self):
+        from DRT.models import Receipt, ReceiptItem
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="exporter", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        for i, store in enumerate(["Old Shop", "New Shop"]):
+            receipt = Receipt.objects.create(
+                user=self.user, store_name=store, total_amount=Decimal("10.00"),
+                purchase_date=date.today() - timedelta(days=10 * (1 - i)),
+            )
+            ReceiptItem.objects.create(
+                receipt=receipt, item_name="Milk", quantity=2,
+                unit_price=Decimal("5.00"), total_price=Decimal("10.00"),
+            )
+
+    def content(self, res):
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b''.join(res.streaming_content).decode()
+
+    def test_ndjson_export_streams_nested_rows(self):
+        import json
+        res = self.client.get('/api/receipts/export/?format=ndjson')
+        self.assertTrue(res['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in self.content(res).splitlines()]
+        self.assertEqual([r['store_name'] for r in rows], ["New Shop", "Old Shop"])
+        self.assertEqual(rows[0]['items'][0]['item_name'], "Milk")
+
+    def test_csv_export_honors_filters(self):
+        import csv
+        import io
+        res = self.client.get(f'/api/receipts/export/?format=csv&date_from={date.today() - timedelta(days=1)}')
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(self.content(res))))
+        self.assertEqual([r['store_name'] for r in rows], ["New Shop"])
+        self.assertIn('"item_name": "Milk"', rows[0]['items'])
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ReceiptSearchTests(TestCase):
+    def setUp(self):
+        from DRT.models import Category, Receipt, ReceiptItem
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="searcher", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Hardware')
+        self.corner = Receipt.objects.create(
+            user=self.user, store_name='Corner Shop', total_amount=Decimal('5.00'),
+            purchase_date=date.today(), notes='weekly milk run',
+        )
+        self.tools = Receipt.objects.create(
+            user=self.user, store_name='Tool Depot', total_amount=Decimal('50.00'),
+            purchase_date=date.today(), category=self.category,
+        )
+        ReceiptItem.objects.create(
+            receipt=self.tools, item_name='Cordless drill', quantity=1,
+            unit_price=Decimal('50.00'), total_price=Decimal('50.00'),
+        )
+
+    def search(self, term):
+        res = self.client.get('/api/receipts/', {'search': term})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [r['store_name'] for r in res.data['results']]
+
+    def test_search_covers_notes_category_and_item_names(self):
+        self.assertEqual(self.search('milk'), ['Corner Shop'])
+        self.assertEqual(self.search('hardware'), ['Tool Depot'])
+        self.assertEqual(self.search('dril'), ['Tool Depot'])
+        self.assertEqual(self.search('nothing here'), [])
+
+    def test_index_follows_writes(self):
+        from DRT.models import ReceiptItem
+        ReceiptItem.objects.filter(receipt=self.tools).delete()  # queryset delete still signals
+        self.assertEqual(self.search('drill'), [])
+        self.category.name = 'Tools'
+        self.category.save()
+        self.assertEqual(self.search('tools'), ['Tool Depot'])
+        self.corner.delete()
+        self.assertEqual(self.search('milk'), [])
+
+    def test_web_search_uses_index(self):
+        self.client.force_login(self.user)
+        res = self.client.get(reverse('receipts'), {'q': 'drill'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r.store_name for r in res.context['receipts']], ['Tool Depot'])
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ReceiptFilterTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from DRT.models import PaymentMethod, Receipt, ReceiptPayment, ReceiptTag, Tag
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="filterer", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        card = PaymentMethod.objects.create(name='Credit Card')
+        cash = PaymentMethod.objects.create(name='Cash')
+        work = Tag.objects.create(name='work')
+        travel = Tag.objects.create(name='travel')
+        today = date.today()
+        now = timezone.now()
+        self.both = Receipt.objects.create(
+            user=self.user, store_name='Both', total_amount=Decimal('30.00'), purchase_date=today,
+        )
+        self.work_only = Receipt.objects.create(
+            user=self.user, store_name='Work', total_amount=Decimal('10.00'), purchase_date=today,
+        )
+        for receipt, tags in ((self.both, [work, travel]), (self.work_only, [work])):
+            for tag in tags:
+                ReceiptTag.objects.create(receipt=receipt, tag=tag)
+        # Two card payments on one receipt must not duplicate it in results.
+        for amount in ('10.00', '20.00'):
+            ReceiptPayment.objects.create(
+                receipt=self.both, payment_method=card, amount_paid=Decimal(amount), paid_at=now,
+            )
+        ReceiptPayment.objects.create(
+            receipt=self.work_only, payment_method=cash, amount_paid=Decimal('10.00'), paid_at=now,
+        )
+
+    def names(self, **params):
+        res = self.client.get('/api/receipts/', params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(r['store_name'] for r in res.data['results'])
+
+    def test_payment_method_and_tag_modes(self):
+        self.assertEqual(self.names(payment_method='card'), ['Both'])
+        self.assertEqual(self.names(tags='work,travel'), ['Both', 'Work'])
+        self.assertEqual(self.names(tags='work,travel', tags_mode='any'), ['Both', 'Work'])
+        self.assertEqual(self.names(tags='work,travel', tags_mode='all'), ['Both'])
+        self.assertEqual(self.names(tags='travel', payment_method='cash'), [])
+        res = self.client.get('/api/receipts/', {'payment_method': 'card'})
+        self.assertEqual(res.data['count'], 1)
+
+    def test_filtered_list_uses_user_date_index_without_distinct(self):
+        from django.db import connection
+        from django.http import QueryDict
+        from DRT.filters import distinct_if_needed, filter_receipts
+        from DRT.models import Receipt
+        params = QueryDict(mutable=True)
+        params.update({'payment_method': 'card', 'tags': 'work', 'date_from': str(date.today() - timedelta(days=30))})
+        queryset = distinct_if_needed(filter_receipts(
+            Receipt.objects.filter(user=self.user).order_by('-purchase_date'), params
+        ))
+        sql, sql_params = queryset.query.sql_with_params()
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('EXISTS', sql)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, sql_params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        # Either (user, purchase_date) index will do; both serve the range and the ordering.
+        self.assertRegex(plan, r'SEARCH DRT_receipt USING INDEX \w+ \(user_id=\? AND purchase_date>\?\)')
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}, DRT_RECEIPT_NESTED_LIMIT=2)
+class ReceiptExpansionTests(TestCase):
+    def setUp(self):
+        from DRT.models import Receipt, ReceiptItem, ReceiptTag, Tag
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="expander", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        self.receipt = Receipt.objects.create(
+            user=self.user, store_name='Bulk Store', total_amount=Decimal('3.00'), purchase_date=date.today(),
+        )
+        for n in range(3):
+            ReceiptItem.objects.create(
+                receipt=self.receipt, item_name=f'Item {n}', quantity=1,
+                unit_price=Decimal('1.00'), total_price=Decimal('1.00'),
+            )
+        ReceiptTag.objects.create(receipt=self.receipt, tag=Tag.objects.create(name='home'))
+
+    def test_default_shape_caps_items_and_links_the_rest(self):
+        res = self.client.get('/api/receipts/')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        row = res.data['results'][0]
+        self.assertEqual([i['item_name'] for i in row['items']], ['Item 0', 'Item 1'])
+        self.assertTrue(row['items_next'].endswith(f'/api/receipt-items/?receipt={self.receipt.pk}'))
+        self.assertEqual(row['payments'], [])
+        self.assertIsNone(row['payments_next'])
+        self.assertNotIn('tags', row)
+        linked = self.client.get(row['items_next'])
+        self.assertEqual(linked.data['count'], 3)
+
+    def test_sparse_fields_skip_prefetches(self):
+        from DRT.registry import reference_data
+        reference_data.categories()  # load the registry snapshot up front
+        with self.assertNumQueries(2):  # count + page, no prefetches
+            res = self.client.get('/api/receipts/', {'fields': 'id,store_name,total_amount', 'expand': ''})
+        self.assertEqual(set(res.data['results'][0]), {'id', 'store_name', 'total_amount'})
+
+        with self.assertNumQueries(3):  # count + page + tags only
+            res = self.client.get('/api/receipts/', {'expand': 'tags'})
+        row = res.data['results'][0]
+        self.assertEqual(row['tags'], ['home'])
+        self.assertNotIn('items', row)
+
+    def test_export_is_never_capped(self):
+        import json
+        res = self.client.get('/api/receipts/export/', {'format': 'ndjson'})
+        record = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(len(record['items']), 3)
+        self.assertEqual(record['tags'], ['home'])
+        self.assertNotIn('items_next', record)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class CompiledSerializerTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from DRT.models import Budget, Category, PaymentMethod, Receipt, ReceiptItem, ReceiptPayment
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="compiler", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Groceries')
+        self.receipt = Receipt.objects.create(
+            user=self.user, category=category, store_name='Market', total_amount=Decimal('7.5'),
+            purchase_date=date.today(), notes='',
+        )
+        Receipt.objects.create(
+            user=self.user, store_name='No Category', total_amount=Decimal('1.00'), purchase_date=date.today(),
+        )
+        ReceiptItem.objects.create(
+            receipt=self.receipt, item_name='Bread', quantity=3,
+            unit_price=Decimal('2.50'), total_price=Decimal('7.50'),
+        )
+        ReceiptPayment.objects.create(
+            receipt=self.receipt, payment_method=PaymentMethod.objects.create(name='Cash'),
+            amount_paid=Decimal('7.50'), paid_at=timezone.now(),
+        )
+        Budget.objects.create(
+            user=self.user, category=category, amount_limit=Decimal('100'),
+            period_start=date.today(), period_end=date.today() + timedelta(days=30),
+        )
+
+    def test_compiled_json_is_byte_identical(self):
+        urls = [
+            '/api/receipts/', '/api/receipts/?expand=items,payments,tags&fields=id,items,tags,uploaded_at',
+            f'/api/receipts/{self.receipt.pk}/', '/api/budgets/', '/api/receipt-payments/',
+            '/api/receipt-items/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                compiled = self.client.get(url, HTTP_ACCEPT='application/json')
+                with self.settings(DRT_COMPILED_SERIALIZERS=False):
+                    plain = self.client.get(url, HTTP_ACCEPT='application/json')
+                self.assertEqual(compiled.status_code, status.HTTP_200_OK)
+                self.assertEqual(compiled.content, plain.content)
+
+    def test_benchmark_command_rolls_back(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from DRT.models import Receipt
+        out = StringIO()
+        call_command('benchmark_serializers', rows='5,10', repeat=1, stdout=out)
+        self.assertIn('receipts x10', out.getvalue())
+        self.assertEqual(Receipt.objects.count(), 2)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        from DRT.models import Category, Receipt
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="etagger", password="VeryStrongPass123")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Fuel')
+        self.receipt = Receipt.objects.create(
+            user=self.user, category=self.category, store_name='Pump', total_amount=Decimal('40.00'),
+            purchase_date=date.today(),
+        )
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_skips_queries(self):
+        for url in ('/api/receipts/', f'/api/receipts/{self.receipt.pk}/', '/api/categories/'):
+            with self.subTest(url=url):
+                res = self.client.get(url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                etag = res['ETag']
+                with self.assertNumQueries(0):
+                    cached = self.revalidate(url, etag)
+                self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(cached['ETag'], etag)
+                self.assertEqual(cached.content, b'')
+
+    def test_writes_change_the_etag(self):
+        from DRT.models import Budget
+        receipts = self.client.get('/api/receipts/')['ETag']
+        budgets = self.client.get('/api/budgets/')['ETag']
+        categories = self.client.get('/api/categories/')['ETag']
+        self.assertNotEqual(receipts, self.client.get('/api/receipts/?page=1')['ETag'])
+
+        Budget.objects.create(
+            user=self.user, category=self.category, amount_limit=Decimal('100'),
+            period_start=date.today(), period_end=date.today() + timedelta(days=30),
+        )
+        self.assertEqual(self.revalidate('/api/budgets/', budgets).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.revalidate('/api/categories/', categories).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        receipts = self.client.get('/api/receipts/')['ETag']
+        self.category.name = 'Petrol'
+        self.category.save()  # category_name appears in receipt payloads
+        self.assertEqual(self.revalidate('/api/receipts/', receipts).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.revalidate('/api/categories/', categories).status_code, status.HTTP_200_OK)
+
+        other = get_user_model().objects.create_user(username="other-etag", password="VeryStrongPass123")
+        self.client.force_authenticate(other)
+        self.assertNotEqual(self.client.get('/api/receipts/')['ETag'], receipts)
+
+    def test_last_modified_waits_for_its_second_to_pass(self):
+        import math
+        import time
+        from unittest import mock
+        from DRT.cache import bump_version, user_scope
+        url = '/api/receipts/'
+        scope = user_scope(self.user.pk)
+        base = math.ceil(time.time()) + 1000  # after every bump made in setUp
+
+        def at(offset):
+            return mock.patch('time.time', return_value=base + offset)
+
+        with at(0.3):
+            bump_version(scope)
+        # Another write could still land in this second: no Last-Modified yet.
+        with at(0.6):
+            self.assertNotIn('Last-Modified', self.client.get(url))
+        with at(1.2):
+            last_modified = self.client.get(url)['Last-Modified']
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+                status.HTTP_304_NOT_MODIFIED,
+            )
+        with at(1.5):
+            bump_version(scope)
+        with at(1.7):
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, status.HTTP_200_OK,
+            )
+
+    def test_receipt_updated_at_tracks_changes(self):
+        res = self.client.get(f'/api/receipts/{self.receipt.pk}/')
+        before = res.data['updated_at']
+        self.client.patch(f'/api/receipts/{self.receipt.pk}/', {'notes': 'refuel'}, format='json')
+        self.receipt.refresh_from_db()
+        self.assertGreater(self.receipt.updated_at, self.receipt.uploaded_at)
+        self.assertNotEqual(self.client.get(f'/api/receipts/{self.receipt.pk}/').data['updated_at'], before)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+        from DRT.authentication import token_cache
+        token_cache.clear()
+        token_cache.stats.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="tokenholder", password="VeryStrongPass123")
+        self.token = Token.objects.get(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def assertRejected(self):
+        res = self.client.get('/api/users/')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)  # session auth comes first
+        self.assertEqual(str(res.data['detail']), 'Invalid token.')
+
+    def test_repeat_requests_skip_token_query(self):
+        from DRT.authentication import token_cache
+        self.assertEqual(self.client.get('/api/users/').status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):  # the user list itself
+            self.assertEqual(self.client.get('/api/users/').status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats.snapshot()['hits'], 1)
+        self.assertEqual(token_cache.stats.snapshot()['hit_rate'], 0.5)
+
+    def test_logout_revokes_immediately(self):
+        self.client.get('/api/users/')
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, status.HTTP_200_OK)
+        self.assertRejected()
+
+    def test_deactivation_and_admin_delete_revoke(self):
+        from rest_framework.authtoken.models import Token
+        self.client.get('/api/users/')
+        self.assertEqual(self.client.post('/api/users/deactivate/').status_code, status.HTTP_200_OK)
+        self.assertRejected()
+
+        other = get_user_model().objects.create_user(username="admin-deleted", password="VeryStrongPass123")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other.auth_token.key}')
+        self.client.get('/api/users/')
+        Token.objects.filter(user=other).delete()
+        self.assertRejected()
+
+    @override_settings(DRT_TOKEN_CACHE_SIZE=1)
+    def test_size_cap_evicts_least_recent(self):
+        from DRT.authentication import token_cache
+        other = get_user_model().objects.create_user(username="second-token", password="VeryStrongPass123")
+        self.client.get('/api/users/')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other.auth_token.key}')
+        self.client.get('/api/users/')
+        self.assertEqual(len(token_cache), 1)
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    @override_settings(DRT_REQUIRE_SHARED_CACHE=True)
+    def test_disabled_without_shared_cache(self):
+        from DRT.authentication import token_cache
+        self.client.get('/api/users/')
+        with self.assertNumQueries(2):  # token lookup + the user list
+            self.assertEqual(self.client.get('/api/users/').status_code, status.HTTP_200_OK)
+        self.assertEqual(len(token_cache), 0)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class AsyncAPITests(TestCase):
+    def setUp(self):
+        from DRT.models import Category, Notification, Receipt, ReceiptItem
+        self.user = get_user_model().objects.create_user(username="asyncer", password="VeryStrongPass123")
+        self.auth = {'headers': {'Authorization': f'Token {self.user.auth_token.key}'}}
+        category = Category.objects.create(name='Dining')
+        for n in range(3):
+            receipt = Receipt.objects.create(
+                user=self.user, category=category, store_name=f'Cafe {n}',
+                total_amount=Decimal('12.50') + n, purchase_date=date.today() - timedelta(days=n),
+            )
+        ReceiptItem.objects.create(
+            receipt=receipt, item_name='Coffee', quantity=1,
+            unit_price=Decimal('14.50'), total_price=Decimal('14.50'),
+        )
+        self.receipt = receipt
+        Notification.objects.create(user=self.user, message='first')
+        Notification.objects.create(user=self.user, message='second', is_read=True)
+
+    async def test_async_receipts_match_sync_api(self):
+        for path in (
+            '/api/receipts/', '/api/receipts/?expand=items,tags&fields=id,store_name,items&ordering=total_amount',
+            '/api/receipts/?amount_min=13', f'/api/receipts/{self.receipt.pk}/',
+        ):
+            with self.subTest(path=path):
+                expected = await self.async_client.get(path, **self.auth)
+                actual = await self.async_client.get(path.replace('/api/', '/api/async/', 1), **self.auth)
+                self.assertEqual(actual.status_code, status.HTTP_200_OK)
+                self.assertEqual(actual.content, expected.content)
+        missing = await self.async_client.get('/api/async/receipts/999999/', **self.auth)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(REST_FRAMEWORK={'PAGE_SIZE': 2})
+    async def test_async_pagination_links(self):
+        from rest_framework.settings import api_settings
+        api_settings.reload()
+        try:
+            first = (await self.async_client.get('/api/async/receipts/', **self.auth)).json()
+            self.assertEqual(first['count'], 3)
+            self.assertTrue(first['next'].endswith('/api/async/receipts/?page=2'))
+            second = (await self.async_client.get(first['next'], **self.auth)).json()
+            self.assertEqual(len(second['results']), 1)
+            self.assertTrue(second['previous'].endswith('/api/async/receipts/'))
+        finally:
+            api_settings.reload()
+
+    async def test_async_analytics_matches_sync_and_caches(self):
+        from django.core.cache import cache
+        await cache.aclear()
+        actual = await self.async_client.get('/api/async/receipts/analytics/', **self.auth)
+        self.assertEqual(actual['X-Cache'], 'MISS')
+        expected = await self.async_client.get('/api/receipts/analytics/', **self.auth)
+        self.assertEqual(expected['X-Cache'], 'HIT')  # shared cache entry
+        await cache.aclear()
+        fresh = await self.async_client.get('/api/receipts/analytics/', **self.auth)
+        self.assertEqual(actual.json(), fresh.json())
+        self.assertEqual(actual.json()['summary']['total_receipts'], 3)
+
+    async def test_async_notifications_and_auth(self):
+        res = await self.async_client.get('/api/async/notifications/', **self.auth)
+        self.assertEqual([n['message'] for n in res.json()['results']], ['second', 'first'])
+        res = await self.async_client.get('/api/async/notifications/?unread=1', **self.auth)
+        self.assertEqual([n['message'] for n in res.json()['results']], ['first'])
+        res = await self.async_client.get('/api/async/notifications/')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = await self.async_client.get('/api/async/notifications/', headers={'Authorization': 'Token nope'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}, DRT_READ_REPLICAS=['replica1'], DRT_REPLICA_PIN_SECONDS=30)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        from unittest import mock
+        from django.core.cache import cache
+        from DRT.db.routers import ReplicaRouter, read_replica
+        from DRT.models import Category, Receipt
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="replicated", password="VeryStrongPass123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        self.category = Category.objects.create(name='Travel')
+        self.receipt = Receipt.objects.create(
+            user=self.user, category=self.category, store_name='Rail', total_amount=Decimal('20.00'),
+            purchase_date=date.today(),
+        )
+        # Token and reference data lookups happen outside the view; warm them.
+        self.client.get(f'/api/receipts/{self.receipt.pk}/')
+        # Record where reads would be routed, but serve them all from the test database.
+        self.routed = []
+
+        def spy(router, model, **hints):
+            self.routed.append(read_replica.get())
+            return None
+        patcher = mock.patch.object(ReplicaRouter, 'db_for_read', spy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url):
+        self.routed.clear()
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        if hasattr(res, 'streaming_content'):
+            b''.join(res.streaming_content)
+        return set(self.routed)
+
+    def test_list_analytics_and_export_read_from_replica(self):
+        self.assertEqual(self.get('/api/receipts/'), {'replica1'})
+        self.assertEqual(self.get('/api/receipts/analytics/'), {'replica1'})
+        self.assertEqual(self.get('/api/receipts/export/'), {'replica1'})
+        self.assertEqual(self.get(f'/api/receipts/{self.receipt.pk}/'), {None})
+
+    def test_writer_is_pinned_to_primary(self):
+        from django.core.cache import cache
+        from DRT.db.routers import PIN_COOKIE, pin_key
+        res = self.client.post('/api/receipts/', {
+            'store_name': 'Taxi', 'total_amount': '8.00', 'purchase_date': str(date.today()),
+            'category': self.category.pk,
+        }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.cookies[PIN_COOKIE]['max-age'], 30)
+        self.assertEqual(self.get('/api/receipts/'), {None})
+
+        # Token clients that drop cookies are pinned through the cache.
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.get('/api/receipts/'), {None})
+
+        cache.delete(pin_key(self.user.pk))
+        self.assertEqual(self.get('/api/receipts/'), {'replica1'})
+
+    def test_failed_write_does_not_pin(self):
+        res = self.client.post('/api/receipts/', {'store_name': ''}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get('/api/receipts/'), {'replica1'})
+
+    def test_writes_always_go_to_primary(self):
+        from DRT.db.routers import ReplicaRouter, read_replica
+        from DRT.models import Receipt
+        self.receipt._state.db = 'replica1'
+        token = read_replica.set('replica1')
+        try:
+            self.assertEqual(ReplicaRouter().db_for_write(Receipt, instance=self.receipt), 'default')
+        finally:
+            read_replica.reset(token)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        from DRT.models import Category
+        self.user = get_user_model().objects.create_user(username="notified", password="VeryStrongPass123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        self.category = Category.objects.create(name='Fuel')
+
+    def run_worker(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('run_notification_worker', '--once', stdout=out)
+        return out.getvalue()
+
+    def messages(self):
+        from DRT.models import Notification
+        return list(Notification.objects.filter(user=self.user).order_by('id').values_list('message', flat=True))
+
+    def test_api_writes_are_queued_then_delivered(self):
+        from DRT.models import NotificationOutbox
+        from DRT.notifications import outbox_lag
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/receipts/', {
+                'store_name': 'Shell', 'total_amount': '40.00', 'purchase_date': str(date.today()),
+                'category': self.category.pk,
+            }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.messages(), [])
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertGreaterEqual(outbox_lag(), 0)
+
+        self.assertIn('lag', self.run_worker())
+        self.assertEqual(self.messages(), ["Receipt from 'Shell' for Ksh 40.00 was added."])
+        self.assertEqual(NotificationOutbox.objects.count(), 0)
+        self.assertEqual(outbox_lag(), 0)
+
+    def test_repeated_updates_coalesce(self):
+        from DRT.models import Receipt
+        receipt = Receipt.objects.create(
+            user=self.user, category=self.category, store_name='Total', total_amount=Decimal('10.00'),
+            purchase_date=date.today(),
+        )
+        for name in ('Total 1', 'Total 2', 'Total 3'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/receipts/{receipt.pk}/', {'store_name': name}, format='json')
+        self.run_worker()
+        self.assertEqual(self.messages(), ["Receipt from 'Total 3' was updated."])
+
+    def test_failed_or_rolled_back_writes_do_not_notify(self):
+        from django.db import transaction
+        from DRT.models import NotificationOutbox
+        from DRT.notifications import notify
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/receipts/', {'store_name': ''}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    notify(self.user, 'never sent')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_batch_writes_outbox_once(self):
+        from DRT.models import NotificationOutbox
+        from DRT.notifications import notification_batch, notify
+        with self.assertNumQueries(3):  # savepoint, one INSERT, release
+            with notification_batch():
+                with self.captureOnCommitCallbacks(execute=True):
+                    notify(self.user, 'one')
+                    notify(self.user, 'two')
+        self.assertEqual(list(NotificationOutbox.objects.values_list('message', flat=True)), ['one', 'two'])
+
+    def test_web_budget_and_receipt_views_notify(self):
+        from DRT.models import Budget, Receipt
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(reverse('budget_create'), {
+                'category': self.category.pk, 'amount_limit': '250.00',
+                'period_start': date.today(), 'period_end': date.today() + timedelta(days=30),
+            })
+        self.assertEqual(res.status_code, 302)
+        budget = Budget.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('budget_delete', args=[budget.pk]))
+        receipt = Receipt.objects.create(
+            user=self.user, category=self.category, store_name='Kiosk', total_amount=Decimal('3.00'),
+            purchase_date=date.today(),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('receipt_delete', args=[receipt.pk]))
+        self.assertFalse(Receipt.objects.filter(pk=receipt.pk).exists())
+
+        self.run_worker()
+        self.assertEqual(self.messages(), [
+            "Budget for 'Fuel' (Ksh 250.00) created.",
+            "Budget for 'Fuel' (Ksh 250.00) was deleted.",
+            "Receipt from 'Kiosk' (Ksh 3.00) was deleted.",
+        ])
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from DRT.models import Notification
+        self.user = get_user_model().objects.create_user(username="reader", password="VeryStrongPass123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        now = timezone.now()
+        self.notifications = [
+            Notification.objects.create(user=self.user, message=f'n{i}', created_at=now - timedelta(minutes=i))
+            for i in range(25)
+        ]
+
+    def unread(self):
+        from DRT.notifications import unread_count
+        return unread_count(self.user)
+
+    def test_counter_follows_creates_reads_and_deletes(self):
+        from DRT.models import Notification
+        from DRT.notifications import drain_outbox, mark_all_read, mark_read, notify
+        self.assertEqual(self.unread(), 25)
+        self.assertTrue(mark_read(self.user, self.notifications[0].pk))
+        self.assertTrue(mark_read(self.user, self.notifications[0].pk))  # already read: no double count
+        self.assertEqual(self.unread(), 24)
+
+        self.notifications[1].delete()
+        read = Notification.objects.get(pk=self.notifications[2].pk)
+        read.is_read = True
+        read.save()
+        self.assertEqual(self.unread(), 22)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.user, 'from the outbox')
+        drain_outbox()
+        self.assertEqual(self.unread(), 23)
+
+        self.assertEqual(mark_all_read(self.user), 23)
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(mark_read(self.user, 10 ** 9))
+
+    def test_unread_feed_uses_composite_index(self):
+        from django.db import connection
+        from DRT.models import Notification
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite query plan')
+        from DRT.notifications import with_read_state
+        queryset = with_read_state(Notification.objects.filter(user=self.user), False).order_by('-created_at')[:20]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('notification_feed_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_web_feed_is_keyset_paginated_with_badge(self):
+        self.client.force_login(self.user)
+        res = self.client.get(reverse('notifications'))
+        self.assertEqual(len(res.context['notifications']), 20)
+        self.assertEqual(res.context['notifications'][0].message, 'n0')
+        self.assertContains(res, '<span class="badge rounded-pill bg-danger ms-1">25</span>', html=True)
+
+        res = self.client.get(reverse('notifications'), {'cursor': res.context['page_obj'].next_cursor})
+        self.assertEqual([n.message for n in res.context['notifications']], [f'n{i}' for i in range(20, 25)])
+        self.assertFalse(res.context['page_obj'].has_next())
+        self.assertEqual(self.client.get(reverse('notifications'), {'cursor': 'junk'}).status_code, 404)
+
+        res = self.client.get(reverse('mark_all_read'))
+        self.assertRedirects(res, reverse('notifications'))
+        self.assertNotContains(self.client.get(reverse('notifications')), 'bg-danger ms-1')
+
+    def test_api_feed_and_actions(self):
+        res = self.client.get('/api/notifications/')
+        self.assertEqual(len(res.data['results']), 20)
+        self.assertIn('cursor=', res.data['next'])
+        res = self.client.get(res.data['next'])
+        self.assertEqual([n['message'] for n in res.data['results']], [f'n{i}' for i in range(20, 25)])
+
+        pk = self.notifications[0].pk
+        self.assertEqual(self.client.post(f'/api/notifications/{pk}/read/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data, {'unread': 24})
+        self.assertNotIn(pk, [n['id'] for n in self.client.get('/api/notifications/?unread=1').data['results']])
+        self.assertEqual(self.client.post('/api/notifications/read-all/').data, {'marked_read': 24})
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data, {'unread': 0})
+
+        other = get_user_model().objects.create_user(username="snoop", password="VeryStrongPass123")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other.auth_token.key}')
+        self.assertEqual(self.client.post(f'/api/notifications/{pk}/read/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class BudgetUtilizationTests(TestCase):
+    def setUp(self):
+        from DRT.models import Budget, Category, Receipt
+        self.user = get_user_model().objects.create_user(username="budgeter", password="VeryStrongPass123")
+        other = get_user_model().objects.create_user(username="neighbour", password="VeryStrongPass123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        self.food = Category.objects.create(name='Food')
+        self.fuel = Category.objects.create(name='Fuel')
+        self.start = date.today() - timedelta(days=27)
+        self.budget = self.past_budget(self.food, Decimal('200.00'), self.start, self.start + timedelta(days=27))
+
+        def receipt(user, category, amount, day):
+            Receipt.objects.create(
+                user=user, category=category, store_name='Shop', total_amount=Decimal(amount), purchase_date=day,
+            )
+        receipt(self.user, self.food, '50.00', self.start)
+        receipt(self.user, self.food, '100.50', self.start + timedelta(days=27))
+        receipt(self.user, self.food, '999.00', self.start - timedelta(days=1))  # before the period
+        receipt(self.user, self.fuel, '999.00', self.start)  # other category
+        receipt(other, self.food, '999.00', self.start)  # other user
+
+    def past_budget(self, category, limit, start, end):
+        # Budget.clean() rejects past periods, so move the period after creating it.
+        from DRT.models import Budget
+        future = date.today() + timedelta(days=1 + Budget.objects.count())
+        budget = Budget.objects.create(
+            user=self.user, category=category, amount_limit=limit, period_start=future, period_end=future,
+        )
+        Budget.objects.filter(pk=budget.pk).update(period_start=start, period_end=end)
+        return budget
+
+    def add_budgets(self, count):
+        from DRT.models import Budget
+        existing = Budget.objects.count()
+        for n in range(existing, existing + count):
+            start = self.start - timedelta(days=40 + n)
+            self.past_budget(self.fuel, Decimal('10.00'), start, start)
+
+    def test_api_include_utilization(self):
+        res = self.client.get(f'/api/budgets/{self.budget.pk}/?include=utilization')
+        self.assertEqual(
+            (res.data['spent'], res.data['remaining'], res.data['percent_used']),
+            ('150.50', '49.50', '75.25'),
+        )
+        self.assertNotIn('spent', self.client.get(f'/api/budgets/{self.budget.pk}/').data)
+
+    def test_queries_do_not_grow_with_budgets(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = '/api/budgets/?include=utilization'
+        self.client.get(url)  # warm token and reference data caches
+
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            return len(ctx)
+        self.add_budgets(2)
+        few = count()
+        self.add_budgets(8)
+        self.assertEqual(count(), few)
+        self.assertLessEqual(few, 2)  # COUNT(*) for the page plus the page itself
+
+    def test_web_list_shows_spend(self):
+        self.client.force_login(self.user)
+        res = self.client.get(reverse('budget_list'))
+        budget = res.context['budgets'][0]
+        self.assertEqual((budget.spent, budget.percent_used), (Decimal('150.50'), Decimal('75.25')))
+        self.assertContains(res, '49.50 left')
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ActiveBudgetResolverTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from DRT.models import Budget, Category
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="planner", password="VeryStrongPass123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        self.food = Category.objects.create(name='Food')
+        self.fuel = Category.objects.create(name='Fuel')
+        self.today = date.today()
+
+        def budget(category, start, end):
+            return Budget.objects.create(
+                user=self.user, category=category, amount_limit=Decimal('100.00'),
+                period_start=self.today + timedelta(days=start), period_end=self.today + timedelta(days=end),
+            )
+        self.budget = budget
+        self.long = budget(self.fuel, 0, 60)
+        self.early = budget(self.food, 0, 10)
+        self.late = budget(self.food, 5, 20)
+        self.single = budget(self.fuel, 15, 15)
+
+    def active(self, **params):
+        res = self.client.get('/api/budgets/active/', params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in res.data]
+
+    def test_endpoint_resolves_date_and_category(self):
+        day = (self.today + timedelta(days=7)).isoformat()
+        self.assertEqual(self.active(date=day), [self.long.pk, self.early.pk, self.late.pk])
+        self.assertEqual(self.active(date=day, category=self.food.pk), [self.early.pk, self.late.pk])
+        self.assertEqual(self.active(), [self.long.pk, self.early.pk])
+        self.assertEqual(self.active(date=(self.today - timedelta(days=1)).isoformat()), [])
+        res = self.client.get('/api/budgets/active/', {'date': 'soon'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_matches_brute_force_from_cache(self):
+        from DRT.budgets import active_budgets
+        from DRT.models import Budget
+        days = [self.today + timedelta(days=n) for n in range(-2, 65)]
+        active_budgets(self.user.pk, days[:1])  # build and cache the index
+        with self.assertNumQueries(0):
+            resolved = active_budgets(self.user.pk, days)
+        budgets = list(Budget.objects.filter(user=self.user))
+        for day in days:
+            expected = {b.pk for b in budgets if b.period_start <= day <= b.period_end}
+            self.assertEqual({interval.id for interval in resolved[day]}, expected, day)
+
+    def test_long_early_budget_does_not_widen_lookups(self):
+        import random
+        from unittest import mock
+        from DRT.budgets import BudgetInterval, BudgetIntervals
+        rng = random.Random(7)
+        intervals = [BudgetInterval(0, 1, self.today, self.today + timedelta(days=1000), None)]
+        for n in range(1, 500):
+            start = self.today + timedelta(days=2 * n)
+            intervals.append(BudgetInterval(n, 1, start, start + timedelta(days=rng.randint(0, 3)), None))
+        index = BudgetIntervals(intervals)
+        collect = BudgetIntervals._collect
+        for day in (self.today + timedelta(days=n) for n in range(0, 1010, 7)):
+            with mock.patch.object(BudgetIntervals, '_collect', autospec=True, side_effect=collect) as visit:
+                found = index.covering(day)
+            expected = [i.id for i in intervals if i.period_start <= day <= i.period_end]
+            self.assertEqual([i.id for i in found], expected, day)
+            self.assertLess(visit.call_count, 25 * (len(found) + 1), day)
+
+    def test_budget_writes_invalidate_receipt_writes_do_not(self):
+        from DRT.budgets import active_budgets
+        from DRT.models import Receipt
+        day = self.today + timedelta(days=30)
+        self.assertEqual([i.id for i in active_budgets(self.user.pk, [day])[day]], [self.long.pk])
+
+        Receipt.objects.create(
+            user=self.user, category=self.food, store_name='Shop', total_amount=Decimal('5.00'), purchase_date=self.today
+        )
+        with self.assertNumQueries(0):
+            active_budgets(self.user.pk, [day])
+
+        added = self.budget(self.food, 25, 35)
+        self.assertEqual([i.id for i in active_budgets(self.user.pk, [day])[day]], [self.long.pk, added.pk])
+        added.delete()
+        self.assertEqual([i.id for i in active_budgets(self.user.pk, [day])[day]], [self.long.pk])
+
+
+@override_settings(
+    DATABASES={
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    },
+    DRT_FRAGMENT_CACHE_TIMEOUT=0,  # render every page, even revisited ones
+)
+class WebReceiptPaginationTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from DRT.models import Category, Receipt
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="historian", password="VeryStrongPass123")
+        self.client.force_login(self.user)
+        self.food = Category.objects.create(name='Food')
+        today = date.today()
+        # Three receipts per day, so pages split ties on purchase date.
+        Receipt.objects.bulk_create([
+            Receipt(
+                user=self.user, category=self.food if n % 3 else None, store_name=f'Shop {n}',
+                total_amount=Decimal('10.00') + n, purchase_date=today - timedelta(days=n // 3),
+            )
+            for n in range(45)
+        ])
+        self.expected = list(
+            Receipt.objects.filter(user=self.user).order_by('-purchase_date', '-uploaded_at', 'id')
+            .values_list('pk', flat=True)
+        )
+
+    def walk(self, params):
+        seen, cursor = [], None
+        while True:
+            res = self.client.get(reverse('receipts'), {**params, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(res.status_code, 200)
+            self.assertLessEqual(len(res.context['receipts']), 20)
+            seen += [receipt.pk for receipt in res.context['receipts']]
+            page = res.context['page_obj']
+            if not page.has_next():
+                return seen, res
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_receipt_once(self):
+        seen, res = self.walk({})
+        self.assertEqual(seen, self.expected)
+        self.assertNotIn('receipt_count', res.context)
+
+    def test_filters_carry_across_pages_and_count_once(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        res = self.client.get(reverse('receipts'), {'category': self.food.pk})
+        self.assertEqual(res.context['receipt_count']().count, 30)
+        self.assertContains(res, 'Found <strong>30</strong> receipts')
+        self.assertContains(res, f'?category={self.food.pk}&cursor=')
+
+        with CaptureQueriesContext(connection) as ctx:
+            seen, _ = self.walk({'category': self.food.pk})
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql']])
+        self.assertEqual(len(seen), 30)
+
+    @override_settings(DRT_WEB_RECEIPT_COUNT_LIMIT=10)
+    def test_count_is_capped(self):
+        res = self.client.get(reverse('receipts'), {'amount_min': '0'})
+        self.assertContains(res, 'Found <strong>10+</strong> receipts')
+
+    def test_invalid_cursor_is_not_found(self):
+        res = self.client.get(reverse('receipts'), {'cursor': 'nonsense'})
+        self.assertEqual(res.status_code, 404)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class WebFragmentCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from DRT.models import Budget, Category, Receipt, ReceiptItem
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="renderer", password="VeryStrongPass123")
+        self.client.force_login(self.user)
+        self.food = Category.objects.create(name='Food')
+        self.receipt = Receipt.objects.create(
+            user=self.user, category=self.food, store_name='Corner Shop', total_amount=Decimal('12.00'),
+            purchase_date=date.today(),
+        )
+        ReceiptItem.objects.create(receipt=self.receipt, item_name='Bread', quantity=1, unit_price=Decimal('12.00'), total_price=Decimal('12.00'))
+        Budget.objects.create(
+            user=self.user, category=self.food, amount_limit=Decimal('100.00'),
+            period_start=date.today(), period_end=date.today() + timedelta(days=30),
+        )
+
+    def get(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res, len(ctx)
+
+    def assert_cached(self, url):
+        first, cold = self.get(url)
+        second, warm = self.get(url)
+        self.assertIn('fragment miss', first['Server-Timing'])
+        self.assertIn('fragment hit', second['Server-Timing'])
+        self.assertLess(warm, cold)
+        self.assertEqual(second.content, first.content)
+        return cold, warm
+
+    def test_pages_reuse_fragments(self):
+        for url in (reverse('receipt_detail', args=[self.receipt.pk]), reverse('receipts'), reverse('budget_list')):
+            with self.subTest(url=url):
+                self.assert_cached(url)
+
+    def test_writes_replace_fragments(self):
+        from DRT.models import Receipt, ReceiptItem
+        detail = reverse('receipt_detail', args=[self.receipt.pk])
+        self.assert_cached(detail)
+        self.assert_cached(reverse('budget_list'))
+        ReceiptItem.objects.create(receipt=self.receipt, item_name='Milk', quantity=1, unit_price=Decimal('3.00'), total_price=Decimal('3.00'))
+        Receipt.objects.create(
+            user=self.user, category=self.food, store_name='Market', total_amount=Decimal('30.00'),
+            purchase_date=date.today(),
+        )
+        res, _ = self.get(detail)
+        self.assertIn('fragment miss', res['Server-Timing'])
+        self.assertContains(res, 'Milk')
+        self.assertContains(self.get(reverse('budget_list'))[0], '42.00')
+
+        # Renaming a category changes reference data, not the user's rows.
+        self.food.name = 'Groceries'
+        self.food.save()
+        self.assertContains(self.get(detail)[0], 'Groceries')
+
+    def test_fragment_evicted_after_hit_check_still_renders_data(self):
+        from unittest import mock
+        from DRT.fragments import FragmentCache
+        pages = [
+            (reverse('receipt_detail', args=[self.receipt.pk]), 'Bread'),
+            (reverse('receipts') + '?q=Corner', 'Corner Shop'),
+            (reverse('budget_list'), '100.00'),
+        ]
+        # A stale "hit" (the entry is gone by the time the template looks)
+        # must not render or cache an empty page.
+        with mock.patch.object(FragmentCache, 'hit', True):
+            for url, text in pages:
+                with self.subTest(url=url):
+                    self.assertContains(self.get(url)[0], text)
+        for url, text in pages:
+            with self.subTest(url=url, cached=True):
+                self.assertContains(self.get(url)[0], text)
+
+    def test_owner_check_reuses_fetched_object(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse('receipt_update', args=[self.receipt.pk]))
+        self.assertEqual(res.status_code, 200)
+        fetches = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'FROM "DRT_receipt"' in q['sql']]
+        self.assertEqual(len(fetches), 1)
+
+        other = get_user_model().objects.create_user(username="intruder", password="VeryStrongPass123")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('receipt_update', args=[self.receipt.pk])).status_code, 403)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from DRT.models import Category, PaymentMethod, Tag
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="profiler", password="VeryStrongPass123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        self.food = Category.objects.create(name='Food')
+        self.card = PaymentMethod.objects.create(name='Card')
+        self.tag = Tag.objects.create(name='work')
+        self.day = 0
+
+    def add_receipts(self, count=5):
+        from django.utils import timezone
+        from DRT.models import Budget, Receipt, ReceiptItem, ReceiptPayment, ReceiptTag
+        for _ in range(count):
+            self.day += 1
+            receipt = Receipt.objects.create(
+                user=self.user, category=self.food, store_name='Shop', total_amount=Decimal('10.00'),
+                purchase_date=date.today() - timedelta(days=self.day),
+            )
+            ReceiptItem.objects.create(
+                receipt=receipt, item_name='Bread', quantity=1, unit_price=Decimal('10.00'), total_price=Decimal('10.00')
+            )
+            ReceiptPayment.objects.create(
+                receipt=receipt, payment_method=self.card, amount_paid=Decimal('10.00'), paid_at=timezone.now()
+            )
+            ReceiptTag.objects.create(receipt=receipt, tag=self.tag)
+            Budget.objects.create(
+                user=self.user, category=self.food, amount_limit=Decimal('50.00'),
+                period_start=date.today() + timedelta(days=self.day), period_end=date.today() + timedelta(days=self.day),
+            )
+
+    def test_server_timing_reports_queries(self):
+        self.add_receipts(2)
+        res = self.client.get('/api/receipts/')
+        self.assertRegex(res['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertNotIn('db-repeat', res['Server-Timing'])
+
+    @override_settings(DRT_QUERY_REPEAT_THRESHOLD=3, DRT_QUERY_COUNT_BUDGET=1000)
+    def test_repeated_query_shapes_are_flagged_and_logged(self):
+        from django.test import RequestFactory
+        from django.http import HttpResponse
+        from DRT.db.middleware import QueryInstrumentationMiddleware
+        from DRT.models import Receipt
+        self.add_receipts(4)
+        ids = list(Receipt.objects.values_list('pk', flat=True))
+
+        def n_plus_one(request):
+            return HttpResponse(', '.join(Receipt.objects.get(pk=pk).store_name for pk in ids))
+        middleware = QueryInstrumentationMiddleware(n_plus_one)
+        with self.assertLogs('DRT.db.middleware', 'WARNING') as logs:
+            res = middleware(RequestFactory().get('/slow/'))
+        self.assertIn('db-repeat;desc="4x"', res['Server-Timing'])
+        self.assertIn('GET /slow/ ran 4 queries', logs.output[0])
+
+    @override_settings(DRT_QUERY_COUNT_BUDGET=0)
+    def test_requests_over_budget_are_logged(self):
+        with self.assertLogs('DRT.db.middleware', 'WARNING') as logs:
+            self.client.get('/api/receipts/')
+        self.assertIn('GET /api/receipts/ ran', logs.output[0])
+
+    def test_list_endpoints_do_not_grow_with_page_size(self):
+        from DRT.testing import assert_constant_queries
+        self.add_receipts(2)
+        for url in ('/api/receipts/', '/api/budgets/?include=utilization', '/api/receipt-tags/',
+                    '/api/receipt-payments/', '/api/receipt-items/'):
+            with self.subTest(url=url):
+                assert_constant_queries(self, lambda: self.client.get(url), self.add_receipts)
+
+    def test_helper_fails_on_n_plus_one(self):
+        from DRT.models import ReceiptItem
+        from DRT.testing import assert_constant_queries
+        self.add_receipts(2)
+        with self.assertRaisesRegex(AssertionError, 'Query count grew'):
+            assert_constant_queries(
+                self, lambda: [item.receipt.store_name for item in ReceiptItem.objects.all()], self.add_receipts
+            )
+
+    def test_str_does_not_query(self):
+        from DRT.models import Budget, Notification, ReceiptPayment, ReceiptTag
+        from DRT.registry import reference_data
+        self.add_receipts(1)
+        Notification.objects.create(user=self.user, message='hi')
+        reference_data.categories()  # load the registry
+        rows = [
+            Budget.objects.get(), ReceiptTag.objects.get(), ReceiptPayment.objects.get(), Notification.objects.get()
+        ]
+        with self.assertNumQueries(0):
+            labels = [str(row) for row in rows]
+        self.assertIn('Food', labels[0])
+        self.assertTrue(labels[1].endswith(':work'))
+        self.assertIn('via Card', labels[2])
+        self.assertEqual(labels[3], f'Notification for user {self.user.pk}')
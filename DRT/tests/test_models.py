@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from decimal import Decimal
 from datetime import date, timedelta
+from io import StringIO
 
 from DRT.models import (
     Category,
@@ -13,6 +14,7 @@ from DRT.models import (
     Tag,
     ReceiptTag,
     Budget,
+    DailySpend,
 )
 
 
@@ -163,3 +165,560 @@ class ModelValidationTests(TestCase):
             bad_budget.save()
 
 
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class DailySpendRollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="roller", password="strongpass123")
+        self.category = Category.objects.create(name="Groceries")
+        self.method = PaymentMethod.objects.create(name="Cash")
+        self.receipt = Receipt.objects.create(
+            user=self.user,
+            category=self.category,
+            store_name="Store A",
+            total_amount=Decimal("100.00"),
+            purchase_date=date.today(),
+        )
+
+    def summary(self):
+        from DRT.rollups import spend_summary
+        return spend_summary(self.user, date.today() - timedelta(days=30), date.today())
+
+    def test_rollup_tracks_receipts_and_payments(self):
+        ReceiptPayment.objects.create(
+            receipt=self.receipt, payment_method=self.method,
+            amount_paid=Decimal("40.00"), paid_at=timezone.now(),
+        )
+        summary = self.summary()
+        self.assertEqual(summary['summary'], {'total_expenses': Decimal("100.00"), 'total_receipts': 1})
+        self.assertEqual(summary['by_category'][0]['category__name'], "Groceries")
+        self.assertEqual(summary['by_payment_method'][0]['total'], Decimal("40.00"))
+
+    def test_moving_receipt_date_moves_bucket(self):
+        self.receipt.purchase_date = date.today() - timedelta(days=60)
+        self.receipt.save()
+        self.assertEqual(self.summary()['summary']['total_receipts'], 0)
+        self.assertEqual(DailySpend.objects.filter(date=date.today()).count(), 0)
+
+    def test_delete_clears_rollup(self):
+        ReceiptPayment.objects.create(
+            receipt=self.receipt, payment_method=self.method,
+            amount_paid=Decimal("40.00"), paid_at=timezone.now(),
+        )
+        self.receipt.delete()
+        self.assertFalse(DailySpend.objects.exists())
+
+    def test_rebuild_command_backfills(self):
+        from django.core.management import call_command
+        DailySpend.objects.all().delete()
+        call_command('rebuild_daily_spend', user=self.user.username, stdout=StringIO())
+        self.assertEqual(self.summary()['summary']['total_expenses'], Decimal("100.00"))
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ReferenceRegistryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="registry", password="strongpass123")
+        self.category = Category.objects.create(name="Groceries")
+        self.method = PaymentMethod.objects.create(name="Cash")
+
+    def category_queries(self, fn):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            fn()
+        return [q['sql'] for q in ctx.captured_queries if '"DRT_category"' in q['sql']]
+
+    def test_validation_uses_registry_after_warmup(self):
+        from DRT.registry import reference_data
+        reference_data.categories()  # warm the snapshot
+        receipt = Receipt(
+            user=self.user, category=self.category, store_name="Store",
+            total_amount=Decimal("10.00"), purchase_date=date.today(),
+        )
+        self.assertEqual(self.category_queries(receipt.clean), [])
+
+    def test_writes_invalidate_registry(self):
+        from DRT.registry import reference_data
+        self.assertEqual(reference_data.category_name(self.category.id), "Groceries")
+        self.category.name = "Food"
+        self.category.save()
+        self.assertEqual(reference_data.category_name(self.category.id), "Food")
+        other = Category.objects.create(name="Transport")
+        self.assertIn(other, reference_data.categories())
+
+    def test_form_choices_render_without_queries(self):
+        from DRT.forms import ReceiptForm
+        from DRT.registry import reference_data
+        reference_data.categories()
+        form = ReceiptForm()
+        self.assertEqual(self.category_queries(lambda: str(form['category'])), [])
+        self.assertIn("Groceries", str(form['category']))
+        bound = ReceiptForm(data={
+            'store_name': 'Store', 'category': str(self.category.id), 'total_amount': '10.00',
+            'currency': 'KES', 'purchase_date': str(date.today()),
+        })
+        self.assertTrue(bound.is_valid(), bound.errors)
+        self.assertEqual(bound.cleaned_data['category'], self.category)
+
+    def test_version_checked_once_per_interval(self):
+        from unittest import mock
+        from DRT import registry
+        from DRT.cache import bump_version
+        reference_data = registry.reference_data
+        reference_data.clear()
+        reference_data.categories()  # reload and start a fresh interval
+        with mock.patch.object(registry, 'get_version', wraps=registry.get_version) as get_version:
+            for _ in range(5):
+                reference_data.category_name(self.category.id)
+        self.assertEqual(get_version.call_count, 0)
+
+        # Another process renames the category: seen once the interval has passed.
+        Category.objects.filter(pk=self.category.pk).update(name="Food")
+        bump_version(registry.SCOPE)
+        with override_settings(DRT_REFDATA_CHECK_INTERVAL=0):
+            self.assertEqual(reference_data.category_name(self.category.id), "Food")
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ImportReceiptsCommandTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.user = get_user_model().objects.create_user(username="importer", password="strongpass123")
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, content):
+        import os
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def record(self, store, **overrides):
+        record = {
+            'store_name': store,
+            'total_amount': '10.00',
+            'currency': 'KES',
+            'purchase_date': str(date.today()),
+            'category_name': 'Groceries',
+            'tags': ['Imported'],
+            'items': [{'item_name': 'Milk', 'quantity': 2, 'unit_price': '5.00', 'total_price': '10.00'}],
+            'payments': [{'payment_method_name': 'Cash', 'amount_paid': '10.00',
+                          'paid_at': (date.today() - timedelta(days=1)).isoformat() + 'T09:00:00Z'}],
+        }
+        record.update(overrides)
+        return record
+
+    def run_import(self, path, **options):
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('import_receipts', path, user=self.user.username, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_ndjson_import_resolves_references_and_resumes(self):
+        import json
+        lines = [self.record('A'), self.record('B', total_amount='-1'), self.record('C')]
+        path = self.write('receipts.ndjson', '\n'.join(json.dumps(r) for r in lines))
+
+        output = self.run_import(path, batch_size=2)
+        self.assertIn('rows/s', output)
+        receipts = Receipt.objects.filter(user=self.user)
+        self.assertEqual(sorted(receipts.values_list('store_name', flat=True)), ['A', 'C'])
+        self.assertEqual(set(receipts.values_list('category__name', flat=True)), {'Groceries'})
+        self.assertEqual(ReceiptPayment.objects.filter(payment_method__name='Cash').count(), 2)
+        self.assertEqual(ReceiptTag.objects.filter(tag__name='Imported').count(), 2)
+
+        # A rerun resumes from the checkpoint and inserts nothing new.
+        self.run_import(path, batch_size=2)
+        self.assertEqual(receipts.count(), 2)
+
+    def test_csv_import_reads_export_layout(self):
+        import csv
+        import io
+        import json
+        from DRT.exports import CSV_COLUMNS
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        record = self.record('Exported')
+        writer.writerow({k: json.dumps(v) if k in ('tags', 'items', 'payments') else v for k, v in record.items()})
+        path = self.write('receipts.csv', buffer.getvalue())
+
+        self.run_import(path)
+        receipt = Receipt.objects.get(user=self.user)
+        self.assertEqual(receipt.store_name, 'Exported')
+        self.assertEqual(receipt.items.count(), 1)
+
+    def test_malformed_records_are_rejected_in_place(self):
+        import json
+        from DRT.models import ImportCheckpoint
+        lines = [json.dumps(self.record('A')), '{"store_name": ', '[1, 2]', json.dumps(self.record('D'))]
+        path = self.write('receipts.ndjson', '\n'.join(lines))
+
+        self.run_import(path, batch_size=3)
+        checkpoint = ImportCheckpoint.objects.get(user=self.user)
+        self.assertEqual((checkpoint.offset, checkpoint.imported, checkpoint.rejected), (4, 2, 2))
+        self.assertEqual(
+            sorted(Receipt.objects.filter(user=self.user).values_list('store_name', flat=True)), ['A', 'D']
+        )
+
+        # A bad nested cell only rejects its own CSV row.
+        path = self.write('receipts.csv', 'store_name,total_amount,tags\nBad,10.00,"[oops"\n')
+        self.run_import(path)
+        self.assertEqual(ImportCheckpoint.objects.get(user=self.user, source=path).rejected, 1)
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class ConnectionPoolTests(TestCase):
+    class FakeConnection:
+        def __init__(self):
+            self.alive = True
+            self.closed = False
+
+    def make_pool(self, **options):
+        from DRT.db.pool import ConnectionPool
+
+        def validate(conn):
+            if not conn.alive:
+                raise RuntimeError('gone away')
+
+        self.opened = []
+
+        def connect():
+            conn = self.FakeConnection()
+            self.opened.append(conn)
+            return conn
+        return ConnectionPool(connect, validate, lambda conn: setattr(conn, 'closed', True), **options)
+
+    def test_checkin_reuses_connection(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+        stats = pool.snapshot()
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use']), (1, 1, 1))
+        self.assertEqual(stats['saturation'], 0.5)
+
+    def test_dead_and_expired_connections_are_replaced(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.checkout()
+        conn.alive = False
+        pool.checkin(conn)
+        replacement = pool.checkout()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+
+        pool.max_lifetime = 0
+        pool.checkin(replacement)
+        self.assertIsNot(pool.checkout(), replacement)
+        stats = pool.snapshot()
+        self.assertEqual((stats['failed_checks'], stats['recycled'], stats['created']), (1, 1, 3))
+
+    def test_discard_closes_instead_of_returning(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.checkout()
+        pool.checkin(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertIsNot(pool.checkout(), conn)
+        self.assertEqual(pool.snapshot()['discarded'], 1)
+
+    def test_saturated_pool_waits_then_times_out(self):
+        import threading
+        from DRT.db.pool import PoolTimeout
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        conn = pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+
+        pool.timeout = 5
+        threading.Timer(0.05, pool.checkin, args=(conn,)).start()
+        self.assertIs(pool.checkout(), conn)
+        stats = pool.snapshot()
+        self.assertEqual((stats['timeouts'], stats['waits']), (1, 1))
+        self.assertGreater(stats['max_wait_seconds'], 0)
+
+    def test_failed_connect_releases_slot(self):
+        from DRT.db.pool import ConnectionPool
+
+        def connect():
+            raise OSError('refused')
+        pool = ConnectionPool(connect, lambda conn: None, lambda conn: None, max_size=1, timeout=0)
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.checkout()
+        self.assertEqual(pool.snapshot()['in_use'], 0)
+
+    def test_sqlite_backend_reuses_pooled_connection(self):
+        import os
+        import tempfile
+        from django.db import connection
+        from DRT.db.backends.sqlite3.base import DatabaseWrapper
+
+        directory = tempfile.mkdtemp()
+        settings_dict = {
+            **connection.settings_dict,
+            'ENGINE': 'DRT.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'pooled.sqlite3'),
+            'POOL': {'MAX_SIZE': 2},
+        }
+        wrapper = DatabaseWrapper(settings_dict, alias='pooled_test')
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = wrapper.connection
+        wrapper.close()
+
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIs(wrapper.connection, raw)
+        self.assertEqual(wrapper.pool.snapshot()['reused'], 1)
+
+        # A connection closed inside a transaction is not handed out again.
+        wrapper.set_autocommit(False)
+        wrapper.close()
+        wrapper.ensure_connection()
+        self.assertIsNot(wrapper.connection, raw)
+        wrapper.close()
+        wrapper.pool.clear()
+
+    def test_middleware_reports_pool_wait(self):
+        self.assertRegex(self.client.get('/login/')['Server-Timing'], r'db-pool;dur=\d+\.\d')
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+})
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        from DRT.models import Notification
+        self.user = get_user_model().objects.create_user(username="archivist", password="strongpass123")
+        self.now = timezone.now()
+        self.day = lambda days: self.now - timedelta(days=days)
+        # Two read notifications on the same old day, one unread; all 60 days old.
+        for is_read in (True, True, False):
+            Notification.objects.create(user=self.user, message='old', is_read=is_read, created_at=self.day(60))
+        # Read but recent: kept as is.
+        Notification.objects.create(user=self.user, message='recent', is_read=True, created_at=self.day(1))
+        # Past every retention window.
+        for is_read in (True, False):
+            Notification.objects.create(user=self.user, message='ancient', is_read=is_read, created_at=self.day(400))
+
+    def run_command(self, *args):
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('compact_notifications', *args, stdout=out)
+        return out.getvalue()
+
+    def unread(self):
+        from DRT.notifications import unread_count
+        return unread_count(self.user)
+
+    def test_purges_then_digests_in_chunks(self):
+        from DRT.models import Notification
+        self.assertEqual(self.unread(), 2)
+        output = self.run_command('--chunk-size', '2', '--unread-retention', '300')
+        self.assertIn('purge ids', output)
+        self.assertIn('ms', output)
+        self.assertIn('Reclaimed 3 notification rows (4 removed, 1 digests written)', output)
+
+        rows = Notification.objects.filter(user=self.user).order_by('created_at')
+        self.assertEqual(
+            [(n.message, n.is_read, n.digest_size) for n in rows],
+            [
+                (f"2 earlier notifications from {timezone.localdate(self.day(60)):%d %b %Y}.", True, 2),
+                ('old', False, 0),
+                ('recent', True, 0),
+            ],
+        )
+        self.assertTrue(rows[0].is_digest)
+        self.assertEqual(self.unread(), 1)
+
+    def test_digest_for_a_day_split_across_chunks_is_extended(self):
+        from DRT.models import Notification
+        from DRT.retention import compact_notifications
+        list(compact_notifications(self.day(30), chunk_size=1))
+        digests = Notification.objects.filter(digest_size__gt=0)
+        self.assertEqual([(d.digest_size, d.message[:25]) for d in digests], [
+            (2, '2 earlier notifications f'),
+            (1, '1 earlier notification fr'),
+        ])
+
+    def test_zero_retention_keeps_rows(self):
+        from DRT.models import Notification
+        self.run_command('--digest-after', '0', '--read-retention', '0')
+        self.assertEqual(Notification.objects.count(), 6)
+        from django.core.management import CommandError
+        with self.assertRaises(CommandError):
+            self.run_command('--chunk-size', '0')
+
+
+@override_settings(
+    DATABASES={
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    },
+    DRT_BUDGET_ALERT_THRESHOLDS=[80, 100],
+)
+class BudgetConsumptionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="spender", password="strongpass123")
+        self.food = Category.objects.create(name="Food")
+        self.fuel = Category.objects.create(name="Fuel")
+        self.today = date.today()
+        self.food_budget = self.budget(self.food)
+        self.fuel_budget = self.budget(self.fuel)
+
+    def budget(self, category, limit='100.00'):
+        return Budget.objects.create(
+            user=self.user, category=category, amount_limit=Decimal(limit),
+            period_start=self.today, period_end=self.today + timedelta(days=30),
+        )
+
+    def receipt(self, amount, category=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Receipt.objects.create(
+                user=self.user, category=category or self.food, store_name="Shop",
+                total_amount=Decimal(amount), purchase_date=self.today,
+            )
+
+    def save(self, receipt):
+        with self.captureOnCommitCallbacks(execute=True):
+            receipt.save()
+
+    def consumed(self):
+        return tuple(
+            Budget.objects.get(pk=budget.pk).consumed_amount for budget in (self.food_budget, self.fuel_budget)
+        )
+
+    def alerts(self):
+        from DRT.models import NotificationOutbox
+        return list(NotificationOutbox.objects.order_by('id').values_list('message', flat=True))
+
+    def test_counters_follow_receipt_writes(self):
+        receipt = self.receipt('30.00')
+        self.assertEqual(self.consumed(), (Decimal('30.00'), Decimal('0.00')))
+        receipt.total_amount = Decimal('45.50')
+        self.save(receipt)
+        self.assertEqual(self.consumed(), (Decimal('45.50'), Decimal('0.00')))
+        receipt.category = self.fuel
+        self.save(receipt)
+        self.assertEqual(self.consumed(), (Decimal('0.00'), Decimal('45.50')))
+        receipt.purchase_date = self.today - timedelta(days=1)  # before both periods
+        self.save(receipt)
+        self.assertEqual(self.consumed(), (Decimal('0.00'), Decimal('0.00')))
+        receipt.purchase_date = self.today
+        self.save(receipt)
+        receipt.delete()
+        self.assertEqual(self.consumed(), (Decimal('0.00'), Decimal('0.00')))
+
+    def test_each_threshold_alerts_once(self):
+        self.receipt('50.00')
+        self.assertEqual(self.alerts(), [])
+        self.receipt('35.00')  # 85%
+        self.receipt('5.00')  # 90%: 80% already alerted
+        self.assertEqual(len(self.alerts()), 1)
+        self.assertIn("80%", self.alerts()[0])
+        over = self.receipt('20.00')  # 110%
+        self.assertEqual(len(self.alerts()), 2)
+        self.assertIn("100%", self.alerts()[1])
+
+        # Editing a receipt within the same budget nets out: no repeat alert.
+        over.total_amount = Decimal('25.00')
+        self.save(over)
+        self.assertEqual(len(self.alerts()), 2)
+
+        # Dropping below 100% re-arms it; crossing again alerts again.
+        over.delete()
+        self.assertEqual(Budget.objects.get(pk=self.food_budget.pk).alerted_threshold, 80)
+        self.receipt('10.00')
+        self.assertEqual(len(self.alerts()), 3)
+
+    def test_bulk_ingest_updates_counters_once_per_budget(self):
+        from DRT.bulk import ingest_receipts
+        rows = [
+            {'store_name': 'Shop', 'total_amount': amount, 'purchase_date': self.today.isoformat(), 'category': self.food.pk}
+            for amount in ('40.00', '45.00')
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = ingest_receipts(self.user, rows)
+        self.assertEqual(len(result.created), 2)
+        self.assertEqual(self.consumed(), (Decimal('85.00'), Decimal('0.00')))
+        self.assertEqual(len(self.alerts()), 1)
+
+    def test_budget_save_keeps_counters(self):
+        stale = Budget.objects.get(pk=self.food_budget.pk)
+        self.receipt('90.00')
+        stale.amount_limit = Decimal('200.00')
+        stale.save()
+        stale.refresh_from_db()
+        self.assertEqual((stale.consumed_amount, stale.alerted_threshold), (Decimal('90.00'), 0))
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        from django.core.management import call_command
+        self.receipt('30.00')
+        Budget.objects.filter(pk=self.food_budget.pk).update(consumed_amount=Decimal('7.00'))
+
+        out = StringIO()
+        call_command('reconcile_budgets', '--dry-run', stdout=out)
+        self.assertIn(f"budget {self.food_budget.pk}: recorded 7.00, receipts total 30.00", out.getvalue())
+        self.assertEqual(self.consumed()[0], Decimal('7.00'))
+
+        out = StringIO()
+        call_command('reconcile_budgets', stdout=out)
+        self.assertIn("Corrected 1 of 2 budgets.", out.getvalue())
+        self.assertEqual(self.consumed(), (Decimal('30.00'), Decimal('0.00')))
+        out = StringIO()
+        call_command('reconcile_budgets', stdout=out)
+        self.assertIn("All 2 budgets match", out.getvalue())
+
+
+@override_settings(DATABASES={
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}, DRT_REQUIRE_SHARED_CACHE=True)
+class SharedCacheCheckTests(TestCase):
+    def run_check(self, backend, location=''):
+        from DRT.checks import check_shared_cache
+        with override_settings(CACHES={'default': {'BACKEND': backend, 'LOCATION': location}}):
+            return [error.id for error in check_shared_cache(None)]
+
+    def test_process_local_cache_is_an_error(self):
+        self.assertEqual(self.run_check('django.core.cache.backends.locmem.LocMemCache'), ['DRT.E001'])
+        self.assertEqual(self.run_check('django.core.cache.backends.dummy.DummyCache'), ['DRT.E001'])
+
+    def test_shared_cache_passes(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as location:
+            self.assertEqual(self.run_check('django.core.cache.backends.filebased.FileBasedCache', location), [])
+
+    def test_single_process_deployment_may_opt_out(self):
+        with override_settings(DRT_REQUIRE_SHARED_CACHE=False):
+            self.assertEqual(self.run_check('django.core.cache.backends.locmem.LocMemCache'), [])
@@ -0,0 +1,193 @@
+"""
+Native async read endpoints for ASGI deployments.
+
+DRF views are synchronous, so under an ASGI server each request to them
+holds a worker thread for its whole lifetime. These views keep the event loop
+free while they wait on the database. They serve the same JSON as their DRF
+counterparts:
+
+* ``GET /api/async/receipts/`` and ``/api/async/receipts/<pk>/`` – same
+  filters, search, ordering, ``fields``/``expand`` and page-number pagination
+  as ``/api/receipts/`` (the queryset is built by ``ReceiptViewSet`` itself)
+* ``GET /api/async/receipts/analytics/`` – the analytics aggregates awaited
+  together; ``DRT_ASYNC_PARALLEL_QUERIES`` runs each on its own connection
+* ``GET /api/async/notifications/`` – the user's notifications, newest first
+
+Token and session authentication are supported.
+"""
+
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from ..authentication import CachedTokenAuthentication
+from ..cache import user_cache_key
+from ..compiled import CompiledSerializer
+from ..models import Notification
+from ..notifications import with_read_state
+from ..rollups import aspend_summary
+from ..serializers import NotificationSerializer
+from .receipts import ReceiptViewSet, analytics_cache_stats
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    """Render ``data`` exactly like DRF's ``JSONRenderer``."""
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, headers=headers,
+        content_type='application/json',
+    )
+
+
+async def authenticate(request):
+    """The requesting user from a ``Token`` header or the session, else None."""
+    if request.headers.get('Authorization', '').lower().startswith('token '):
+        result = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+        return result[0] if result else None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def async_api_view(view):
+    """GET-only, authenticated async view returning DRF-style errors."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED,
+            )
+        try:
+            user = await authenticate(request)
+        except AuthenticationFailed as exc:
+            return json_response({'detail': exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+        if user is None:
+            return json_response(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def paginate(request, queryset, serialize):
+    """``PageNumberPagination``-shaped response for ``queryset``."""
+    page_size = api_settings.PAGE_SIZE
+    try:
+        number = int(request.GET.get('page', 1))
+        if number < 1:
+            raise ValueError
+    except ValueError:
+        return json_response({'detail': 'Invalid page.'}, status=status.HTTP_404_NOT_FOUND)
+
+    count = await queryset.acount()
+    offset = (number - 1) * page_size
+    if offset and offset >= count:
+        return json_response({'detail': 'Invalid page.'}, status=status.HTTP_404_NOT_FOUND)
+    rows = [
+        obj async for obj in queryset[offset:offset + page_size].aiterator(chunk_size=page_size)
+    ]
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', number + 1) if offset + page_size < count else None
+    if number == 1:
+        previous_url = None
+    elif number == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', number - 1)
+    return json_response({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': await serialize(rows),
+    })
+
+
+def receipt_view(request, action, **kwargs):
+    """A ``ReceiptViewSet`` bound to ``request`` for building querysets and serializers."""
+    drf_request = Request(request)
+    drf_request.user = request.user
+    return ReceiptViewSet(
+        request=drf_request, action=action, args=(), kwargs=kwargs, format_kwarg=None,
+    )
+
+
+@async_api_view
+async def receipt_list(request):
+    view = receipt_view(request, 'list')
+    # Filter backends may validate ids against the database.
+    queryset = await sync_to_async(lambda: view.filter_queryset(view.get_queryset()))()
+
+    async def serialize(rows):
+        return await sync_to_async(lambda: view.get_serializer(rows, many=True).data)()
+    return await paginate(request, queryset, serialize)
+
+
+@async_api_view
+async def receipt_detail(request, pk):
+    view = receipt_view(request, 'retrieve', pk=pk)
+    receipt = await view.get_queryset().filter(pk=pk).afirst()
+    if receipt is None:
+        return json_response(
+            {'detail': 'No Receipt matches the given query.'}, status=status.HTTP_404_NOT_FOUND
+        )
+    data = await sync_to_async(lambda: view.get_serializer(receipt).data)()
+    return json_response(data)
+
+
+def on_own_connection(fn):
+    """Await ``fn`` in a worker thread with its own database connection."""
+    def run():
+        try:
+            return fn()
+        finally:
+            connections.close_all()
+    return sync_to_async(run, thread_sensitive=False)()
+
+
+@async_api_view
+async def receipt_analytics(request):
+    user = request.user
+    days = int(request.GET.get('days', 30))
+    end_date = timezone.now().date()
+    start_date = end_date - timedelta(days=days)
+
+    key = await sync_to_async(user_cache_key)('analytics', user.pk, days, end_date.isoformat())
+    data = await cache.aget(key)
+    if data is not None:
+        analytics_cache_stats.record('hits')
+        return json_response(data, headers={'X-Cache': 'HIT'})
+
+    analytics_cache_stats.record('misses')
+    run = on_own_connection if getattr(settings, 'DRT_ASYNC_PARALLEL_QUERIES', False) else None
+    data = {
+        'period': {'start_date': start_date, 'end_date': end_date, 'days': days},
+        **await aspend_summary(user, start_date, end_date, run=run),
+    }
+    await cache.aset(key, data, getattr(settings, 'DRT_ANALYTICS_CACHE_TIMEOUT', 300))
+    return json_response(data, headers={'X-Cache': 'MISS'})
+
+
+@async_api_view
+async def notification_list(request):
+    queryset = Notification.objects.filter(user=request.user).order_by('-created_at', '-id')
+    unread = request.GET.get('unread')
+    if unread is not None:
+        queryset = with_read_state(queryset, unread.lower() in ('0', 'false', 'no'))
+
+    async def serialize(rows):
+        return CompiledSerializer(NotificationSerializer(rows, many=True)).data
+    return await paginate(request, queryset, serialize)
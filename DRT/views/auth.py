@@ -8,6 +8,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout as auth_logout
 from django.contrib.auth import authenticate
 
+from .. import notifications
 from ..serializers import RegistrationSerializer, UserSerializer
 
 User = get_user_model()
@@ -21,6 +22,7 @@ class RegisterAPIView(GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
+        notifications.notify(user, notifications.WELCOME)
         token, _ = Token.objects.get_or_create(user=user)
         return Response({'token': token.key, 'user': UserSerializer(user).data}, status=status.HTTP_201_CREATED)
     
@@ -1,78 +1,170 @@
-from rest_framework import viewsets, permissions
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework import viewsets, permissions, status
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Count, Prefetch
-from django.db.models.functions import TruncMonth
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
 
-from ..models import Receipt, ReceiptTag, ReceiptPayment
-from ..serializers import ReceiptSerializer
+from .. import notifications
+from ..models import Receipt, ReceiptItem, ReceiptPayment, ReceiptTag
+from ..serializers import ReceiptSerializer, capped_attr, receipt_nested_limit
+from ..bulk import ingest_receipts
+from ..cache import CacheStats, get_or_compute, user_cache_key
+from ..compiled import CompiledReadMixin
+from ..conditional import UserDataConditionalMixin
+from ..db.routers import ReplicaReadMixin, keep_read_replica
+from ..exports import iter_csv, iter_ndjson
+from ..filters import ReceiptSearchFilter, distinct_if_needed, filter_receipts
+from ..pagination import ReceiptCursorPagination
+from ..renderers import CSVRenderer, NDJSONRenderer
+from ..rollups import spend_summary
 
 User = get_user_model()
 
+analytics_cache_stats = CacheStats('analytics')
 
-class ReceiptViewSet(viewsets.ModelViewSet):
+
+class ReceiptViewSet(
+    ReplicaReadMixin, UserDataConditionalMixin, CompiledReadMixin, viewsets.ModelViewSet
+):
     """Manage user receipts; user-scoped with filters and analytics."""
     serializer_class = ReceiptSerializer
+    replica_actions = ('list', 'analytics', 'export')
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ReceiptSearchFilter]
     filterset_fields = ['category', 'purchase_date']
-    search_fields = ['store_name', 'notes']
     ordering_fields = ['purchase_date', 'uploaded_at', 'total_amount']
     ordering = ['-purchase_date', '-uploaded_at']
 
+    @property
+    def paginator(self):
+        """Use keyset pagination when the client opts in with ``?pagination=cursor``."""
+        if not hasattr(self, '_paginator'):
+            if self.request is not None and ReceiptCursorPagination.is_requested(self.request):
+                self._paginator = ReceiptCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+    def _csv_param(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return [part.strip() for part in value.split(',') if part.strip()]
+
+    def get_serializer_options(self):
+        """``fields``/``expand``/``nested_limit`` for ``ReceiptSerializer`` from the query string."""
+        if self.action == 'export':
+            return {'expand': ReceiptSerializer.EXPANDABLE, 'nested_limit': None}
+        return {'fields': self._csv_param('fields'), 'expand': self._csv_param('expand')}
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None:
+            kwargs = {**self.get_serializer_options(), **kwargs}
+        return super().get_serializer(*args, **kwargs)
+
+    def get_prefetches(self):
+        """Prefetch only the relations the serializer will render, capped at limit + 1 rows."""
+        options = self.get_serializer_options()
+        expand = options['expand']
+        expand = ReceiptSerializer.DEFAULT_EXPAND if expand is None else expand
+        if options.get('fields') is not None:
+            expand = [name for name in expand if name in options['fields']]
+        limit = options.get('nested_limit', receipt_nested_limit())
+
+        def capped(relation, queryset):
+            if limit is None:
+                return Prefetch(relation, queryset=queryset)
+            return Prefetch(relation, queryset=queryset[:limit + 1], to_attr=capped_attr(relation))
+
+        prefetches = []
+        if 'items' in expand:
+            prefetches.append(capped('items', ReceiptItem.objects.order_by('id')))
+        if 'payments' in expand:
+            prefetches.append(capped('payments', ReceiptPayment.objects.order_by('id')))
+        if 'tags' in expand:
+            prefetches.append(Prefetch('receipttag_set', queryset=ReceiptTag.objects.all()))
+        return prefetches
+
     def get_queryset(self):
-        queryset = (
-            Receipt.objects.filter(user=self.request.user)
-            .select_related('category', 'user')
-            .prefetch_related(
-                'payments__payment_method',
-                'items',
-                Prefetch('receipttag_set', queryset=ReceiptTag.objects.select_related('tag')),
-            )
-        )
+        queryset = Receipt.objects.filter(user=self.request.user).select_related('user')
+        if self.request.method == 'GET':
+            queryset = queryset.prefetch_related(*self.get_prefetches())
 
-        payment_method = self.request.query_params.get('payment_method')
-        tags = self.request.query_params.get('tags')
-        date_from = self.request.query_params.get('date_from')
-        date_to = self.request.query_params.get('date_to')
-        amount_min = self.request.query_params.get('amount_min')
-        amount_max = self.request.query_params.get('amount_max')
-
-        if payment_method:
-            queryset = queryset.filter(payments__payment_method__name__icontains=payment_method)
-        if tags:
-            tag_list = [t.strip() for t in tags.split(',')]
-            queryset = queryset.filter(receipttag__tag__name__in=tag_list)
-        if date_from:
-            queryset = queryset.filter(purchase_date__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(purchase_date__lte=date_to)
-        if amount_min:
-            queryset = queryset.filter(total_amount__gte=amount_min)
-        if amount_max:
-            queryset = queryset.filter(total_amount__lte=amount_max)
-
-        return queryset.distinct()
+        return distinct_if_needed(filter_receipts(queryset, self.request.query_params))
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        receipt = serializer.save(user=self.request.user)
+        notifications.notify(self.request.user, notifications.receipt_added(receipt))
 
     def perform_update(self, serializer):
         receipt = self.get_object()
         if receipt.user != self.request.user:
             raise permissions.PermissionDenied("You can only update your own receipts.")
-        serializer.save()
+        receipt = serializer.save()
+        notifications.notify(
+            self.request.user, notifications.receipt_updated(receipt), key=f'receipt:{receipt.pk}:updated'
+        )
 
     def perform_destroy(self, instance):
         if instance.user != self.request.user:
             raise permissions.PermissionDenied("You can only delete your own receipts.")
+        store_name, amount = instance.store_name, instance.total_amount
         instance.delete()
+        notifications.notify(self.request.user, notifications.receipt_deleted(store_name, amount))
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many receipts with nested ``items``, ``payments`` and ``tags``.
+
+        ``?mode=atomic`` (default) writes nothing if any row is invalid;
+        ``?mode=partial`` writes the valid rows and reports the rest.
+        """
+        mode = request.query_params.get('mode', 'atomic')
+        if mode not in ('atomic', 'partial'):
+            return Response({'detail': "mode must be 'atomic' or 'partial'."}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Expected a list of receipts.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, 'DRT_BULK_MAX_RECEIPTS', 1000)
+        if len(request.data) > max_rows:
+            return Response(
+                {'detail': f'At most {max_rows} receipts per request.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = ingest_receipts(request.user, request.data, atomic=(mode == 'atomic'))
+        if result.created:
+            notifications.notify(request.user, notifications.receipts_imported(len(result.created)))
+        if not result.errors:
+            response_status = status.HTTP_201_CREATED
+        elif result.created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': result.created, 'errors': result.errors}, status=response_status)
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream every matching receipt as ``?format=ndjson`` (default) or ``?format=csv``.
+
+        Honors the same filters as the list endpoint; results are not paginated.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        renderer = request.accepted_renderer
+        rows = iter_csv(queryset) if renderer.format == 'csv' else iter_ndjson(queryset)
+        # The body streams after the view returns; keep reading from the same database.
+        rows = keep_read_replica(rows)
+        response = StreamingHttpResponse(rows, content_type=f'{renderer.media_type}; charset=utf-8')
+        filename = f"receipts-{timezone.now():%Y%m%d}.{renderer.format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
     @action(detail=False, methods=['get'])
     def analytics(self, request):
@@ -81,27 +173,14 @@ class ReceiptViewSet(viewsets.ModelViewSet):
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
 
-        receipts = Receipt.objects.filter(user=user, purchase_date__range=[start_date, end_date])
-        total_expenses = receipts.aggregate(total=Sum('total_amount'))['total'] or 0
-
-        category_expenses = receipts.values('category__name').annotate(
-            total=Sum('total_amount'), count=Count('id')
-        ).order_by('-total')
-
-        monthly_expenses = receipts.annotate(month=TruncMonth('purchase_date')).values('month').annotate(
-            total=Sum('total_amount'), count=Count('id')
-        ).order_by('month')
-
-        payment_methods = ReceiptPayment.objects.filter(
-            receipt__user=user, receipt__purchase_date__range=[start_date, end_date]
-        ).values('payment_method__name').annotate(total=Sum('amount_paid'), count=Count('id')).order_by('-total')
-
-        return Response({
-            'period': {'start_date': start_date, 'end_date': end_date, 'days': days},
-            'summary': {'total_expenses': total_expenses, 'total_receipts': receipts.count()},
-            'by_category': list(category_expenses),
-            'by_month': list(monthly_expenses),
-            'by_payment_method': list(payment_methods),
-        })
-
-
+        key = user_cache_key('analytics', user.pk, days, end_date.isoformat())
+        data, hit = get_or_compute(
+            key,
+            lambda: {
+                'period': {'start_date': start_date, 'end_date': end_date, 'days': days},
+                **spend_summary(user, start_date, end_date),
+            },
+            timeout=getattr(settings, 'DRT_ANALYTICS_CACHE_TIMEOUT', 300),
+            stats=analytics_cache_stats,
+        )
+        return Response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
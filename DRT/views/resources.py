@@ -1,17 +1,29 @@
-from rest_framework import viewsets, permissions
+from datetime import date
+
+from django.utils import timezone
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
+from .. import notifications
+from ..budgets import active_budgets, with_utilization
+from ..compiled import CompiledReadMixin
+from ..registry import reference_data
+from ..conditional import ReferenceDataConditionalMixin, UserDataConditionalMixin
 from ..models import (
-    Category, PaymentMethod, Tag, ReceiptTag, Budget, ReceiptPayment, ReceiptItem
+    Category, PaymentMethod, Tag, ReceiptTag, Budget, ReceiptPayment, ReceiptItem, Notification
 )
+from ..pagination import NotificationCursorPagination
 from ..serializers import (
     CategorySerializer, PaymentMethodSerializer, TagSerializer, ReceiptTagSerializer,
-    BudgetSerializer, ReceiptPaymentSerializer, ReceiptItemSerializer
+    BudgetSerializer, BudgetUtilizationSerializer, ReceiptPaymentSerializer, ReceiptItemSerializer, NotificationSerializer
 )
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReferenceDataConditionalMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -20,7 +32,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
 
 
-class PaymentMethodViewSet(viewsets.ModelViewSet):
+class PaymentMethodViewSet(ReferenceDataConditionalMixin, viewsets.ModelViewSet):
     queryset = PaymentMethod.objects.all()
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -46,10 +58,10 @@ class ReceiptTagViewSet(viewsets.ModelViewSet):
     ordering_fields = ['receipt', 'tag']
 
     def get_queryset(self):
-        return ReceiptTag.objects.filter(receipt__user=self.request.user).select_related('receipt', 'tag')
+        return ReceiptTag.objects.filter(receipt__user=self.request.user).select_related('receipt')
 
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(UserDataConditionalMixin, CompiledReadMixin, viewsets.ModelViewSet):
     serializer_class = BudgetSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -57,23 +69,65 @@ class BudgetViewSet(viewsets.ModelViewSet):
     ordering_fields = ['period_start', 'period_end', 'amount_limit']
     ordering = ['-period_start']
 
+    def includes(self, name):
+        """True if ``?include=`` (comma-separated) asks for ``name`` on a read."""
+        if self.request.method != 'GET':
+            return False
+        return name in self.request.query_params.get('include', '').split(',')
+
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user).select_related('category')
+        queryset = Budget.objects.filter(user=self.request.user).select_related('user')
+        if self.includes('utilization'):
+            queryset = with_utilization(queryset)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.includes('utilization'):
+            return BudgetUtilizationSerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=['get'])
+    def active(self, request):
+        """Budgets whose period covers ``?date=`` (default today), optionally for one ``?category=``."""
+        params = request.query_params
+        try:
+            day = date.fromisoformat(params['date']) if params.get('date') else timezone.localdate()
+            category = int(params['category']) if params.get('category') else None
+        except ValueError:
+            return Response(
+                {'detail': 'date must be YYYY-MM-DD and category an id.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = [interval.id for interval in active_budgets(request.user.pk, [day], category)[day]]
+        queryset = self.get_queryset().filter(pk__in=ids).order_by('period_start', 'pk') if ids else []
+        return Response(self.get_serializer(queryset, many=True).data)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        budget = serializer.save(user=self.request.user)
+        notifications.notify(self.request.user, notifications.budget_created(budget))
+
+    def perform_update(self, serializer):
+        budget = serializer.save()
+        notifications.notify(
+            self.request.user, notifications.budget_updated(budget), key=f'budget:{budget.pk}:updated'
+        )
+
+    def perform_destroy(self, instance):
+        category_name = reference_data.category_name(instance.category_id)
+        amount = instance.amount_limit
+        instance.delete()
+        notifications.notify(self.request.user, notifications.budget_deleted(category_name, amount))
 
 
-class ReceiptPaymentViewSet(viewsets.ModelViewSet):
+class ReceiptPaymentViewSet(CompiledReadMixin, viewsets.ModelViewSet):
     serializer_class = ReceiptPaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ['payment_method', 'paid_at']
+    filterset_fields = ['receipt', 'payment_method', 'paid_at']
     ordering_fields = ['paid_at', 'amount_paid']
     ordering = ['-paid_at']
 
     def get_queryset(self):
-        return ReceiptPayment.objects.filter(receipt__user=self.request.user).select_related('receipt', 'payment_method')
+        return ReceiptPayment.objects.filter(receipt__user=self.request.user)
 
     def perform_create(self, serializer):
         receipt_id = self.request.data.get('receipt')
@@ -85,7 +139,7 @@ class ReceiptPaymentViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
-class ReceiptItemViewSet(viewsets.ModelViewSet):
+class ReceiptItemViewSet(CompiledReadMixin, viewsets.ModelViewSet):
     serializer_class = ReceiptItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -106,3 +160,30 @@ class ReceiptItemViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
+class NotificationViewSet(CompiledReadMixin, viewsets.ReadOnlyModelViewSet):
+    """The user's notifications, newest first; ``?unread=1`` for unread only."""
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        queryset = Notification.objects.filter(user=self.request.user)
+        unread = self.request.query_params.get('unread')
+        if unread is not None:
+            queryset = notifications.with_read_state(queryset, unread.lower() in ('0', 'false', 'no'))
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        if not notifications.mark_read(request.user, pk):
+            raise NotFound()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'], url_path='read-all')
+    def read_all(self, request):
+        return Response({'marked_read': notifications.mark_all_read(request.user)})
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        return Response({'unread': notifications.unread_count(request.user)})
@@ -1,18 +1,32 @@
+import hashlib
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, DetailView, UpdateView, DeleteView, ListView
 from django.contrib.auth import get_user_model, login
-from django.shortcuts import render
+from django.http import Http404
+from django.shortcuts import redirect, render
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Q
+from django.db.models import prefetch_related_objects
+from django.utils.functional import SimpleLazyObject
 from decimal import Decimal, InvalidOperation
 from django.utils import timezone
 
 # Assuming your forms and models are in the parent directory as per your imports
 from ..forms import LoginForm, RegistrationForm, ReceiptForm, BudgetForm
+from .. import notifications
+from ..budgets import with_utilization
+from ..cache import get_or_compute, user_cache_key
+from ..fragments import FragmentCache, FragmentCacheMixin, render_timed
 from ..models import Receipt, Budget, Notification
+from ..pagination import InvalidCursor, KeysetPaginator
+from ..registry import reference_data
+from ..search import search_receipts
 
 User = get_user_model()
 
@@ -36,10 +50,7 @@ class RegisterView(CreateView):
         login(self.request, self.object)
         
         # Optional: Welcome Notification
-        Notification.objects.create(
-            user=self.object,
-            message="Welcome to Receipt Tracker! Start by adding your first receipt."
-        )
+        notifications.notify(self.object, notifications.WELCOME)
         return response
 
 
@@ -47,12 +58,34 @@ def HomeView(request):
     return render(request, "index.html")
 
 
+class OwnerRequiredMixin(UserPassesTestMixin):
+    """
+    Only the object's owner may use the view.
+
+    The object is fetched once per request and shared by ``test_func`` and
+    the view itself.
+    """
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+
+    def test_func(self):
+        return self.get_object().user_id == self.request.user.pk
+
+
 # --- RECEIPT VIEWS ---
 
-@login_required
-def receipts(request):
-    """Receipts view with search functionality."""
-    receipts_list = Receipt.objects.filter(user=request.user).select_related('category').order_by('-purchase_date', '-uploaded_at')
+RECEIPT_FILTERS = ('q', 'category', 'date_from', 'date_to', 'amount_min', 'amount_max')
+RECEIPTS_PER_PAGE = 20
+
+
+def filtered_receipts(request):
+    """The user's receipts narrowed by the web list's search and filter parameters."""
+    receipts_list = Receipt.objects.filter(user=request.user).select_related('category')
     
     # Get search query from request
     search_query = request.GET.get('q', '').strip()
@@ -62,13 +95,10 @@ def receipts(request):
     amount_min = request.GET.get('amount_min', '')
     amount_max = request.GET.get('amount_max', '')
     
-    # Apply search filters
+    # Apply search filters. Pages seek on the date ordering, so matches are
+    # listed newest first rather than by relevance.
     if search_query:
-        receipts_list = receipts_list.filter(
-            Q(store_name__icontains=search_query) |
-            Q(notes__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
+        receipts_list = search_receipts(receipts_list, search_query, rank=False)
     
     if category_filter:
         receipts_list = receipts_list.filter(category_id=category_filter)
@@ -93,22 +123,69 @@ def receipts(request):
         except (InvalidOperation, ValueError):
             pass
     
-    # Get all categories for filter dropdown
-    from ..models import Category
-    categories = Category.objects.all().order_by('name')
-    
+    return receipts_list
+
+
+ReceiptCount = namedtuple('ReceiptCount', 'count capped')
+
+
+def receipt_count(request, queryset, filter_query):
+    """
+    ``ReceiptCount(count, capped)`` for the "Found N receipts" banner.
+
+    Counting stops at ``DRT_WEB_RECEIPT_COUNT_LIMIT`` rows, and the result is
+    cached until the user's receipts change, so paging through a large
+    result set counts it once.
+    """
+    limit = getattr(settings, 'DRT_WEB_RECEIPT_COUNT_LIMIT', 1000)
+    digest = hashlib.sha256(filter_query.encode()).hexdigest()[:16]
+    key = user_cache_key('receipt-count', request.user.pk, limit, digest)
+    count, _ = get_or_compute(
+        key,
+        lambda: queryset.order_by()[:limit + 1].count(),
+        timeout=getattr(settings, 'DRT_ANALYTICS_CACHE_TIMEOUT', 300),
+    )
+    return ReceiptCount(min(count, limit), count > limit)
+
+
+@login_required
+def receipts(request):
+    """Receipts view with search functionality, one keyset page at a time."""
+    receipts_list = filtered_receipts(request)
+    filters = {name: request.GET.get(name, '').strip() for name in RECEIPT_FILTERS}
+    filter_query = urlencode([(name, value) for name, value in filters.items() if value])
+
+    cursor = request.GET.get('cursor', '')
+    paginator = KeysetPaginator(receipts_list, ['-purchase_date', '-uploaded_at'], RECEIPTS_PER_PAGE)
+    if cursor:
+        try:
+            paginator.decode_cursor(cursor)
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+    fragment = FragmentCache(
+        'receipt-list', request.user.pk, hashlib.sha256(f'{filter_query}#{cursor}'.encode()).hexdigest()[:16]
+    )
+    # Only the cached fragment reads the page and the count, so both stay
+    # unevaluated when {% cache %} finds it.
+    page = SimpleLazyObject(lambda: paginator.paginate(cursor))
+
     context = {
-        'receipts': receipts_list,
-        'search_query': search_query,
-        'category_filter': category_filter,
-        'date_from': date_from,
-        'date_to': date_to,
-        'amount_min': amount_min,
-        'amount_max': amount_max,
-        'categories': categories,
+        'fragment': fragment,
+        'receipts': page,
+        'page_obj': page,
+        'filter_query': filter_query,
+        'search_query': filters['q'],
+        'category_filter': filters['category'],
+        'date_from': filters['date_from'],
+        'date_to': filters['date_to'],
+        'amount_min': filters['amount_min'],
+        'amount_max': filters['amount_max'],
+        'categories': reference_data.categories(),
     }
+    if filter_query:
+        context['receipt_count'] = lambda: receipt_count(request, receipts_list, filter_query)
     
-    return render(request, "Receipts/receipts.html", context)
+    return render_timed(fragment, lambda: render(request, "receipts/receipts.html", context))
 
 
 class ReceiptCreateView(LoginRequiredMixin, CreateView):
@@ -126,10 +203,7 @@ class ReceiptCreateView(LoginRequiredMixin, CreateView):
         messages.success(self.request, 'Receipt created successfully!')
 
         # Create Notification
-        Notification.objects.create(
-            user=self.request.user,
-            message=f"Receipt from '{self.object.store_name}' for Ksh {self.object.total_amount} was added."
-        )
+        notifications.notify(self.request.user, notifications.receipt_added(self.object))
 
         return response
     
@@ -137,30 +211,37 @@ class ReceiptCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy('receipt_detail', kwargs={'pk': self.object.pk})
 
 
-class ReceiptDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class ReceiptDetailView(LoginRequiredMixin, OwnerRequiredMixin, FragmentCacheMixin, DetailView):
     """View receipt details."""
     model = Receipt
     template_name = "receipts/receipt_detail.html"
     context_object_name = 'receipt'
-    
-    def test_func(self):
-        receipt = self.get_object()
-        return receipt.user == self.request.user
+    fragment_name = 'receipt-detail'
+
+    def get_fragment_parts(self):
+        return [self.kwargs['pk']]
     
     def get_queryset(self):
-        return Receipt.objects.filter(user=self.request.user).select_related('category', 'user').prefetch_related('items', 'payments__payment_method', 'receipttag_set__tag')
+        return Receipt.objects.filter(user=self.request.user).select_related('category', 'user')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        receipt = self.object
+
+        def prefetched():
+            # Runs only if the cached fragment has to be rendered.
+            prefetch_related_objects([receipt], 'items', 'payments__payment_method', 'receipttag_set__tag')
+            return receipt
+        context['object'] = context['receipt'] = SimpleLazyObject(prefetched)
+        return context
 
-class ReceiptUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+
+class ReceiptUpdateView(LoginRequiredMixin, OwnerRequiredMixin, UpdateView):
     """Update an existing receipt."""
     model = Receipt
     form_class = ReceiptForm
     template_name = "receipts/receipt_form.html"
     
-    def test_func(self):
-        receipt = self.get_object()
-        return receipt.user == self.request.user
-    
     def form_valid(self, form):
         # Save the changes
         response = super().form_valid(form)
@@ -168,9 +249,8 @@ class ReceiptUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         messages.success(self.request, 'Receipt updated successfully!')
         
         # Create Notification
-        Notification.objects.create(
-            user=self.request.user,
-            message=f"Receipt from '{self.object.store_name}' was updated."
+        notifications.notify(
+            self.request.user, notifications.receipt_updated(self.object), key=f'receipt:{self.object.pk}:updated'
         )
         
         return response
@@ -179,47 +259,45 @@ class ReceiptUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return reverse_lazy('receipt_detail', kwargs={'pk': self.object.pk})
 
 
-class ReceiptDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class ReceiptDeleteView(LoginRequiredMixin, OwnerRequiredMixin, DeleteView):
     """Delete a receipt."""
     model = Receipt
     template_name = "receipts/receipt_confirm_delete.html"
     success_url = reverse_lazy('receipts')
     
-    def test_func(self):
-        receipt = self.get_object()
-        return receipt.user == self.request.user
-    
-    def delete(self, request, *args, **kwargs):
+    def form_valid(self, form):
         # 1. Capture details BEFORE deleting
-        receipt = self.get_object()
-        store_name = receipt.store_name
-        amount = receipt.total_amount
+        store_name = self.object.store_name
+        amount = self.object.total_amount
         
         # 2. Perform the delete
-        response = super().delete(request, *args, **kwargs)
+        response = super().form_valid(form)
         
         messages.success(self.request, 'Receipt deleted successfully!')
         
         # 3. Create Notification
-        Notification.objects.create(
-            user=self.request.user,
-            message=f"Receipt from '{store_name}' (Ksh {amount}) was deleted."
-        )
+        notifications.notify(self.request.user, notifications.receipt_deleted(store_name, amount))
         
         return response
 
 
 # --- BUDGET VIEWS ---
 
-class BudgetListView(LoginRequiredMixin, ListView):
+class BudgetListView(LoginRequiredMixin, FragmentCacheMixin, ListView):
     """List budgets for the logged-in user."""
 
     model = Budget
     template_name = "budgets/budget_list.html"
     context_object_name = "budgets"
+    fragment_name = "budget-list"
+
+    def get_fragment_parts(self):
+        # Budgets turn expired at midnight.
+        return [timezone.now().date().isoformat()]
 
     def get_queryset(self):
-        return (
+        # Lazy: only evaluated when the cached fragment has to be rendered.
+        return with_utilization(
             Budget.objects.filter(user=self.request.user)
             .select_related("category")
             .order_by("-period_start", "-period_end")
@@ -227,10 +305,7 @@ class BudgetListView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        today = timezone.now().date()
-        # Add is_expired attribute to each budget
-        for budget in context['budgets']:
-            budget.is_expired = budget.period_end < today
+        context['today'] = timezone.now().date()  # budgets ending before it are expired
         return context
 
 
@@ -251,15 +326,12 @@ class BudgetCreateView(LoginRequiredMixin, CreateView):
         messages.success(self.request, "Budget created successfully!")
         
         # Create Notification
-        Notification.objects.create(
-            user=self.request.user,
-            message=f"Budget for '{self.object.category.name}' (Ksh {self.object.amount}) created."
-        )
+        notifications.notify(self.request.user, notifications.budget_created(self.object))
         
         return response
 
 
-class BudgetUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class BudgetUpdateView(LoginRequiredMixin, OwnerRequiredMixin, UpdateView):
     """Update an existing budget."""
 
     model = Budget
@@ -267,10 +339,6 @@ class BudgetUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     template_name = "budgets/budget_form.html"
     success_url = reverse_lazy("budget_list")
 
-    def test_func(self):
-        budget = self.get_object()
-        return budget.user == self.request.user
-
     def form_valid(self, form):
         # Save changes
         response = super().form_valid(form)
@@ -278,75 +346,76 @@ class BudgetUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         messages.success(self.request, "Budget updated successfully!")
         
         # Create Notification
-        Notification.objects.create(
-            user=self.request.user,
-            message=f"Budget for '{self.object.category.name}' updated to Ksh {self.object.amount}."
+        notifications.notify(
+            self.request.user, notifications.budget_updated(self.object), key=f'budget:{self.object.pk}:updated'
         )
         
         return response
 
 
-class BudgetDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class BudgetDeleteView(LoginRequiredMixin, OwnerRequiredMixin, DeleteView):
     """Delete a budget."""
 
     model = Budget
     template_name = "budgets/budget_confirm_delete.html"
     success_url = reverse_lazy("budget_list")
 
-    def test_func(self):
-        budget = self.get_object()
-        return budget.user == self.request.user
-
-    def delete(self, request, *args, **kwargs):
+    def form_valid(self, form):
         # 1. Capture details BEFORE deleting
-        budget = self.get_object()
-        category_name = budget.category.name
-        amount = budget.amount
+        category_name = reference_data.category_name(self.object.category_id)
+        amount = self.object.amount_limit
 
         # 2. Perform delete
-        response = super().delete(request, *args, **kwargs)
+        response = super().form_valid(form)
         
         messages.success(self.request, "Budget deleted successfully!")
         
         # 3. Create Notification
-        Notification.objects.create(
-            user=self.request.user,
-            message=f"Budget for '{category_name}' (Ksh {amount}) was deleted."
-        )
+        notifications.notify(self.request.user, notifications.budget_deleted(category_name, amount))
         
         return response
     
 class NotificationListView(LoginRequiredMixin, ListView):
-    """List notifications for the logged-in user."""
+    """List notifications for the logged-in user, newest first, one keyset page at a time."""
 
     model = Notification
     template_name = "notifications/notifications.html"
     context_object_name = "notifications"
+    paginate_by = 20
 
     def get_queryset(self):
-        return (
-            Notification.objects.filter(user=self.request.user)
-            .order_by("-created_at")
-        )
-    
-@login_required   
+        queryset = Notification.objects.filter(user=self.request.user)
+        if self.request.GET.get('unread'):
+            queryset = notifications.with_read_state(queryset, False)
+        return queryset
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, ['-created_at'], page_size)
+        try:
+            page = paginator.paginate(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return paginator, page, page.object_list, page.has_next() or page.has_previous()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['unread_only'] = bool(self.request.GET.get('unread'))
+        return context
+
+
+@login_required
 def MarkAllNotificationsRead(request):
     """Mark all notifications as read for the logged-in user."""
-    if request.user.is_authenticated:
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
-        messages.success(request, "All notifications marked as read.")
-    return render(request, "notifications/notifications.html")  
+    notifications.mark_all_read(request.user)
+    messages.success(request, "All notifications marked as read.")
+    return redirect('notifications')
 
-@login_required   
+
+@login_required
 def MarkNotificationRead(request, pk):
     """Mark a single notification as read."""
-    if request.user.is_authenticated:
-        try:
-            notification = Notification.objects.get(pk=pk, user=request.user)
-            notification.is_read = True
-            notification.save()
-            messages.success(request, "Notification marked as read.")
-        except Notification.DoesNotExist:
-            messages.error(request, "Notification not found.")
-    return render(request, "notifications/notifications.html")  
-
+    if notifications.mark_read(request.user, pk):
+        messages.success(request, "Notification marked as read.")
+    else:
+        messages.error(request, "Notification not found.")
+    return redirect('notifications')
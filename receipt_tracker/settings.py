@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -35,10 +35,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'DRT.db.middleware.PoolMetricsMiddleware',
+    'DRT.db.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'DRT.db.middleware.ReplicaPinMiddleware',
+    'DRT.notifications.NotificationBatchMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,6 +59,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'DRT.context_processors.notifications',
             ],
         },
     },
@@ -67,14 +72,115 @@ WSGI_APPLICATION = 'receipt_tracker.wsgi.application'
 # -----------------------------
 DATABASES = {
     'default': {
-        'ENGINE': config('DB_ENGINE'),       # must be 'django.db.backends.mysql' in .env
+        # 'django.db.backends.mysql', or 'DRT.db.backends.mysql' to pool
+        # connections per worker process (see POOL below).
+        'ENGINE': config('DB_ENGINE'),
         'NAME': config('DB_NAME'),           # MySQL database name
         'USER': config('DB_USER'),           # MySQL username
         'PASSWORD': config('DB_PASSWORD'),   # MySQL password
         'HOST': config('DB_HOST', default='127.0.0.1'),
         'PORT': config('DB_PORT', default='3306'),
+        # Used by the DRT.db.backends.* engines: connections per process,
+        # seconds before a connection is recycled, and seconds to wait for
+        # a free connection before raising.
+        'POOL': {
+            'MAX_SIZE': config('DB_POOL_SIZE', default=10, cast=int),
+            'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=1800, cast=int),
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=5, cast=float),
+        },
+    }
+}
+
+# Read replicas: comma-separated hosts (file paths for SQLite), each a copy
+# of 'default' served as replica1, replica2, ... List, analytics and export
+# reads use them; a client that just wrote reads from the primary for
+# DRT_REPLICA_PIN_SECONDS.
+for index, location in enumerate(config('DB_REPLICAS', default='', cast=Csv()), 1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    replica['NAME' if 'sqlite' in replica['ENGINE'] else 'HOST'] = location
+    DATABASES[f'replica{index}'] = replica
+DRT_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DRT_REPLICA_PIN_SECONDS = config('DRT_REPLICA_PIN_SECONDS', default=10, cast=int)
+DATABASE_ROUTERS = ['DRT.db.routers.ReplicaRouter']
+
+# -----------------------------
+# Caching
+# -----------------------------
+# Locmem by default; point CACHE_BACKEND/CACHE_LOCATION at a shared backend
+# (e.g. file-based or memcached) so invalidation is seen by every worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='drt-default'),
     }
 }
+# Outside DEBUG a process-local default cache is a startup error (DRT.E001).
+# Set to False only for a deployment that runs a single process.
+DRT_REQUIRE_SHARED_CACHE = config('DRT_REQUIRE_SHARED_CACHE', default=not DEBUG, cast=bool)
+
+# Token -> user lookups cached per process: seconds to keep them, and how many.
+# Off unless the default cache is shared or DRT_REQUIRE_SHARED_CACHE is False.
+DRT_TOKEN_CACHE_TTL = config('DRT_TOKEN_CACHE_TTL', default=60, cast=int)
+DRT_TOKEN_CACHE_SIZE = config('DRT_TOKEN_CACHE_SIZE', default=10000, cast=int)
+
+# Seconds between checks of the shared reference-data (category, payment
+# method, tag) version; other processes' edits show up within this window.
+DRT_REFDATA_CHECK_INTERVAL = config('DRT_REFDATA_CHECK_INTERVAL', default=1.0, cast=float)
+
+# Seconds a computed /api/receipts/analytics/ response stays cached.
+DRT_ANALYTICS_CACHE_TIMEOUT = config('DRT_ANALYTICS_CACHE_TIMEOUT', default=300, cast=int)
+
+# The web receipt list counts at most this many matches for its "Found N"
+# banner (shown as N+ beyond that); counts are cached like analytics.
+DRT_WEB_RECEIPT_COUNT_LIMIT = config('DRT_WEB_RECEIPT_COUNT_LIMIT', default=1000, cast=int)
+
+# Seconds a rendered web fragment (receipt list and detail, budget list) may
+# be reused; any write to the user's data replaces it sooner.
+DRT_FRAGMENT_CACHE_TIMEOUT = config('DRT_FRAGMENT_CACHE_TIMEOUT', default=600, cast=int)
+
+# QueryInstrumentationMiddleware logs requests running more queries or
+# spending more database time than these budgets, or repeating one query
+# shape REPEAT_THRESHOLD times or more (a likely N+1).
+DRT_QUERY_COUNT_BUDGET = config('DRT_QUERY_COUNT_BUDGET', default=50, cast=int)
+DRT_QUERY_TIME_BUDGET_MS = config('DRT_QUERY_TIME_BUDGET_MS', default=500, cast=int)
+DRT_QUERY_REPEAT_THRESHOLD = config('DRT_QUERY_REPEAT_THRESHOLD', default=10, cast=int)
+
+# Run the async analytics aggregates on separate database connections so
+# they overlap (one connection per aggregate, per request).
+DRT_ASYNC_PARALLEL_QUERIES = config('DRT_ASYNC_PARALLEL_QUERIES', default=False, cast=bool)
+
+# Maximum number of receipts accepted by POST /api/receipts/bulk/.
+DRT_BULK_MAX_RECEIPTS = config('DRT_BULK_MAX_RECEIPTS', default=1000, cast=int)
+
+# Most items/payments nested in one serialized receipt; the rest are linked.
+DRT_RECEIPT_NESTED_LIMIT = config('DRT_RECEIPT_NESTED_LIMIT', default=50, cast=int)
+
+# Serve list/retrieve responses through DRT.compiled instead of plain DRF serializers.
+DRT_COMPILED_SERIALIZERS = config('DRT_COMPILED_SERIALIZERS', default=True, cast=bool)
+
+# Full-text search backend (dotted path). Empty picks one from the database
+# vendor: MySQL FULLTEXT, SQLite FTS5, or a portable icontains fallback.
+DRT_SEARCH_BACKEND = config('DRT_SEARCH_BACKEND', default='')
+
+# Notifications delivered per run_notification_worker batch, and seconds the
+# worker sleeps when the outbox is empty.
+DRT_NOTIFICATION_BATCH_SIZE = config('DRT_NOTIFICATION_BATCH_SIZE', default=500, cast=int)
+DRT_NOTIFICATION_POLL_INTERVAL = config('DRT_NOTIFICATION_POLL_INTERVAL', default=1.0, cast=float)
+
+# compact_notifications: read notifications older than DIGEST_AFTER days are
+# folded into daily digests; read rows (and digests) older than
+# READ_RETENTION days and unread rows older than UNREAD_RETENTION days are
+# deleted (0 keeps them forever). CHUNK_SIZE is primary keys per transaction.
+DRT_NOTIFICATION_DIGEST_AFTER_DAYS = config('DRT_NOTIFICATION_DIGEST_AFTER_DAYS', default=30, cast=int)
+DRT_NOTIFICATION_READ_RETENTION_DAYS = config('DRT_NOTIFICATION_READ_RETENTION_DAYS', default=365, cast=int)
+DRT_NOTIFICATION_UNREAD_RETENTION_DAYS = config('DRT_NOTIFICATION_UNREAD_RETENTION_DAYS', default=0, cast=int)
+DRT_NOTIFICATION_CHUNK_SIZE = config('DRT_NOTIFICATION_CHUNK_SIZE', default=5000, cast=int)
+
+# Percentages of a budget's limit that notify its owner once when reached.
+DRT_BUDGET_ALERT_THRESHOLDS = config('DRT_BUDGET_ALERT_THRESHOLDS', default='80,100', cast=Csv(int))
+
+# Seconds a user's cached budget interval index lives; budget writes replace it.
+DRT_BUDGET_INDEX_CACHE_TIMEOUT = config('DRT_BUDGET_INDEX_CACHE_TIMEOUT', default=3600, cast=int)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -97,7 +203,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'DRT.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,